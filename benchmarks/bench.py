@@ -0,0 +1,296 @@
+"""Benchmark the netbox-mcp tools and the llm-client chat loop against local fakes.
+
+For every scale, starts benchmarks/fake_netbox.py with a synthetic inventory,
+runs netbox-mcp/src/server.py against it and calls each MCP tool through a
+real SSE client. Then drives llm-client's chat loop with scripted prompts
+against benchmarks/fake_ollama.py. Reports p50/p95/p99 latency, NetBox
+requests per call, payload bytes and peak RSS (MCP server for tools, the
+llm-client process for chat turns).
+
+    python benchmarks/bench.py --scales 100,1000,10000 --iterations 20
+    python benchmarks/bench.py --scales 1000 --tools list_prefixes,generate_topology --cache
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+from mcp.client.session import ClientSession
+from mcp.client.sse import sse_client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start(cmd, url, env=None, quiet=True, timeout=300):
+    """Start a subprocess and wait until `url` answers."""
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=dict(os.environ, **(env or {})),
+                            stdout=subprocess.DEVNULL if quiet else None,
+                            stderr=subprocess.DEVNULL if quiet else None)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{cmd[1]} exited with code {proc.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{cmd[1]} did not answer on {url}")
+
+
+def stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def reset_peak_rss(pid="self"):
+    # Writing 5 to clear_refs resets VmHWM (Linux >= 4.0)
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(name, latencies, requests, payload, rss, errors):
+    return {
+        "name": name,
+        "calls": len(latencies),
+        "first_ms": round(latencies[0] * 1000, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "requests": round(requests / len(latencies), 1),
+        "payload_bytes": payload,
+        "peak_rss_mb": rss,
+        "errors": errors,
+    }
+
+
+def sample_objects(netbox_url):
+    """Pick devices, an IP address and a prefix from the fake inventory for the get_* and graph tools."""
+    def first(path, **params):
+        data = httpx.get(f"{netbox_url}/api/{path}", params=dict(params, limit=1)).json()
+        return data["results"][0] if data["results"] else {}
+    return {
+        "device": first("dcim/devices/").get("name", ""),
+        "peer": first("dcim/devices/", offset=1).get("name", ""),
+        "address": first("ipam/ip-addresses/").get("address", "").split("/")[0],
+        "prefix": first("ipam/prefixes/", status="active").get("prefix", ""),
+        "site": first("dcim/sites/").get("slug", ""),
+    }
+
+
+def tool_cases(sample):
+    """(label, tool, arguments) for every benchmarked call; tools missing here run with no arguments."""
+    return [
+        ("list_sites", "list_sites", {}),
+        ("get_device", "get_device", {"name": sample["device"]}),
+        ("list_devices", "list_devices", {}),
+        ("list_devices(site)", "list_devices", {"site": sample["site"], "limit": 1000}),
+        ("get_ip_address", "get_ip_address", {"address": sample["address"]}),
+        ("get_devices", "get_devices", {"names": [sample["device"], sample["peer"]]}),
+        ("get_ip_addresses", "get_ip_addresses", {"addresses": [sample["address"]]}),
+        ("list_ip_addresses", "list_ip_addresses", {}),
+        ("list_ip_addresses(stream)", "list_ip_addresses", {"stream": True}),
+        ("list_prefixes", "list_prefixes", {}),
+        ("get_prefix", "get_prefix", {"prefix": sample["prefix"]}),
+        ("list_vlans", "list_vlans", {}),
+        ("generate_topology", "generate_topology", {}),
+        ("generate_topology(stream)", "generate_topology", {"stream": True}),
+        ("count_objects(site)", "count_objects", {"group_by": "site"}),
+        ("count_objects(role)", "count_objects", {"group_by": "role"}),
+        ("top_prefix_utilization", "top_prefix_utilization", {}),
+        ("find_free_ips", "find_free_ips", {"prefix": sample["prefix"]}),
+        ("render_topology", "render_topology", {}),
+        ("render_topology(dot,site)", "render_topology", {"format": "dot", "site": sample["site"]}),
+        ("find_path", "find_path", {"source": sample["device"], "target": sample["peer"]}),
+        ("get_neighbors(hops=2)", "get_neighbors", {"device": sample["device"], "hops": 2}),
+        ("failure_impact", "failure_impact", {"device": sample["device"]}),
+        ("search(name)", "search", {"query": sample["device"].replace("-", " ")}),
+        ("search(address)", "search", {"query": sample["address"]}),
+    ]
+
+
+def chat_prompts(sample):
+    return [
+        ("chat:list_sites", "call list_sites"),
+        ("chat:get_device", 'call get_device{"name": "%s"}' % sample["device"]),
+        ("chat:prefixes+vlans", "call list_prefixes call list_vlans"),
+        ("chat:generate_topology", "call generate_topology"),
+        ("chat:no_tool", "halo"),
+    ]
+
+
+async def bench_tools(mcp_url, netbox_url, server_pid, cases, iterations, only=None):
+    rows = []
+    async with httpx.AsyncClient() as http, sse_client(mcp_url) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            listed = {tool.name for tool in (await session.list_tools()).tools}
+            known = {tool for _, tool, _ in cases}
+            cases = cases + [(name, name, {}) for name in sorted(listed - known)]
+            for label, tool, args in cases:
+                if tool not in listed or (only and tool not in only):
+                    continue
+                await http.get(f"{netbox_url}/_stats", params={"reset": 1})
+                reset_peak_rss(server_pid)
+                latencies, payload, errors = [], 0, 0
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    result = await session.call_tool(tool, args)
+                    latencies.append(time.perf_counter() - started)
+                    text = "".join(getattr(c, "text", "") for c in result.content)
+                    payload = len(text.encode())
+                    errors += bool(result.isError or text.startswith("Error"))
+                stats = (await http.get(f"{netbox_url}/_stats")).json()
+                rows.append(summarize(label, latencies, stats.get("__total__", 0), payload,
+                                      peak_rss_mb(server_pid), errors))
+    return rows
+
+
+async def bench_chat(mcp_url, ollama_url, netbox_url, prompts, iterations):
+    """Run llm-client's chat loop with scripted input; one session per iteration."""
+    sys.path.insert(0, os.path.join(ROOT, "llm-client", "src"))
+    import client
+    client.MCP_SERVER_URL, client.OLLAMA_HOST = mcp_url, ollama_url
+
+    timings = {label: [] for label, _ in prompts}
+    requests = {label: 0 for label, _ in prompts}
+    prompt_bytes = {label: 0 for label, _ in prompts}
+    rss = {label: None for label, _ in prompts}
+    async with httpx.AsyncClient() as http:
+        for _ in range(iterations):
+            script = iter(prompts)
+            current = {}
+
+            async def scripted_input(prompt):
+                if current:
+                    label = current["label"]
+                    timings[label].append(time.perf_counter() - current["started"])
+                    stats = (await http.get(f"{netbox_url}/_stats", params={"reset": 1})).json()
+                    requests[label] += stats.get("__total__", 0)
+                    calls = (await http.get(f"{ollama_url}/_calls", params={"reset": 1})).json()
+                    prompt_bytes[label] = max([c.get("prompt_chars", 0) for c in calls] + [prompt_bytes[label]])
+                    rss[label] = max(rss[label] or 0, peak_rss_mb() or 0) or None
+                label, text = next(script, (None, "quit"))
+                await http.get(f"{netbox_url}/_stats", params={"reset": 1})
+                await http.get(f"{ollama_url}/_calls", params={"reset": 1})
+                reset_peak_rss()
+                current.update(label=label, started=time.perf_counter())
+                return text
+
+            client.ainput = scripted_input
+            with contextlib.redirect_stdout(io.StringIO()):
+                await client.run_chat_loop()
+    return [summarize(label, timings[label], requests[label], prompt_bytes[label], rss[label], 0)
+            for label, _ in prompts if timings[label]]
+
+
+def print_table(title, rows):
+    columns = ["name", "calls", "first_ms", "p50_ms", "p95_ms", "p99_ms", "requests", "payload_bytes",
+               "peak_rss_mb", "errors"]
+    print(f"\n== {title}")
+    if not rows:
+        print("no results (run with --verbose to see server output)")
+        return
+    widths = {c: max([len(c)] + [len(str(r[c])) for r in rows]) for c in columns}
+    print("  ".join(c.ljust(widths[c]) if c == "name" else c.rjust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) if c == "name" else str(row[c]).rjust(widths[c])
+                        for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="100,1000", help="comma-separated inventory sizes (devices/prefixes)")
+    parser.add_argument("--ip-factor", type=float, default=1.0, help="IP addresses per device at each scale")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--tools", default="", help="comma-separated tool names (default: all)")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake NetBox response latency (seconds)")
+    parser.add_argument("--cache", action="store_true", help="keep the server inventory cache and topology snapshot on")
+    parser.add_argument("--no-chat", action="store_true", help="skip the llm-client chat benchmark")
+    parser.add_argument("--json", help="also write all results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show fake NetBox and MCP server output")
+    args = parser.parse_args()
+
+    results = []
+    for scale in [int(s) for s in args.scales.split(",")]:
+        nb_port, mcp_port, ollama_port = free_port(), free_port(), free_port()
+        netbox_url = f"http://127.0.0.1:{nb_port}"
+        mcp_url = f"http://127.0.0.1:{mcp_port}/sse"
+        ollama_url = f"http://127.0.0.1:{ollama_port}"
+        server_env = {"NETBOX_URL": netbox_url, "MCP_HOST": "127.0.0.1", "MCP_PORT": str(mcp_port)}
+        if not args.cache:
+            server_env.update(CACHE_MAX_ENTRIES="0", TOPOLOGY_SNAPSHOT="false")
+
+        started = time.perf_counter()
+        procs = [start([sys.executable, os.path.join(BENCH_DIR, "fake_netbox.py"), "--port", str(nb_port),
+                        "--devices", str(scale), "--prefixes", str(scale), "--ips", str(int(scale * args.ip_factor)),
+                        "--vlans", str(min(scale, 4094)), "--latency", str(args.latency)],
+                       f"{netbox_url}/api/status/", quiet=not args.verbose)]
+        try:
+            print(f"\nScale {scale}: fake NetBox ready in {time.perf_counter() - started:.1f}s", flush=True)
+            server = start([sys.executable, os.path.join(ROOT, "netbox-mcp", "src", "server.py")],
+                           mcp_url.replace("/sse", "/cache/stats"), env=server_env, quiet=not args.verbose)
+            procs.append(server)
+            sample = sample_objects(netbox_url)
+            only = set(args.tools.split(",")) if args.tools else None
+            rows = asyncio.run(bench_tools(mcp_url, netbox_url, server.pid, tool_cases(sample), args.iterations, only))
+            print_table(f"MCP tools, scale={scale}", rows)
+            results.append({"scale": scale, "suite": "tools", "rows": rows})
+
+            if not args.no_chat:
+                procs.append(start([sys.executable, os.path.join(BENCH_DIR, "fake_ollama.py"),
+                                    "--port", str(ollama_port)], f"{ollama_url}/_calls", quiet=not args.verbose))
+                rows = asyncio.run(bench_chat(mcp_url, ollama_url, netbox_url, chat_prompts(sample),
+                                              args.iterations))
+                print_table(f"llm-client chat turns, scale={scale} (payload_bytes = largest prompt sent)", rows)
+                results.append({"scale": scale, "suite": "chat", "rows": rows})
+        finally:
+            for proc in reversed(procs):
+                stop(proc)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
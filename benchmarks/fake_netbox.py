@@ -0,0 +1,341 @@
+"""Local stand-in for the NetBox REST API with a synthetic inventory.
+
+Serves the read endpoints netbox-mcp uses (filters, limit/offset paging,
+brief, ordering=-id), records POST/PATCH/DELETE in core/object-changes, and
+counts requests per path at /_stats (?reset=1 clears the counters).
+
+    python benchmarks/fake_netbox.py --devices 1000 --prefixes 1000 --ips 10000
+"""
+import argparse
+import asyncio
+import functools
+import ipaddress
+import json
+import os
+import time
+from collections import Counter
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+ROLES = [
+    ("Firewall", "firewall", "fw-perimeter"),
+    ("Core Router", "core-router", "core-rtr"),
+    ("Distribution Switch", "distribution-switch", "dist-sw"),
+    ("Access Switch", "access-switch", "access-sw"),
+    ("Firewall", "firewall", "fw-internal"),
+]
+BASE_URL = os.getenv("FAKE_NETBOX_URL", "http://127.0.0.1:18080")
+DEVICE_TYPES = {
+    "firewall": ("Cisco", "ASA 5506-X", "asa-5506-x"),
+    "core-router": ("Cisco", "CSR1000v", "csr1000v"),
+    "distribution-switch": ("Cisco", "Catalyst 9300", "catalyst-9300"),
+    "access-switch": ("Juniper", "EX4300", "ex4300"),
+}
+
+
+def _ref(obj, *keys):
+    if obj is None:
+        return None
+    ref = {"id": obj["id"], "display": obj.get("display", obj.get("name"))}
+    for key in keys:
+        ref[key] = obj[key]
+    return ref
+
+
+def _status(value="active"):
+    return {"value": value, "label": value.title()}
+
+
+class Inventory:
+    """Synthetic NetBox data set keyed by API path."""
+
+    def __init__(self, devices=100, prefixes=100, ips=1000, vlans=50, sites=None):
+        self.tables = {}
+        self.changes = []
+        self.next_id = Counter()
+        self.interface_count = Counter()
+        sites = sites or max(1, devices // 50)
+        self._build(sites, devices, prefixes, ips, vlans)
+
+    def _new(self, path, obj):
+        self.next_id[path] += 1
+        obj.setdefault("id", self.next_id[path])
+        obj.setdefault("url", f"{BASE_URL}/api/{path}{obj['id']}/")
+        obj.setdefault("display", obj.get("name") or obj.get("address") or obj.get("prefix"))
+        obj.setdefault("tags", [])
+        obj.setdefault("description", "")
+        self.tables.setdefault(path, []).append(obj)
+        return obj
+
+    def _build(self, n_sites, n_devices, n_prefixes, n_ips, n_vlans):
+        sites = [self._new("dcim/sites/", {"name": f"Site {i + 1:03d}", "slug": f"site-{i + 1:03d}",
+                                           "status": _status()}) for i in range(n_sites)]
+        tenant = self._new("tenancy/tenants/", {"name": "NOC", "slug": "noc"})
+        vrf = self._new("ipam/vrfs/", {"name": "MGMT", "rd": "65000:1"})
+        roles = {}
+        for name, slug, _ in ROLES:
+            if slug not in roles:
+                roles[slug] = self._new("dcim/device-roles/", {"name": name, "slug": slug})
+        types = {}
+        for slug, (mfr, model, type_slug) in DEVICE_TYPES.items():
+            types[slug] = self._new("dcim/device-types/", {
+                "model": model, "slug": type_slug, "display": model,
+                "manufacturer": {"id": 1, "name": mfr, "display": mfr},
+            })
+
+        per_site = [[] for _ in sites]
+        for i in range(n_devices):
+            site = sites[i % len(sites)]
+            idx = len(per_site[i % len(sites)])
+            _, role_slug, prefix = ROLES[idx % len(ROLES)]
+            device = self._new("dcim/devices/", {
+                "name": f"{prefix}-{idx // len(ROLES) + 1:02d}" + (f"-s{site['id']}" if len(sites) > 1 else ""),
+                "device_type": _ref(types[role_slug], "model", "slug"),
+                "role": _ref(roles[role_slug], "name", "slug"),
+                "site": _ref(site, "name", "slug"),
+                "tenant": _ref(tenant, "name", "slug"),
+                "status": _status(),
+                "primary_ip4": None,
+            })
+            per_site[i % len(sites)].append(device)
+
+        # Interfaces and cables wire each site into a perimeter/core/dist/access tree.
+        for devices in per_site:
+            layers = [
+                [d for d in devices if d["name"].startswith("fw-perimeter")],
+                [d for d in devices if d["name"].startswith("core-rtr")],
+                [d for d in devices if d["name"].startswith("dist-sw")],
+                [d for d in devices if d["name"].startswith("access-sw")],
+            ]
+            for upper, lower in zip(layers, layers[1:]):
+                if not upper:
+                    continue
+                for j, device in enumerate(lower):
+                    self._cable(upper[j % len(upper)], device)
+
+        base = ipaddress.ip_network("10.0.0.0/8")
+        subnets = base.subnets(new_prefix=24)
+        containers = []
+        for i, site in enumerate(sites):
+            containers.append(self._new("ipam/prefixes/", {
+                "prefix": str(ipaddress.ip_network(f"10.{i % 256}.0.0/16")), "family": {"value": 4},
+                "site": _ref(site, "name", "slug"), "vrf": None, "status": _status("container"),
+                "description": f"{site['name']} aggregate",
+            }))
+        prefixes = []
+        for i in range(max(0, n_prefixes - len(containers))):
+            net = next(subnets)
+            site = sites[(net.network_address.packed[1]) % len(sites)]
+            prefixes.append(self._new("ipam/prefixes/", {
+                "prefix": str(net), "family": {"value": 4}, "site": _ref(site, "name", "slug"),
+                "vrf": _ref(vrf, "name") if i % 10 == 9 else None,
+                "tenant": _ref(tenant, "name", "slug"), "status": _status(),
+                "description": f"Segment {i + 1}",
+            }))
+        for i in range(n_ips):
+            if not prefixes:
+                break
+            prefix = prefixes[i % len(prefixes)]
+            net = ipaddress.ip_network(prefix["prefix"])
+            host = i // len(prefixes) + 1
+            if host >= net.num_addresses - 1:
+                continue
+            self._new("ipam/ip-addresses/", {
+                "address": f"{net.network_address + host}/{net.prefixlen}", "family": {"value": 4},
+                "vrf": prefix["vrf"], "status": _status(), "description": f"Host {i + 1}",
+                "tenant": prefix.get("tenant"), "assigned_object": None,
+            })
+        for i in range(n_vlans):
+            self._new("ipam/vlans/", {"vid": (i % 4094) + 1, "name": f"VLAN-{i + 1:04d}",
+                                      "status": _status(), "site": _ref(sites[i % len(sites)], "name", "slug")})
+
+    def record_change(self, path, obj, action):
+        app, model = path.strip("/").split("/")[:2]
+        self.next_id["changes"] += 1
+        self.changes.append({
+            "id": self.next_id["changes"], "url": f"{BASE_URL}/api/core/object-changes/{self.next_id['changes']}/",
+            "display": f"{model} {action}", "time": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "action": {"value": action, "label": action.title()},
+            "changed_object_type": f"{app}.{(model[:-2] if model.endswith(('xes', 'sses')) else model[:-1]).replace('-', '')}",
+            "changed_object_id": obj["id"], "postchange_data": None if action == "delete" else obj,
+        })
+
+    def _interface(self, device):
+        count = self.interface_count[device["id"]]
+        self.interface_count[device["id"]] += 1
+        return self._new("dcim/interfaces/", {
+            "name": f"Gi0/{count}", "device": _ref(device, "name"), "type": {"value": "1000base-t"},
+            "enabled": True, "cable": None,
+        })
+
+    def _cable(self, a, b):
+        ia, ib = self._interface(a), self._interface(b)
+        cable = self._new("dcim/cables/", {
+            "label": "", "status": _status("connected"), "type": "cat6",
+            "a_terminations": [{"object_type": "dcim.interface", "object_id": ia["id"],
+                                "object": {"id": ia["id"], "name": ia["name"], "device": ia["device"]}}],
+            "b_terminations": [{"object_type": "dcim.interface", "object_id": ib["id"],
+                                "object": {"id": ib["id"], "name": ib["name"], "device": ib["device"]}}],
+        })
+        cable["display"] = f"#{cable['id']}"
+        ia["cable"] = ib["cable"] = {"id": cable["id"], "display": cable["display"]}
+
+
+def _field(obj, key):
+    value = obj.get(key)
+    if isinstance(value, dict):
+        return {str(value.get(k)) for k in ("id", "slug", "name", "value", "rd") if value.get(k) is not None}
+    if isinstance(value, list):
+        return {str(t.get("slug", t)) for t in value}
+    if key == "address" and value:
+        return {value, value.split("/")[0]}
+    return {str(value)} if value is not None else {"null"}
+
+
+@functools.lru_cache(maxsize=None)
+def _network(value):
+    return ipaddress.ip_interface(value).network if "/" in value else ipaddress.ip_network(value)
+
+
+def _parent_filter(values):
+    """Predicate for parent=...: one masked set lookup per distinct parent length."""
+    parents = {}
+    for value in values:
+        net = ipaddress.ip_network(value, strict=False)
+        parents.setdefault((net.version, net.prefixlen), set()).add(int(net.network_address))
+
+    def match(obj):
+        try:
+            if obj.get("address"):
+                addr = ipaddress.ip_interface(obj["address"]).ip
+                own_len = None
+            else:
+                net = _network(obj["prefix"])
+                addr, own_len = net.network_address, net.prefixlen
+        except (KeyError, ValueError):
+            return False
+        for (version, length), networks in parents.items():
+            if version != addr.version or (own_len is not None and own_len <= length):
+                continue
+            shift = addr.max_prefixlen - length
+            if int(addr) >> shift << shift in networks:
+                return True
+        return False
+    return match
+
+
+def _filter(key, values):
+    """Build a predicate for one query parameter, parsed once per request."""
+    if key in ("limit", "offset", "brief", "ordering", "fields", "exclude"):
+        return None
+    if key == "q":
+        return lambda obj: any(v.lower() in json.dumps(obj).lower() for v in values)
+    if key == "parent":
+        return _parent_filter(values)
+    if key == "id__gt":
+        return lambda obj: obj["id"] > int(values[0])
+    wanted = set(values)
+    if key.endswith("_id"):
+        def match_ref(obj):
+            ref = obj.get(key[:-3])
+            return (str(ref.get("id")) if isinstance(ref, dict) else "null") in wanted
+        return match_ref
+    if key == "tag":
+        return lambda obj: bool(_field(obj, "tags") & wanted)
+    return lambda obj: key not in obj or bool(_field(obj, key) & wanted)
+
+
+def create_app(inventory, latency=0.0):
+    stats = Counter()
+
+    async def api(request: Request):
+        path = request.path_params["path"]
+        if not path.endswith("/"):
+            path += "/"
+        stats[path] += 1
+        stats["__total__"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if path == "status/":
+            return JSONResponse({"netbox-version": "4.1.0"})
+        if request.method == "POST":
+            payload = await request.json()
+            items = payload if isinstance(payload, list) else [payload]
+            created = [inventory._new(path, dict(item)) for item in items]
+            for obj in created:
+                inventory.record_change(path, obj, "create")
+            return JSONResponse(created if isinstance(payload, list) else created[0], status_code=201)
+        parts = path.rstrip("/").split("/")
+        if parts[-1].isdigit():
+            table_path = "/".join(parts[:-1]) + "/"
+            table = inventory.tables.get(table_path, [])
+            for obj in table:
+                if obj["id"] == int(parts[-1]):
+                    if request.method == "PATCH":
+                        obj.update(await request.json())
+                        inventory.record_change(table_path, obj, "update")
+                    elif request.method == "DELETE":
+                        table.remove(obj)
+                        inventory.record_change(table_path, obj, "delete")
+                        return Response(status_code=204)
+                    return JSONResponse(obj)
+            return JSONResponse({"detail": "Not found."}, status_code=404)
+        if path not in inventory.tables and path not in ("core/object-changes/", "extras/object-changes/"):
+            if path.count("/") != 2:
+                return JSONResponse({"detail": "Not found."}, status_code=404)
+        rows = inventory.changes if path.endswith("object-changes/") else inventory.tables.get(path, [])
+        filters = {}
+        for key, value in request.query_params.multi_items():
+            filters.setdefault(key, []).append(value)
+        for key, values in filters.items():
+            match = _filter(key, values)
+            if match:
+                rows = [r for r in rows if match(r)]
+        if filters.get("ordering", [""])[0] == "-id":
+            rows = sorted(rows, key=lambda r: -r["id"])
+        limit = int(filters.get("limit", ["50"])[0]) or 1000
+        limit = min(limit, 1000)
+        offset = int(filters.get("offset", ["0"])[0])
+        page = rows[offset:offset + limit]
+        if "brief" in filters:
+            page = [{"id": r["id"], "url": r["url"], "display": r["display"]} for r in page]
+        nxt = None
+        if offset + limit < len(rows):
+            params = dict(request.query_params)
+            params.update(limit=str(limit), offset=str(offset + limit))
+            nxt = str(request.url.replace_query_params(**params))
+        return JSONResponse({"count": len(rows), "next": nxt, "previous": None, "results": page})
+
+    async def get_stats(request: Request):
+        data = dict(stats)
+        if request.query_params.get("reset"):
+            stats.clear()
+        return JSONResponse(data)
+
+    return Starlette(routes=[
+        Route("/_stats", get_stats),
+        Route("/api/{path:path}", api, methods=["GET", "POST", "PATCH", "DELETE"]),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=int(os.getenv("FAKE_NETBOX_PORT", "18080")))
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--prefixes", type=int, default=100)
+    parser.add_argument("--ips", type=int, default=1000)
+    parser.add_argument("--vlans", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API response")
+    args = parser.parse_args()
+    global BASE_URL
+    BASE_URL = os.getenv("FAKE_NETBOX_URL", f"http://127.0.0.1:{args.port}")
+    inventory = Inventory(args.devices, args.prefixes, args.ips, args.vlans)
+    uvicorn.run(create_app(inventory, args.latency), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
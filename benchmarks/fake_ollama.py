@@ -0,0 +1,96 @@
+"""Stub Ollama /api/chat endpoint that asks for tools named in the user message.
+
+A user message containing `call list_devices{"site": "site-001"}` is answered
+with that tool call; a turn that already has tool results is answered with a
+short summary. /_calls lists the requests received (message count, prompt
+size); ?reset=1 clears the list.
+
+    python benchmarks/fake_ollama.py --port 11435 --delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+CALLS = []
+DELAY = 0.0
+
+
+async def chat(request):
+    body = await request.json()
+    if DELAY:
+        await asyncio.sleep(DELAY)
+    CALLS.append({"messages": len(body.get("messages", [])), "tools": bool(body.get("tools")),
+                  "prompt_chars": sum(len(str(m.get("content", ""))) for m in body.get("messages", []))})
+    messages = body.get("messages", [])
+    last = messages[-1] if messages else {}
+    message = {"role": "assistant", "content": ""}
+    if last.get("role") == "user" and body.get("tools"):
+        calls = []
+        for name, args in re.findall(r"call (\w+)(\{[^}]*\})?", last.get("content", "")):
+            calls.append({"function": {"name": name, "arguments": json.loads(args) if args else {}}})
+        if calls:
+            message["tool_calls"] = calls
+        else:
+            message["content"] = "Tidak ada tool yang dipanggil."
+    else:
+        tools = [m for m in messages if m.get("role") == "tool"]
+        message["content"] = f"Ringkasan dari {len(tools)} hasil tool. " + " ".join(
+            str(m.get("content", ""))[:60] for m in tools[-3:])
+    stats = {"prompt_eval_count": 100, "prompt_eval_duration": 5_000_000, "eval_count": 20,
+             "eval_duration": 10_000_000, "total_duration": 20_000_000, "load_duration": 1_000_000}
+    if body.get("stream"):
+        def gen():
+            words = message["content"].split(" ") if message["content"] else [""]
+            for i, word in enumerate(words):
+                chunk = {"model": body.get("model"), "created_at": "2026-01-01T00:00:00Z",
+                         "message": {"role": "assistant", "content": word + (" " if i < len(words) - 1 else "")},
+                         "done": False}
+                if i == 0 and message.get("tool_calls"):
+                    chunk["message"]["tool_calls"] = message["tool_calls"]
+                yield json.dumps(chunk) + "\n"
+                time.sleep(0.005)
+            yield json.dumps({"model": body.get("model"), "created_at": "2026-01-01T00:00:00Z",
+                              "message": {"role": "assistant", "content": ""}, "done": True,
+                              "done_reason": "stop", **stats}) + "\n"
+        return StreamingResponse(gen(), media_type="application/x-ndjson")
+    return JSONResponse({"model": body.get("model"), "created_at": "2026-01-01T00:00:00Z",
+                         "message": message, "done": True, "done_reason": "stop", **stats})
+
+
+async def generate(request):
+    body = await request.json()
+    CALLS.append({"generate": True, "keep_alive": body.get("keep_alive")})
+    return JSONResponse({"model": body.get("model"), "created_at": "2026-01-01T00:00:00Z",
+                         "response": "", "done": True})
+
+
+async def calls(request):
+    data = list(CALLS)
+    if request.query_params.get("reset"):
+        CALLS.clear()
+    return JSONResponse(data)
+
+
+app = Starlette(routes=[Route("/api/chat", chat, methods=["POST"]),
+                        Route("/api/generate", generate, methods=["POST"]),
+                        Route("/_calls", calls)])
+
+def main():
+    global DELAY
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every /api/chat response")
+    args = parser.parse_args()
+    DELAY = args.delay
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
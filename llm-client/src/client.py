@@ -1,7 +1,17 @@
 import asyncio
+import contextvars
+import ipaddress
+import json
 import os
+import re
 import sys
+import threading
+import time
+import weakref
 import ollama
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from mcp import types
 from mcp.client.sse import sse_client
 from mcp.client.session import ClientSession
 
@@ -9,72 +19,727 @@ from mcp.client.session import ClientSession
 MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://netbox-mcp:8000/sse")
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
 MODEL_NAME = os.getenv("MODEL_NAME", "llama3")
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "4"))
+MCP_RECONNECT_ATTEMPTS = int(os.getenv("MCP_RECONNECT_ATTEMPTS", "5"))
+MCP_RECONNECT_BACKOFF = float(os.getenv("MCP_RECONNECT_BACKOFF", "0.5"))
+MCP_PING_TIMEOUT = float(os.getenv("MCP_PING_TIMEOUT", "5"))
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "2"))
+STALE_TOOL_RESULT_TOKENS = int(os.getenv("STALE_TOOL_RESULT_TOKENS", "200"))
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() in ("1", "true", "yes")
+# Chat requests sent to Ollama at once; later ones wait in arrival order
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", "2"))
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "120"))
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "64"))
+# template: answer routed lookups without the LLM, llm: one LLM call to phrase the answer, off: always ask the LLM
+INTENT_ROUTER = os.getenv("INTENT_ROUTER", "template").lower()
+INTENT_INDEX_LIMIT = int(os.getenv("INTENT_INDEX_LIMIT", "20000"))
+# Optional JSON-lines file for OpenTelemetry-style spans (turns, model calls, tool calls, MCP connects)
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Resource the MCP server sends notifications/resources/updated for when NetBox changes
+INVENTORY_URI = "netbox://inventory"
 
-async def get_available_tools():
-    """Connect to MCP and get available tools."""
-    async with sse_client(MCP_SERVER_URL) as (read_stream, write_stream):
-        async with ClientSession(read_stream, write_stream) as session:
-            await session.initialize()
-            tools = await session.list_tools()
-            return tools.tools
-
-async def call_mcp_tool(function_name: str, arguments: dict):
-    """Connect to MCP and execute a tool."""
-    async with sse_client(MCP_SERVER_URL) as (read_stream, write_stream):
-        async with ClientSession(read_stream, write_stream) as session:
-            await session.initialize()
-            result = await session.call_tool(function_name, arguments)
-            return result
-
-def run_chat_loop():
-    print(f"Connecting to MCP Server at {MCP_SERVER_URL}...", flush=True)
-    
-    # Get available tools
+# Where the current chat turn writes: stdout for the CLI, the session buffer in gateway.py
+output = contextvars.ContextVar('output', default=print)
+
+def say(*args, **kwargs):
+    """print() to the output of the chat session the current task belongs to."""
+    output.get()(*args, **kwargs)
+
+# Seconds per phase of the turn the current task belongs to, and totals over all turns (gateway /metrics)
+turn_timings = contextvars.ContextVar('turn_timings', default=None)
+turn_totals = Counter()
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+def add_timing(phase, seconds):
+    timings = turn_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as a span appended to TRACE_FILE; the yielded dict's attributes can be extended."""
+    if not TRACE_FILE:
+        yield {'attributes': {}}
+        return
+    parent = _current_span.get()
+    current = {
+        'name': name,
+        'service': 'llm-client',
+        'trace_id': parent['trace_id'] if parent else os.urandom(16).hex(),
+        'span_id': os.urandom(8).hex(),
+        'parent_span_id': parent['span_id'] if parent else None,
+        'start_time_unix_nano': time.time_ns(),
+        'attributes': dict(attributes),
+    }
+    token = _current_span.set(current)
     try:
-        tools = asyncio.run(get_available_tools())
-        print(f"Connected! Available tools: {[t.name for t in tools]}", flush=True)
+        yield current
     except Exception as e:
-        print(f"Failed to connect to MCP Server: {e}")
-        return
-    
-    # Prepare tools for Ollama
-    ollama_tools = []
-    for tool in tools:
-        ollama_tools.append({
-            'type': 'function',
-            'function': {
-                'name': tool.name,
-                'description': tool.description,
-                'parameters': tool.inputSchema
-            }
-        })
+        current['status'] = 'error'
+        current['attributes']['error'] = str(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current['end_time_unix_nano'] = time.time_ns()
+        with open(TRACE_FILE, 'a') as f:
+            f.write(json.dumps(current, default=str) + "\n")
 
-    # Setup Ollama client
-    client = ollama.Client(host=OLLAMA_HOST)
-    
-    # Memory with system prompt
-    system_prompt = """You are a network operations assistant with access to NetBox, a network infrastructure management tool.
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def _message_tokens(message):
+    return estimate_tokens(str(message.get('content') or '')) + estimate_tokens(str(message.get('tool_calls') or ''))
+
+def _truncate(message, max_tokens):
+    """Copy of a tool message whose content is cut to about max_tokens."""
+    content = str(message.get('content') or '')
+    if estimate_tokens(content) <= max_tokens:
+        return message
+    keep = max(0, max_tokens * 4 - 80)
+    note = f"... [{message.get('name', 'tool')} result truncated, {estimate_tokens(content)} tokens originally]"
+    return dict(message, content=content[:keep] + note)
+
+class ConversationContext:
+    """Token-budgeted chat history sent to Ollama.
+
+    The system prompt is always kept. The last `keep_turns` turns (a user
+    message and everything after it) are sent verbatim, tool results of older
+    turns are cut to `stale_tool_tokens`, and the oldest turns are dropped while
+    the estimate exceeds `budget`. If the current turn alone is over budget its
+    tool results are truncated to share what is left.
+    """
+
+    def __init__(self, system_prompt, budget=CONTEXT_TOKEN_BUDGET, keep_turns=CONTEXT_KEEP_TURNS,
+                 stale_tool_tokens=STALE_TOOL_RESULT_TOKENS):
+        self.system = {'role': 'system', 'content': system_prompt}
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.stale_tool_tokens = stale_tool_tokens
+        self.turns = []
+
+    def add_user(self, content):
+        self.turns.append([{'role': 'user', 'content': content}])
+
+    def add(self, message):
+        self.turns[-1].append(message)
+
+    def _compact(self):
+        for turn in self.turns[:-self.keep_turns] if self.keep_turns else self.turns[:-1]:
+            turn[:] = [_truncate(m, self.stale_tool_tokens) if m.get('role') == 'tool' else m for m in turn]
+
+        available = self.budget - _message_tokens(self.system)
+        while len(self.turns) > 1 and sum(_message_tokens(m) for t in self.turns for m in t) > available:
+            self.turns.pop(0)
+
+        current = self.turns[-1] if self.turns else []
+        tools = [i for i, m in enumerate(current) if m.get('role') == 'tool']
+        other = sum(_message_tokens(m) for i, m in enumerate(current) if i not in tools)
+        if tools and other + sum(_message_tokens(current[i]) for i in tools) > available:
+            share = max(self.stale_tool_tokens, (available - other) // len(tools))
+            for i in tools:
+                current[i] = _truncate(current[i], share)
+
+    def messages(self):
+        """The messages for the next chat request, compacted to the budget."""
+        self._compact()
+        return [self.system] + [m for turn in self.turns for m in turn]
+
+class MCPConnection:
+    """A long-lived SSE session to the MCP server.
+
+    The SSE transport and ClientSession are entered and exited inside one
+    background task (anyio cancel scopes must not cross tasks); callers only
+    use the initialized session.
+    """
+
+    def __init__(self, url, on_message=None):
+        self.url = url
+        self.on_message = on_message
+        self.session = None
+        self.error = None
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task = None
+
+    async def connect(self):
+        started = time.perf_counter()
+        with span('mcp.connect', url=self.url):
+            self._task = asyncio.create_task(self._run())
+            await self._ready.wait()
+        add_timing('mcp_connect', time.perf_counter() - started)
+        if self.session is None:
+            raise ConnectionError(f"Cannot connect to MCP server: {self.error}")
+        return self
+
+    async def _run(self):
+        try:
+            async with sse_client(self.url) as (read_stream, write_stream):
+                async with ClientSession(read_stream, write_stream, message_handler=self.on_message) as session:
+                    await session.initialize()
+                    if self.on_message:
+                        try:
+                            await session.subscribe_resource(INVENTORY_URI)
+                        except Exception:
+                            # Server without change notifications
+                            pass
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self):
+        return self.session is not None and not self._task.done()
+
+    async def ping(self):
+        """Return True if the session still answers a ping."""
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), MCP_PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        self._closing.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, MCP_PING_TIMEOUT)
+            except Exception:
+                self._task.cancel()
+
+class MCPSessionPool:
+    """Small pool of persistent MCP sessions with reconnect and exponential backoff.
+
+    Sessions are opened lazily up to `size`, so independent tool calls can run
+    concurrently while a single call reuses an already initialized session.
+    """
+
+    def __init__(self, url, size=MCP_POOL_SIZE, on_message=None):
+        self.url = url
+        self.size = size
+        self.on_message = on_message
+        self._idle = []
+        self._all = set()
+        self._slots = asyncio.Semaphore(size)
+
+    async def _open(self):
+        delay = MCP_RECONNECT_BACKOFF
+        for attempt in range(1, MCP_RECONNECT_ATTEMPTS + 1):
+            try:
+                conn = await MCPConnection(self.url, self.on_message).connect()
+                self._all.add(conn)
+                return conn
+            except ConnectionError as e:
+                if attempt == MCP_RECONNECT_ATTEMPTS:
+                    raise
+                say(f"  (MCP connection failed, retry {attempt} in {delay:.1f}s: {e})", flush=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def _discard(self, conn):
+        self._all.discard(conn)
+        await conn.close()
+
+    @asynccontextmanager
+    async def session(self):
+        """Borrow a live connection from the pool."""
+        async with self._slots:
+            conn = None
+            while self._idle and conn is None:
+                conn = self._idle.pop()
+                if not conn.alive:
+                    await self._discard(conn)
+                    conn = None
+            if conn is None:
+                conn = await self._open()
+            try:
+                yield conn
+            finally:
+                if conn.alive:
+                    self._idle.append(conn)
+                else:
+                    await self._discard(conn)
+
+    async def _request(self, method, *args, **kwargs):
+        async with self.session() as conn:
+            try:
+                return await getattr(conn.session, method)(*args, **kwargs)
+            except Exception:
+                if await conn.ping():
+                    raise
+            # The session dropped underneath us: reconnect once and retry
+            say("  (MCP session lost, reconnecting...)", flush=True)
+            await self._discard(conn)
+            retry = None
+            try:
+                retry = await self._open()
+                return await getattr(retry.session, method)(*args, **kwargs)
+            except Exception as e:
+                raise ConnectionError(f"MCP session lost and reconnecting failed: {e}") from e
+            finally:
+                if retry is not None:
+                    if retry.alive:
+                        self._idle.append(retry)
+                    else:
+                        await self._discard(retry)
+
+    async def list_tools(self):
+        return await self._request("list_tools")
+
+    async def call_tool(self, name, arguments, progress_callback=None):
+        return await self._request("call_tool", name, arguments, progress_callback=progress_callback)
+
+    async def close(self):
+        for conn in list(self._all):
+            await self._discard(conn)
+        self._idle.clear()
+
+class ToolResultCache:
+    """Per-session memo of tool results keyed by tool name and canonical (sorted JSON) arguments.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_entries`. Only successful results are stored. Every
+    chat session owns one; all of them are cleared when NetBox changes.
+    """
+
+    def __init__(self, ttl=TOOL_CACHE_TTL, max_entries=TOOL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        tool_caches.add(self)
+
+    def key(self, name, arguments):
+        return name, json.dumps(arguments or {}, sort_keys=True, default=str)
+
+    def get(self, name, arguments):
+        key = self.key(name, arguments)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, name, arguments, result):
+        if self.ttl <= 0 or self.max_entries <= 0 or result.startswith("Error"):
+            return
+        key = self.key(name, arguments)
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        dropped = len(self._entries)
+        self._entries.clear()
+        return dropped
+
+# Every session's ToolResultCache, for clearing them all on an inventory notification
+tool_caches = weakref.WeakSet()
+
+class ModelQueue:
+    """FIFO admission to the model: at most `limit` chat requests run at once.
+
+    asyncio.Semaphore wakes waiters in arrival order, and a turn re-queues for
+    each of its requests, so concurrent sessions take turns at the model.
+    """
+
+    def __init__(self, limit=MODEL_CONCURRENCY):
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+model_queue = ModelQueue()
+
+intent_router = None
+
+async def on_server_message(message):
+    """Drop memoized tool results (and the router's name index) when the MCP server reports a NetBox change."""
+    if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ResourceUpdatedNotification):
+        if str(message.root.params.uri) != INVENTORY_URI:
+            return
+        if intent_router:
+            intent_router.stale = True
+        if sum(cache.invalidate() for cache in list(tool_caches)):
+            print("\n  (NetBox changed, cached tool results cleared)", flush=True)
+
+async def get_available_tools(pool):
+    """Get available tools over a pooled MCP session."""
+    tools = await pool.list_tools()
+    return tools.tools
+
+async def call_mcp_tool(pool, function_name: str, arguments: dict, progress_callback=None):
+    """Execute a tool over a pooled MCP session."""
+    return await pool.call_tool(function_name, arguments, progress_callback=progress_callback)
+
+def tool_result_text(result):
+    """Text of an MCP tool result, with TextContent unwrapped instead of repr()'d."""
+    return "\n".join(c.text if getattr(c, 'type', None) == 'text' else str(c) for c in result.content)
+
+async def execute_tool_calls(pool, tool_calls, tool_cache=None):
+    """Run the tool calls of one LLM turn concurrently.
+
+    At most TOOL_CONCURRENCY calls are in flight, each is cancelled after
+    TOOL_TIMEOUT seconds, and the (name, result) pairs come back in the
+    original tool_calls order. Cancelling the caller cancels every call.
+    Results are memoized in the session's `tool_cache` when one is given.
+    """
+    limit = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+    async def run(tool_call):
+        function_name = tool_call['function']['name']
+        arguments = tool_call['function']['arguments']
+        cached = tool_cache.get(function_name, arguments) if tool_cache is not None else None
+        if cached is not None:
+            say(f"  ({function_name}: cached result)", flush=True)
+            return function_name, cached
+        # Streaming tools (stream=true) deliver their pages as progress notifications
+        pages = []
+
+        async def on_progress(progress, total, message):
+            if message:
+                pages.append(message)
+                say(f"  ({function_name}: page {len(pages)} received)", flush=True)
+
+        async with limit:
+            try:
+                with span('mcp.call_tool', tool=function_name):
+                    result = await asyncio.wait_for(
+                        call_mcp_tool(pool, function_name, arguments, progress_callback=on_progress), TOOL_TIMEOUT
+                    )
+                text = "\n".join(pages) if pages else tool_result_text(result)
+                if tool_cache is not None:
+                    tool_cache.set(function_name, arguments, text)
+                return function_name, text
+            except asyncio.TimeoutError:
+                return function_name, f"Error calling tool: timed out after {TOOL_TIMEOUT:g}s"
+            except Exception as e:
+                return function_name, f"Error calling tool: {e}"
+
+    started = time.perf_counter()
+    try:
+        return await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
+    finally:
+        add_timing('tools', time.perf_counter() - started)
+
+def decode_result(text):
+    """Parse a compact tool result, expanding {"columns", "rows"} tables back into lists of dicts.
+
+    Returns None when the text is not JSON (e.g. "Device not found." or an error).
+    """
+    def expand(value):
+        if isinstance(value, dict):
+            if set(value) == {"columns", "rows"}:
+                return [{c: expand(v) for c, v in zip(value["columns"], row) if v is not None} for row in value["rows"]]
+            return {key: expand(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [expand(item) for item in value]
+        return value
+
+    try:
+        return expand(json.loads(text))
+    except ValueError:
+        return None
+
+def _display(value):
+    """Short text for a field value; nested NetBox objects show their display name."""
+    if isinstance(value, dict):
+        for key in ('display', 'name', 'label', 'value', 'address', 'prefix'):
+            if key in value:
+                return str(value[key])
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, list):
+        return ", ".join(_display(item) for item in value)
+    return str(value)
+
+def render_result(text):
+    """Render a tool result as plain text for an answer that skipped the LLM."""
+    data = decode_result(text)
+    if data is None:
+        if text.startswith("Error"):
+            return text
+        return f"Data tidak ditemukan di NetBox. ({text.strip()})"
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        rows = data['results']
+        if not rows:
+            return "Data tidak ditemukan di NetBox."
+        lines = [f"Ditemukan {data.get('count', len(rows))} data, menampilkan {len(rows)}:"]
+        if data.get('next_cursor') is not None:
+            lines[0] += f" (halaman berikutnya: offset={data['next_cursor']})"
+        data = rows
+    else:
+        lines = []
+    if isinstance(data, list) and data and all(isinstance(row, dict) for row in data):
+        columns = list(dict.fromkeys(key for row in data for key in row))
+        cells = [[_display(row.get(c, '')) for c in columns] for row in data]
+        widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+        lines.append("  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip())
+        lines.extend("  ".join(v.ljust(w) for v, w in zip(r, widths)).rstrip() for r in cells)
+    elif isinstance(data, list) and data:
+        lines.extend(f"- {_display(item)}" for item in data)
+    elif isinstance(data, list):
+        lines.append("Data tidak ditemukan di NetBox.")
+    elif isinstance(data, dict):
+        lines.extend(f"{key}: {_display(value)}" for key, value in data.items()
+                     if key not in ('url', 'display_url', 'custom_fields'))
+    else:
+        lines.append(_display(data))
+    return "\n".join(lines)
+
+# Words that may surround a lookup without changing which tool answers it
+FILLER_WORDS = {
+    'show', 'list', 'get', 'display', 'find', 'lookup', 'look', 'up', 'what', 'which', 'is', 'are', 'the', 'a',
+    'an', 'all', 'of', 'about', 'details', 'detail', 'info', 'information', 'for', 'me', 'please', 'tell', 'give',
+    'in', 'at', 'on', 'status', 'tampilkan', 'lihat', 'daftar', 'semua', 'apa', 'itu', 'ini', 'informasi',
+    'tentang', 'di', 'untuk', 'cari', 'tolong', 'berikan', 'data', 'yang', 'ada', 'and', 'dan',
+}
+# Extra words for the list_<things> keywords derived from the tool names
+KEYWORD_SYNONYMS = {'subnet': 'prefixes', 'subnets': 'prefixes', 'ip': 'ip_addresses', 'ips': 'ip_addresses',
+                    'perangkat': 'devices', 'lokasi': 'sites'}
+VLAN_TOKEN = re.compile(r'vlan-?(\d{1,4})$')
+
+def _singular(word):
+    return word[:-2] if word.endswith(('sses', 'xes')) else word[:-1] if word.endswith('s') else word
+
+class IntentRouter:
+    """Maps unambiguous lookups straight onto one tool call, skipping the model's tool-selection round trip.
+
+    Keywords come from the tool list (list_vlans answers "vlans" and "vlan")
+    and names from NetBox device and site names, read once through the tools
+    and re-read after an inventory notification. A message is routed only when
+    every word is a recognized name, address, keyword or filler word, and it
+    names exactly one thing to look up (or several devices or several IP
+    addresses, answered by one batch call); anything else goes to the LLM.
+    """
+
+    def __init__(self, tools):
+        self.params = {tool.name: set((tool.inputSchema or {}).get('properties', {})) for tool in tools}
+        self.keywords = {}
+        for name in self.params:
+            if name.startswith('list_'):
+                plural = name[len('list_'):]
+                for phrase in (plural, _singular(plural)):
+                    self.keywords[tuple(phrase.split('_'))] = plural
+        for word, plural in KEYWORD_SYNONYMS.items():
+            if f"list_{plural}" in self.params:
+                self.keywords[(word,)] = plural
+        self.names = {}
+        self.max_words = max([len(k) for k in self.keywords] + [1])
+        self.stale = True
+        self._refresh = None
+
+    async def _read_names(self, pool, tool, **arguments):
+        names, offset = [], 0
+        while len(names) < INTENT_INDEX_LIMIT:
+            result = await call_mcp_tool(pool, tool, dict(arguments, offset=offset) if offset else arguments)
+            data = decode_result(tool_result_text(result))
+            if isinstance(data, list):
+                return names + [str(item) for item in data]
+            if not isinstance(data, dict):
+                break
+            names.extend(row['name'] for row in data.get('results', []) if row.get('name'))
+            offset = data.get('next_cursor')
+            if offset is None:
+                break
+        return names
+
+    async def load_names(self, pool):
+        """(Re)build the name index from NetBox device and site names."""
+        self.stale = False
+        names = {}
+        try:
+            if 'list_sites' in self.params:
+                for name in await self._read_names(pool, 'list_sites'):
+                    names[tuple(name.lower().split())] = ('site', name)
+            if 'get_device' in self.params and 'list_devices' in self.params:
+                for name in await self._read_names(pool, 'list_devices', fields='name', limit=1000):
+                    names[tuple(name.lower().split())] = ('device', name)
+        except Exception as e:
+            print(f"  (Intent router name index unavailable: {e})", flush=True)
+            return
+        self.names = names
+        self.max_words = max([len(k) for k in list(self.keywords) + list(names)] + [1])
+
+    def refresh(self, pool):
+        """Rebuild the name index in the background once it is marked stale."""
+        if self.stale and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.create_task(self.load_names(pool))
+
+    def close(self):
+        if self._refresh:
+            self._refresh.cancel()
+
+    def _entities(self, text):
+        """Split the message into (kind, value) entities; None if a word is not recognized."""
+        tokens = [t.strip('?!,;"\'()') for t in text.lower().split()]
+        tokens = [t.rstrip('.') for t in tokens if t.strip('.')]
+        found, i = [], 0
+        while i < len(tokens):
+            for n in range(min(self.max_words, len(tokens) - i), 0, -1):
+                phrase = tuple(tokens[i:i + n])
+                if phrase in self.names:
+                    found.append(self.names[phrase])
+                    break
+                if phrase in self.keywords:
+                    plural = self.keywords[phrase]
+                    following = tokens[i + n] if i + n < len(tokens) else ''
+                    if plural == 'vlans' and following.isdigit():
+                        found.append(('vlan', int(following)))
+                        n += 1
+                    else:
+                        found.append(('keyword', plural))
+                    break
+            else:
+                n, token = 1, tokens[i]
+                vlan = VLAN_TOKEN.match(token)
+                if vlan:
+                    found.append(('vlan', int(vlan.group(1))))
+                elif token in FILLER_WORDS:
+                    pass
+                else:
+                    try:
+                        if '/' in token:
+                            try:
+                                found.append(('prefix', str(ipaddress.ip_network(token))))
+                            except ValueError:
+                                found.append(('ip', str(ipaddress.ip_interface(token))))
+                        else:
+                            found.append(('ip', str(ipaddress.ip_address(token))))
+                    except ValueError:
+                        return None
+            i += n
+        return found
+
+    def route(self, text):
+        """(tool, arguments) for an unambiguous lookup, else None."""
+        found = self._entities(text)
+        if not found:
+            return None
+        lookups = [(kind, value) for kind, value in found if kind not in ('keyword', 'site')]
+        keywords = {value for kind, value in found if kind == 'keyword'}
+        sites = [value for kind, value in found if kind == 'site']
+        if len(sites) > 1:
+            return None
+        if len(lookups) > 1:
+            kinds = {kind for kind, value in lookups}
+            allowed, tool, param = {
+                'device': ({'devices'}, 'get_devices', 'names'),
+                'ip': ({'ip_addresses'}, 'get_ip_addresses', 'addresses'),
+            }.get(kinds.pop() if len(kinds) == 1 else None, (None, None, None))
+            if tool not in self.params or sites or keywords - allowed:
+                return None
+            return tool, {param: list(dict.fromkeys(value for kind, value in lookups))}
+        if lookups:
+            kind, value = lookups[0]
+            allowed, tool, arguments = {
+                'device': ({'devices'}, 'get_device', {'name': value}),
+                'ip': ({'ip_addresses'}, 'get_ip_address', {'address': value}),
+                'prefix': ({'prefixes'}, 'get_prefix', {'prefix': value}),
+                'vlan': ({'vlans'}, 'list_vlans', {'vid': value}),
+            }[kind]
+            if sites or keywords - allowed or tool not in self.params:
+                return None
+            if kind == 'vlan' and 'vid' not in self.params[tool]:
+                return None
+            return tool, arguments
+        # "sites" next to a site name ("devices at site X") is a filler word
+        if sites:
+            keywords.discard('sites')
+        if len(keywords) != 1:
+            return None
+        tool = f"list_{keywords.pop()}"
+        if sites:
+            if 'site' not in self.params[tool]:
+                return None
+            return tool, {'site': sites[0]}
+        return tool, {}
+
+async def ainput(prompt):
+    """input() on a daemon thread so the event loop (and the SSE sessions) keep running."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def reader():
+        try:
+            result = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_exception(e))
+        else:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(result))
+
+    threading.Thread(target=reader, daemon=True).start()
+    return await future
+
+# Memory with system prompt
+SYSTEM_PROMPT = """You are a network operations assistant with access to NetBox, a network infrastructure management tool.
 
 AVAILABLE TOOLS:
 - list_sites: Lists all sites in NetBox
-- list_devices: Lists all devices in NetBox
+- list_devices: Lists devices in NetBox (filters: site, role, status, tag, tenant)
 - get_device: Gets details of a specific device by name
+- get_devices: Gets details of several devices by name in one call (names: list)
 - get_ip_address: Gets details of a specific IP address (requires exact address like "10.0.0.1")
-- list_ip_addresses: Lists all IP addresses in NetBox
-- list_prefixes: Lists all IP prefixes/subnets with utilization info
+- get_ip_addresses: Gets details of several IP addresses in one call (addresses: list)
+- list_ip_addresses: Lists IP addresses in NetBox (filters: status, tag, vrf, tenant)
+- list_prefixes: Lists IP prefixes/subnets with utilization info (filters: site, status, tag, vrf, tenant)
 - get_prefix: Gets details of a specific prefix (e.g., "10.0.0.0/24")
-- list_vlans: Lists all VLANs in NetBox
+- list_vlans: Lists VLANs in NetBox (filters: site, status, tag, tenant, vid)
 - generate_topology: Generates comprehensive network topology data including devices by role, network segments, VLANs, and layer groupings for documentation and diagram generation
+- count_objects: Counts devices, prefixes, ip_addresses or vlans, optionally grouped (group_by: site, role, device_type, status, vrf, tenant)
+- top_prefix_utilization: Prefixes ranked by IP utilization percentage (limit, min_utilization)
+- find_free_ips: Free IP addresses in a prefix (e.g., "10.0.0.0/24")
+- render_topology: Renders the topology diagram from NetBox cables (format: mermaid, dot or json; site: one site only)
+- find_path: Shortest cable path between two devices (source, target)
+- get_neighbors: Devices cabled to a device, up to N hops away (device, hops)
+- failure_impact: Devices and segments cut off if a device fails (device)
+- search: Fuzzy search for devices, IP addresses, prefixes and VLANs (query; kind: device, ip_address, prefix or vlan)
 
 TOOL USAGE RULES:
 - When the user asks to LIST or show ALL devices, use list_devices.
 - When the user asks about a SPECIFIC device by name, use get_device with the device name.
+- When the user asks about SEVERAL devices or IP addresses by name/address, use ONE get_devices or get_ip_addresses call with all of them instead of one get_device/get_ip_address call each; "missing" lists the ones NetBox does not have.
+- When a name, address or VLAN is partial, misspelled or has no mask (e.g. "core router 1", "10.0.0.1"), or a get_* tool found nothing, use search first and then the get_* tool with the exact name it returns.
 - When the user asks to LIST or show ALL IP addresses, use list_ip_addresses.
 - When the user asks about a SPECIFIC IP address, use get_ip_address with the exact address.
 - When the user asks about sites, use list_sites.
 - When the user asks about subnets, prefixes, or network segments, use list_prefixes or get_prefix.
 - When the user asks about VLANs, use list_vlans.
+- list_devices, list_ip_addresses, list_prefixes and list_vlans return one page: "count" is the total number of matches and "results" the rows. Use the filters instead of listing everything, use "fields" to request only the columns you need, and when "next_cursor" is present and more rows are needed, call the tool again with offset=next_cursor.
+- Tool results are compact JSON: a list of records is written as {"columns": [...], "rows": [[...], ...]} where each row holds the values in column order, and fields that are empty are left out.
+- When the user asks HOW MANY objects there are, or counts per site/role/type/status, use count_objects instead of listing.
+- When the user asks which prefixes are full or most utilized, use top_prefix_utilization; for free/available IPs in a subnet, use find_free_ips.
 - When the user asks for COMPLETE documentation, topology diagram, or network architecture, use generate_topology to get all data at once.
+- When the user only wants a diagram (of one site, or as Graphviz DOT), use render_topology and show its output as returned.
+- When the user asks how two devices are connected, what is connected to a device, or what breaks if a device fails, use find_path, get_neighbors or failure_impact (one call answers it; do not chain get_device calls).
 
 TOPOLOGY DIAGRAM GENERATION - MANDATORY:
 When the user asks for topology diagram or documentation, you MUST include a Mermaid diagram in your response.
@@ -126,112 +791,301 @@ RESPONSE FORMAT:
 - When generating documentation, include: diagram, penjelasan arsitektur, tabel network segmentation, dan device inventory.
 - List data in a clear, structured format when appropriate."""
 
-    messages = [{'role': 'system', 'content': system_prompt}]
-    print("\n--- Start Chatting (type 'quit' to exit) ---")
+async def connect():
+    """Connect to the MCP server and Ollama; shared by the CLI loop and gateway.py.
 
-    while True:
+    Opens the MCP session pool, turns the MCP tools into Ollama tools, starts
+    the intent router and warms the model up. Returns (pool, client, ollama_tools).
+    """
+    print(f"Connecting to MCP Server at {MCP_SERVER_URL}...", flush=True)
+    pool = MCPSessionPool(MCP_SERVER_URL, on_message=on_server_message)
+    
+    # Get available tools
+    try:
+        tools = await get_available_tools(pool)
+        print(f"Connected! Available tools: {[t.name for t in tools]}", flush=True)
+    except Exception:
+        await pool.close()
+        raise
+    
+    # Prepare tools for Ollama
+    ollama_tools = []
+    for tool in tools:
+        ollama_tools.append({
+            'type': 'function',
+            'function': {
+                'name': tool.name,
+                'description': tool.description,
+                'parameters': tool.inputSchema
+            }
+        })
+
+    # Common lookups are answered without asking the model which tool to use
+    global intent_router
+    if INTENT_ROUTER in ('template', 'llm'):
+        intent_router = IntentRouter(tools)
+        intent_router.refresh(pool)
+
+    # Setup Ollama client
+    client = ollama.AsyncClient(host=OLLAMA_HOST)
+    if OLLAMA_WARMUP:
         try:
-            user_input = input("User: ")
-            if user_input.lower() in ['quit', 'exit']:
-                break
+            await warm_up(client, [{'role': 'system', 'content': SYSTEM_PROMPT}], ollama_tools)
+        except Exception as e:
+            print(f"  (Model warm-up failed: {e})")
+    return pool, client, ollama_tools
+
+async def disconnect(pool):
+    if intent_router:
+        intent_router.close()
+    await pool.close()
+
+async def run_chat_loop():
+    try:
+        pool, client, ollama_tools = await connect()
+    except Exception as e:
+        print(f"Failed to connect to MCP Server: {e}")
+        return
+
+    context = ConversationContext(SYSTEM_PROMPT)
+    tool_cache = ToolResultCache()
+    print("\n--- Start Chatting (type 'quit' to exit, '/refresh' to clear cached tool results) ---")
+
+    try:
+        await chat_turns(client, pool, context, ollama_tools, tool_cache)
+    finally:
+        await disconnect(pool)
+
+def timing_report(stats, started, first_token=None):
+    """One-line timing summary from the final Ollama response.
+
+    prompt_eval_count only counts tokens that were not in the KV cache, so it
+    stays small on later turns when the prompt prefix is reused.
+    """
+    parts = []
+    if first_token is not None:
+        parts.append(f"first token after {first_token:.2f}s")
+    if stats is not None and stats.get('prompt_eval_duration') is not None:
+        parts.append(f"prompt eval {stats.get('prompt_eval_count') or 0} tokens in "
+                     f"{stats['prompt_eval_duration'] / 1e9:.2f}s")
+    if stats is not None and stats.get('eval_duration') is not None:
+        parts.append(f"eval {stats.get('eval_count') or 0} tokens in {stats['eval_duration'] / 1e9:.2f}s")
+    parts.append(f"done after {time.perf_counter() - started:.2f}s")
+    return f"  ({', '.join(parts)})"
+
+async def warm_up(client, messages, tools):
+    """Evaluate the system prompt and tool schema once so the first turn reuses the cached prefix."""
+    started = time.perf_counter()
+    response = await client.chat(model=MODEL_NAME, messages=messages, tools=tools,
+                                 keep_alive=OLLAMA_KEEP_ALIVE, options={'num_predict': 1})
+    print(f"  (Model warmed up: {timing_report(response, started)[3:]}", flush=True)
+
+async def chat_completion(client, messages, tools=None, hold_json=False):
+    """Send one chat request and print the answer as its tokens arrive.
+
+    Every request passes the same tools list (and keep_alive), so the rendered
+    system prompt + tool schema prefix is byte-identical and Ollama can reuse
+    its KV cache. Tool calls are collected from whichever chunk carries them.
+    With hold_json, text starting like a JSON object is held back until the
+    stream ends, so a tool call the model writes as text (see the fallback in
+    chat_turns) is not shown. Returns (message, printed); the caller prints
+    unprinted content. Requests wait their turn in model_queue.
+    """
+    queued = time.perf_counter()
+    async with model_queue.slot():
+        started = time.perf_counter()
+        add_timing('queue', started - queued)
+        with span('ollama.chat', model=MODEL_NAME, messages=len(messages)) as current:
+            message, printed, stats = await _chat_completion(client, messages, tools, hold_json)
+            for key in ('prompt_eval_count', 'eval_count'):
+                current['attributes'][key] = (stats or {}).get(key)
+    add_timing('model', time.perf_counter() - started)
+    for phase, key in (('load', 'load_duration'), ('prompt_eval', 'prompt_eval_duration'),
+                       ('generation', 'eval_duration')):
+        add_timing(phase, ((stats or {}).get(key) or 0) / 1e9)
+    return message, printed
+
+async def _chat_completion(client, messages, tools, hold_json):
+    started = time.perf_counter()
+    if not STREAM_RESPONSES:
+        response = await client.chat(model=MODEL_NAME, messages=messages, tools=tools, keep_alive=OLLAMA_KEEP_ALIVE)
+        message = response['message']
+        content = message.get('content') or ''
+        printed = bool(content) and not message.get('tool_calls') and not (hold_json and content.lstrip().startswith('{'))
+        if printed:
+            say(f"Assistant: {content}")
+        say(timing_report(response, started), flush=True)
+        return message, printed, response
+
+    content, tool_calls = [], []
+    first_token = None
+    printed = False
+    stats = None
+    async for chunk in await client.chat(model=MODEL_NAME, messages=messages, tools=tools, stream=True,
+                                         keep_alive=OLLAMA_KEEP_ALIVE):
+        if chunk.get('done'):
+            stats = chunk
+        part = chunk['message']
+        if first_token is None and (part.get('content') or part.get('tool_calls')):
+            first_token = time.perf_counter() - started
+        if part.get('tool_calls'):
+            tool_calls.extend(part['tool_calls'])
+        if not part.get('content'):
+            continue
+        content.append(part['content'])
+        if printed:
+            say(part['content'], end='', flush=True)
+            continue
+        text = ''.join(content)
+        if tool_calls or (hold_json and (not text.strip() or text.lstrip().startswith('{'))):
+            continue
+        say(f"Assistant: {text}", end='', flush=True)
+        printed = True
+    if printed:
+        say()
+    say(timing_report(stats, started, first_token), flush=True)
+
+    message = {'role': 'assistant', 'content': ''.join(content)}
+    if tool_calls:
+        message['tool_calls'] = tool_calls
+    return message, printed, stats
+
+async def answer_routed(client, pool, context, ollama_tools, tool, arguments, tool_cache=None):
+    """Answer a routed lookup: call the tool directly, then render the result (or let the LLM phrase it)."""
+    say(f"  (Routed to {tool}, calling NetBox...)")
+    call = {'function': {'name': tool, 'arguments': arguments}}
+    context.add({'role': 'assistant', 'content': '', 'tool_calls': [call]})
+    [(_, tool_result)] = await execute_tool_calls(pool, [call], tool_cache)
+    context.add({'role': 'tool', 'content': tool_result, 'name': tool})
+    if INTENT_ROUTER == 'llm':
+        final_message, _ = await chat_completion(client, context.messages(), tools=ollama_tools)
+    else:
+        final_message = {'role': 'assistant', 'content': render_result(tool_result)}
+        say(f"Assistant: {final_message['content']}")
+    context.add(final_message)
+
+def turn_breakdown(total, timings):
+    """One-line summary of where a turn's time went."""
+    model = [f"{label} {timings[phase]:.2f}s" for phase, label in
+             (('queue', 'queue'), ('load', 'load'), ('prompt_eval', 'prompt eval'), ('generation', 'generation'))
+             if timings.get(phase)]
+    parts = []
+    if 'model' in timings:
+        parts.append(f"model {timings['model']:.2f}s" + (f" [{', '.join(model)}]" if model else ""))
+    if 'tools' in timings:
+        parts.append(f"tools {timings['tools']:.2f}s")
+    if 'mcp_connect' in timings:
+        parts.append(f"MCP connect {timings['mcp_connect']:.2f}s")
+    return f"  (turn {total:.2f}s" + (f": {', '.join(parts)})" if parts else ")")
+
+async def chat_turn(client, pool, context, ollama_tools, user_input, tool_cache=None):
+    """Answer one user message, writing the answer, progress and a timing breakdown through say()."""
+    timings = {}
+    token = turn_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        with span('chat.turn', model=MODEL_NAME):
+            await _chat_turn(client, pool, context, ollama_tools, user_input, tool_cache)
+    finally:
+        turn_timings.reset(token)
+        total = time.perf_counter() - started
+        turn_totals['turns'] += 1
+        turn_totals['total'] += total
+        turn_totals.update(timings)
+        say(turn_breakdown(total, timings), flush=True)
+
+async def _chat_turn(client, pool, context, ollama_tools, user_input, tool_cache):
+    context.add_user(user_input)
+
+    if intent_router:
+        intent_router.refresh(pool)
+        routed = intent_router.route(user_input)
+        if routed:
+            await answer_routed(client, pool, context, ollama_tools, *routed, tool_cache)
+            return
+
+    # Call Ollama (streamed; a JSON tool call written as text is held back)
+    message, printed = await chat_completion(client, context.messages(), tools=ollama_tools, hold_json=True)
+
+    # Check for tool calls
+    context.add(message)
+
+    if message.get('tool_calls'):
+        say("  (Calling NetBox...)")
+        # Execute all tool calls concurrently on pooled MCP sessions
+        results = await execute_tool_calls(pool, message['tool_calls'], tool_cache)
+        for function_name, tool_result in results:
+            # Add result to history (in the order the model requested)
+            context.add({
+                'role': 'tool',
+                'content': tool_result,
+                'name': function_name
+            })
+        
+        # Get final response after tool execution
+        final_message, _ = await chat_completion(client, context.messages(), tools=ollama_tools)
+        context.add(final_message)
+        return
+
+    # Fallback: Check if the response contains a JSON tool call
+    content = message.get('content', '')
+    json_match = re.search(r'\{["\']name["\']:\s*["\']([\w_]+)["\']', content, re.DOTALL)
+    
+    if json_match:
+        try:
+            function_name = json_match.group(1)
             
-            messages.append({'role': 'user', 'content': user_input})
+            # Try to extract parameters, but handle malformed JSON
+            arguments = {}
             
-            # Call Ollama
-            response = client.chat(
-                model=MODEL_NAME,
-                messages=messages,
-                tools=ollama_tools,
-            )
+            # Try to parse valid JSON first
+            try:
+                json_str = re.search(r'\{.*\}', content, re.DOTALL)
+                if json_str:
+                    # Clean up malformed values like "<nil>"
+                    cleaned = re.sub(r':\s*"<nil>"', ': null', json_str.group())
+                    cleaned = re.sub(r':\s*<nil>', ': null', cleaned)
+                    tool_call_data = json.loads(cleaned)
+                    arguments = tool_call_data.get('parameters', {})
+            except:
+                pass
             
-            # Check for tool calls
-            message = response['message']
-            messages.append(message)
-
-            if message.get('tool_calls'):
-                print("  (Calling NetBox...)")
-                for tool_call in message['tool_calls']:
-                    function_name = tool_call['function']['name']
-                    arguments = tool_call['function']['arguments']
-                    
-                    # Execute tool on MCP (with fresh connection)
-                    try:
-                        result = asyncio.run(call_mcp_tool(function_name, arguments))
-                        tool_result = str(result.content)
-                    except Exception as e:
-                        tool_result = f"Error calling tool: {e}"
-                    
-                    # Add result to history
-                    messages.append({
-                        'role': 'tool',
-                        'content': tool_result,
-                        'name': function_name
-                    })
-                
-                # Get final response after tool execution
-                final_response = client.chat(
-                    model=MODEL_NAME,
-                    messages=messages,
-                )
-                print(f"Assistant: {final_response['message']['content']}")
-                messages.append(final_response['message'])
-            else:
-                # Fallback: Check if the response contains a JSON tool call
-                content = message.get('content', '')
-                import re
-                json_match = re.search(r'\{["\']name["\']:\s*["\']([\w_]+)["\']', content, re.DOTALL)
-                
-                if json_match:
-                    try:
-                        function_name = json_match.group(1)
-                        
-                        # Try to extract parameters, but handle malformed JSON
-                        import json as json_lib
-                        arguments = {}
-                        
-                        # Try to parse valid JSON first
-                        try:
-                            json_str = re.search(r'\{.*\}', content, re.DOTALL)
-                            if json_str:
-                                # Clean up malformed values like "<nil>"
-                                cleaned = re.sub(r':\s*"<nil>"', ': null', json_str.group())
-                                cleaned = re.sub(r':\s*<nil>', ': null', cleaned)
-                                tool_call_data = json_lib.loads(cleaned)
-                                arguments = tool_call_data.get('parameters', {})
-                        except:
-                            pass
-                        
-                        # Remove None or invalid arguments
-                        arguments = {k: v for k, v in arguments.items() if v is not None and v != "null"}
-                        
-                        print(f"  (Detected tool call: {function_name})")
-                        print("  (Calling NetBox...)")
-                        
-                        # Execute tool
-                        try:
-                            result = asyncio.run(call_mcp_tool(function_name, arguments))
-                            tool_result = str(result.content)
-                        except Exception as e:
-                            tool_result = f"Error calling tool: {e}"
-                        
-                        # Add to messages and get final response
-                        messages.append({
-                            'role': 'tool',
-                            'content': tool_result,
-                            'name': function_name
-                        })
-                        
-                        final_response = client.chat(
-                            model=MODEL_NAME,
-                            messages=messages,
-                        )
-                        print(f"Assistant: {final_response['message']['content']}")
-                        messages.append(final_response['message'])
-                    except Exception as e:
-                        print(f"Assistant: {content}")
-                else:
-                    print(f"Assistant: {content}")
+            # Remove None or invalid arguments
+            arguments = {k: v for k, v in arguments.items() if v is not None and v != "null"}
+            
+            say(f"  (Detected tool call: {function_name})")
+            say("  (Calling NetBox...)")
+            
+            # Execute tool
+            [(_, tool_result)] = await execute_tool_calls(pool, [
+                {'function': {'name': function_name, 'arguments': arguments}}
+            ], tool_cache)
+            
+            # Add to messages and get final response
+            context.add({
+                'role': 'tool',
+                'content': tool_result,
+                'name': function_name
+            })
+            
+            final_message, _ = await chat_completion(client, context.messages(), tools=ollama_tools)
+            context.add(final_message)
+        except Exception as e:
+            if not printed:
+                say(f"Assistant: {content}")
+    elif not printed:
+        say(f"Assistant: {content}")
 
+async def chat_turns(client, pool, context, ollama_tools, tool_cache):
+    while True:
+        try:
+            user_input = await ainput("User: ")
+            if user_input.lower() in ['quit', 'exit']:
+                break
+            if user_input.strip() == '/refresh':
+                print(f"  (Cleared {tool_cache.invalidate()} cached tool results)")
+                continue
+            await chat_turn(client, pool, context, ollama_tools, user_input, tool_cache)
         except EOFError:
             break
         except Exception as e:
@@ -239,6 +1093,6 @@ RESPONSE FORMAT:
 
 if __name__ == "__main__":
     try:
-        run_chat_loop()
+        asyncio.run(run_chat_loop())
     except KeyboardInterrupt:
         print("\nGoodbye!")
@@ -0,0 +1,288 @@
+"""Multi-user chat gateway: llm-client chat sessions over HTTP and WebSocket.
+
+All sessions share one MCP session pool, one Ollama client and the intent
+router; each session keeps its own conversation history and tool result cache.
+Model requests from every session go through client.model_queue
+(MODEL_CONCURRENCY at once, first come first served).
+
+Backpressure: a session runs one message at a time (409 while busy), at most
+GATEWAY_MAX_PENDING turns are admitted across all sessions (503 + Retry-After
+beyond that) and at most GATEWAY_MAX_SESSIONS sessions exist at once. Streamed
+WebSocket output is coalesced while the client is slow to read.
+
+    POST   /sessions                      -> {"session_id"}
+    POST   /sessions/{id}/messages        {"message": "..."} -> {"session_id", "output"}
+    DELETE /sessions/{id}
+    GET    /stats
+    GET    /metrics                       Prometheus text format (turn phase totals, queue, sessions)
+    WS     /ws[?session_id=...]           send text, receive {"type": "output"|"error"|"done", ...}
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+import client
+
+GATEWAY_HOST = os.getenv("GATEWAY_HOST", "0.0.0.0")
+GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", "8080"))
+GATEWAY_MAX_SESSIONS = int(os.getenv("GATEWAY_MAX_SESSIONS", "200"))
+# Turns admitted at once across all sessions (running plus waiting for the model)
+GATEWAY_MAX_PENDING = int(os.getenv("GATEWAY_MAX_PENDING", "32"))
+GATEWAY_SESSION_TTL = float(os.getenv("GATEWAY_SESSION_TTL", "3600"))
+RETRY_AFTER = 2
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ChatSession:
+    """One operator's conversation; chat output is buffered until the HTTP/WebSocket side reads it."""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.context = client.ConversationContext(client.SYSTEM_PROMPT)
+        self.tool_cache = client.ToolResultCache()
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.changed = asyncio.Event()
+        self._buffer = []
+
+    def write(self, *args, sep=" ", end="\n", **kwargs):
+        """print()-compatible sink installed as client.output while this session's turn runs."""
+        self._buffer.append(sep.join(str(arg) for arg in args) + end)
+        self.changed.set()
+
+    def drain(self):
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self.changed.clear()
+        return text
+
+
+class Gateway:
+    def __init__(self):
+        self.sessions = {}
+        self.pending = 0
+        self.turns = 0
+        self.rejected = 0
+        self.pool = None
+        self.client = None
+        self.ollama_tools = None
+        self._reaper = None
+
+    async def start(self):
+        self.pool, self.client, self.ollama_tools = await client.connect()
+        self._reaper = asyncio.create_task(self._reap())
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+        if self.pool:
+            await client.disconnect(self.pool)
+
+    async def _reap(self):
+        """Drop sessions idle for longer than GATEWAY_SESSION_TTL."""
+        while True:
+            await asyncio.sleep(min(60.0, GATEWAY_SESSION_TTL))
+            cutoff = time.monotonic() - GATEWAY_SESSION_TTL
+            for session_id, session in list(self.sessions.items()):
+                if session.last_used < cutoff and not session.lock.locked():
+                    del self.sessions[session_id]
+                    logger.info(f"Session {session_id} expired")
+
+    def create_session(self):
+        if len(self.sessions) >= GATEWAY_MAX_SESSIONS:
+            self.rejected += 1
+            raise GatewayError("Too many sessions, try again later", 503)
+        session = ChatSession(uuid.uuid4().hex)
+        self.sessions[session.id] = session
+        return session
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise GatewayError(f"Unknown session {session_id}", 404)
+        return session
+
+    async def turn(self, session, text):
+        """Run one chat turn for the session; its output collects in the session buffer."""
+        if session.lock.locked():
+            self.rejected += 1
+            raise GatewayError("A message for this session is still being answered", 409)
+        if self.pending >= GATEWAY_MAX_PENDING:
+            self.rejected += 1
+            raise GatewayError("Gateway is busy, try again later", 503)
+        self.pending += 1
+        try:
+            async with session.lock:
+                token = client.output.set(session.write)
+                try:
+                    if text.strip() == "/refresh":
+                        client.say(f"  (Cleared {session.tool_cache.invalidate()} cached tool results)")
+                    else:
+                        await client.chat_turn(self.client, self.pool, session.context, self.ollama_tools, text,
+                                               session.tool_cache)
+                except Exception as e:
+                    logger.error(f"Error in session {session.id}: {e}")
+                    client.say(f"Error: {e}")
+                finally:
+                    client.output.reset(token)
+                self.turns += 1
+        finally:
+            self.pending -= 1
+            session.last_used = time.monotonic()
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": GATEWAY_MAX_SESSIONS,
+            "pending_turns": self.pending,
+            "max_pending_turns": GATEWAY_MAX_PENDING,
+            "turns": self.turns,
+            "rejected": self.rejected,
+            "model": {"active": client.model_queue.active, "waiting": client.model_queue.waiting,
+                      "limit": client.model_queue.limit},
+        }
+
+
+gateway = Gateway()
+
+
+def _error(e):
+    headers = {"Retry-After": str(RETRY_AFTER)} if e.status_code == 503 else None
+    return JSONResponse({"error": str(e)}, status_code=e.status_code, headers=headers)
+
+
+async def create_session(request: Request):
+    try:
+        return JSONResponse({"session_id": gateway.create_session().id}, status_code=201)
+    except GatewayError as e:
+        return _error(e)
+
+
+async def post_message(request: Request):
+    try:
+        session = gateway.get_session(request.path_params["session_id"])
+        body = await request.json()
+        text = body.get("message") if isinstance(body, dict) else None
+        if not isinstance(text, str) or not text.strip():
+            return JSONResponse({"error": 'Body must be {"message": "..."}'}, status_code=400)
+        await gateway.turn(session, text)
+        return JSONResponse({"session_id": session.id, "output": session.drain()})
+    except GatewayError as e:
+        return _error(e)
+    except ValueError:
+        return JSONResponse({"error": "Body must be JSON"}, status_code=400)
+
+
+async def delete_session(request: Request):
+    session = gateway.sessions.pop(request.path_params["session_id"], None)
+    return Response(status_code=204 if session else 404)
+
+
+async def stats(request: Request):
+    return JSONResponse(gateway.stats())
+
+
+async def metrics(request: Request):
+    """Turn phase totals from client.turn_totals plus gateway and model queue gauges."""
+    totals = client.turn_totals
+    stats = gateway.stats()
+    lines = [
+        "# HELP llm_client_turns_total Chat turns answered",
+        "# TYPE llm_client_turns_total counter",
+        f"llm_client_turns_total {totals['turns']}",
+        "# HELP llm_client_turn_seconds_total Time spent in chat turns by phase "
+        "(prompt_eval, generation and load are reported by Ollama)",
+        "# TYPE llm_client_turn_seconds_total counter",
+    ]
+    for phase in ("total", "queue", "model", "load", "prompt_eval", "generation", "tools", "mcp_connect"):
+        lines.append(f'llm_client_turn_seconds_total{{phase="{phase}"}} {round(totals[phase], 6)}')
+    for name, kind, help, value in (
+        ("llm_gateway_sessions", "gauge", "Open chat sessions", stats["sessions"]),
+        ("llm_gateway_pending_turns", "gauge", "Turns running or waiting", stats["pending_turns"]),
+        ("llm_gateway_rejected_total", "counter", "Requests rejected by backpressure", stats["rejected"]),
+        ("llm_model_active_requests", "gauge", "Ollama requests in flight", stats["model"]["active"]),
+        ("llm_model_waiting_requests", "gauge", "Ollama requests waiting for a slot", stats["model"]["waiting"]),
+    ):
+        lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"])
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def chat_socket(websocket: WebSocket):
+    """Chat over a WebSocket; output is streamed as it is produced, then {"type": "done"} ends each turn."""
+    await websocket.accept()
+    try:
+        session_id = websocket.query_params.get("session_id")
+        session = gateway.get_session(session_id) if session_id else gateway.create_session()
+    except GatewayError as e:
+        await websocket.send_json({"type": "error", "error": str(e), "status": e.status_code})
+        await websocket.close()
+        return
+    await websocket.send_json({"type": "session", "session_id": session.id})
+    try:
+        while True:
+            text = await websocket.receive_text()
+            if text.strip().lower() in ("quit", "exit"):
+                break
+            turn = asyncio.create_task(gateway.turn(session, text))
+            while True:
+                changed = asyncio.create_task(session.changed.wait())
+                done, _ = await asyncio.wait({turn, changed}, return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+                # Everything written while the previous frame was being sent goes out as one frame
+                output = session.drain()
+                if output:
+                    await websocket.send_json({"type": "output", "text": output})
+                if turn in done:
+                    break
+            try:
+                turn.result()
+            except GatewayError as e:
+                await websocket.send_json({"type": "error", "error": str(e), "status": e.status_code})
+            await websocket.send_json({"type": "done"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await gateway.start()
+    try:
+        yield
+    finally:
+        await gateway.stop()
+
+
+app = Starlette(
+    routes=[
+        Route("/sessions", create_session, methods=["POST"]),
+        Route("/sessions/{session_id}/messages", post_message, methods=["POST"]),
+        Route("/sessions/{session_id}", delete_session, methods=["DELETE"]),
+        Route("/stats", stats),
+        Route("/metrics", metrics),
+        WebSocketRoute("/ws", chat_socket),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=GATEWAY_HOST, port=GATEWAY_PORT)
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+# NetBox webhook "model" values mapped to the endpoints whose cached results they affect.
+# Models that other objects reference by name (sites, roles, types, VRFs, ...) are not
+# listed, so a change to them flushes the whole cache.
+MODEL_ENDPOINTS = {
+    "device": ["dcim.devices"],
+    "interface": ["dcim.interfaces", "dcim.cables", "ipam.ip_addresses"],
+    "cable": ["dcim.cables", "dcim.interfaces"],
+    "ipaddress": ["ipam.ip_addresses"],
+    "prefix": ["ipam.prefixes"],
+    "vlan": ["ipam.vlans"],
+}
+
+
+def parse_ttls(spec):
+    """Parse "dcim.sites=300,ipam.ip_addresses=30" into {endpoint: seconds}."""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        endpoint, _, seconds = item.partition("=")
+        ttls[endpoint.strip()] = float(seconds)
+    return ttls
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(str(v) for v in value))
+    return str(value)
+
+
+class InventoryCache:
+    """Thread-safe LRU cache of NetBox query results with per-endpoint TTLs.
+
+    Entries are keyed by endpoint name (e.g. "dcim.devices") and the filter set
+    used for the query. A TTL of 0 disables caching for that endpoint.
+
+    Every invalidation bumps the generation of the endpoints it covers. A
+    fetch takes generation(endpoint) before asking NetBox and passes it to
+    set(), which drops the result if an invalidation happened meanwhile, so
+    data read before a change is not cached after it.
+    """
+
+    def __init__(self, max_entries=256, default_ttl=60.0, ttls=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+        self._flushes = 0
+        self._generations = {}
+
+    def ttl(self, endpoint):
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    def key(self, endpoint, filters):
+        return (endpoint,) + tuple(sorted((k, _freeze(v)) for k, v in filters.items()))
+
+    def generation(self, endpoint):
+        with self._lock:
+            return self._flushes, self._generations.get(endpoint, 0)
+
+    def get(self, endpoint, filters):
+        """Return (hit, value) for a cached query."""
+        key = self.key(endpoint, filters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, endpoint, filters, value, generation=None):
+        """Cache a result; with `generation` (taken before the fetch) it is dropped if the endpoint was invalidated since."""
+        ttl = self.ttl(endpoint)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        key = self.key(endpoint, filters)
+        with self._lock:
+            if generation is not None and generation != (self._flushes, self._generations.get(endpoint, 0)):
+                self.stale_sets += 1
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, endpoints=None):
+        """Drop entries for the given endpoints, or everything when endpoints is None."""
+        with self._lock:
+            if endpoints is None:
+                self._flushes += 1
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                for endpoint in endpoints:
+                    self._generations[endpoint] = self._generations.get(endpoint, 0) + 1
+                stale = [k for k in self._entries if k[0] in endpoints]
+                for k in stale:
+                    del self._entries[k]
+                dropped = len(stale)
+            self.invalidations += dropped
+            return dropped
+
+    def invalidate_model(self, model):
+        """Invalidate the entries affected by a change to a NetBox model (webhook "model" field)."""
+        return self.invalidate(MODEL_ENDPOINTS.get(model))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            per_endpoint = {}
+            for key in self._entries:
+                per_endpoint[key[0]] = per_endpoint.get(key[0], 0) + 1
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_sets": self.stale_sets,
+                "entries_per_endpoint": per_endpoint,
+            }
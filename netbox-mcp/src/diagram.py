@@ -0,0 +1,451 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict, deque
+
+# Device layers, top to bottom; "other" holds devices whose role matches none of them
+LAYERS = ("perimeter", "core", "distribution", "security", "access", "other")
+LAYER_TITLES = {
+    "perimeter": "Perimeter Zone",
+    "core": "Core Layer",
+    "distribution": "Distribution Layer",
+    "security": "Internal Security",
+    "access": "Access Layer",
+    "other": "Other Devices",
+    "circuit": "Circuits",
+    "segment": "Network Segments",
+}
+# Mermaid node shapes and style classes per layer (same palette as the original diagram)
+MERMAID_SHAPES = {
+    "perimeter": ('[["', '"]]'), "security": ('[["', '"]]'), "core": ('[("', '")]'),
+    "distribution": ('[["', '"]]'), "access": ('["', '"]'), "other": ('["', '"]'),
+    "circuit": ('(("', '"))'), "segment": ('["', '"]'),
+}
+CLASSES = {
+    "internet": ("#e1f5fe", "#01579b"),
+    "firewall": ("#ffebee", "#c62828"),
+    "router": ("#fff3e0", "#ef6c00"),
+    "switch": ("#e8f5e9", "#2e7d32"),
+    "network": ("#f3e5f5", "#7b1fa2"),
+}
+LAYER_CLASSES = {
+    "perimeter": "firewall", "security": "firewall", "core": "router", "distribution": "switch",
+    "access": "switch", "other": "switch", "circuit": "internet", "segment": "network",
+}
+# Where traffic enters a site; failure_impact counts devices cut off from all of these
+UPSTREAM_LAYERS = ("circuit", "perimeter", "core")
+DOT_SHAPES = {
+    "perimeter": "box3d", "security": "box3d", "core": "cylinder", "distribution": "box",
+    "access": "box", "other": "box", "circuit": "ellipse", "segment": "note",
+}
+
+
+def layer_of(role, name):
+    """Topology layer of a device from its role and name."""
+    role, name = role.lower(), name.lower()
+    if "firewall" in role:
+        if "perimeter" in name:
+            return "perimeter"
+        if "internal" in name:
+            return "security"
+        return "other"
+    if "router" in role or "core" in role:
+        return "core"
+    if "distribution" in role:
+        return "distribution"
+    if "access" in role:
+        return "access"
+    return "other"
+
+
+def _name(ref):
+    return str((ref or {}).get("name") or (ref or {}).get("display") or "") if isinstance(ref, dict) else ""
+
+
+def _value(choice):
+    return str(choice.get("value") or "") if isinstance(choice, dict) else str(choice or "")
+
+
+def _ports(pairs, reverse=False):
+    return ", ".join(f"{b} - {a}" if reverse else f"{a} - {b}" for a, b in pairs).strip(" -")
+
+
+def _connected(edge):
+    """A cable that carries traffic now (not planned or decommissioning); address links are logical."""
+    return edge["kind"] == "cable" and edge["status"] in ("connected", "")
+
+
+def _site_of(obj):
+    """Site name of a NetBox object: `site` up to NetBox 4.1, a site `scope` from 4.2."""
+    if isinstance(obj.get("site"), dict):
+        return _name(obj["site"])
+    if obj.get("scope_type") == "dcim.site":
+        return _name(obj.get("scope"))
+    return ""
+
+
+class TopologyGraph:
+    """Devices, circuits and network segments with the cables linking them.
+
+    Built from raw NetBox JSON objects (dict(record)). Node ids are stable
+    across calls (derived from NetBox ids), so an unchanged inventory yields
+    the same graph and the same `content_hash`.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+        self._hash = None
+        self._links = None
+        self._names = None
+
+    def _changed(self):
+        self._hash = self._links = self._names = None
+
+    def add_device(self, device):
+        node_id = f"D{device['id']}"
+        name = device.get("name") or f"device-{device['id']}"
+        device_type = device.get("device_type") or {}
+        model = str(device_type.get("model") or device_type.get("display") or "")
+        self.nodes[node_id] = {
+            "id": node_id, "kind": "device", "label": name,
+            "layer": layer_of(_name(device.get("role") or device.get("device_role")), name),
+            "site": _site_of(device), "detail": model.split()[-1] if model else "",
+        }
+        self._changed()
+        return node_id
+
+    def add_segment(self, prefix):
+        node_id = f"P{prefix['id']}"
+        self.nodes[node_id] = {
+            "id": node_id, "kind": "segment", "label": str(prefix.get("prefix") or ""), "layer": "segment",
+            "site": _site_of(prefix), "detail": prefix.get("description") or "",
+        }
+        self._changed()
+        return node_id
+
+    def _termination(self, termination):
+        """Node id of a cable end: the interface's device or the circuit, None for anything else."""
+        obj = termination.get("object") or {}
+        object_type = termination.get("object_type")
+        if object_type in ("dcim.interface", "dcim.frontport", "dcim.rearport") and obj.get("device"):
+            node_id = f"D{obj['device']['id']}"
+            if node_id not in self.nodes:
+                # Cabled to a device outside the listed ones (e.g. another tenant's)
+                self.nodes[node_id] = {"id": node_id, "kind": "device", "label": _name(obj["device"]),
+                                       "layer": "other", "site": "", "detail": ""}
+            return node_id, str(obj.get("name") or "")
+        if object_type == "circuits.circuittermination" and obj.get("circuit"):
+            circuit = obj["circuit"]
+            node_id = f"C{circuit['id']}"
+            self.nodes.setdefault(node_id, {"id": node_id, "kind": "circuit",
+                                            "label": str(circuit.get("cid") or circuit.get("display") or ""),
+                                            "layer": "circuit", "site": "", "detail": ""})
+            return node_id, str(obj.get("term_side") or "")
+        return None, ""
+
+    def add_cable(self, cable):
+        """Link every device/circuit on the A side to every one on the B side."""
+        a_ends = [self._termination(t) for t in cable.get("a_terminations") or []]
+        b_ends = [self._termination(t) for t in cable.get("b_terminations") or []]
+        for a, a_port in a_ends:
+            for b, b_port in b_ends:
+                if a and b and a != b:
+                    self.add_edge(a, b, a_port, b_port, kind="cable", label=cable.get("label") or "",
+                                  status=_value(cable.get("status")))
+
+    def add_edge(self, a, b, a_port="", b_port="", kind="cable", label="", status=""):
+        if b < a:
+            a, b, a_port, b_port = b, a, b_port, a_port
+        edge = self.edges.setdefault((a, b, kind), {"a": a, "b": b, "kind": kind, "label": label,
+                                                    "status": status, "ports": []})
+        if a_port or b_port:
+            edge["ports"].append([a_port, b_port])
+        self._changed()
+
+    @property
+    def content_hash(self):
+        """sha256 over the canonical node and edge lists; equal graphs render identically."""
+        if self._hash is None:
+            canonical = json.dumps([sorted(self.nodes.items()), sorted(self.edges.values(),
+                                    key=lambda e: (e["a"], e["b"], e["kind"]))],
+                                   sort_keys=True, separators=(",", ":"))
+            self._hash = hashlib.sha256(canonical.encode()).hexdigest()
+        return self._hash
+
+    def subgraph(self, site="", segments=True):
+        """Nodes of one site (by name, case-insensitive) plus whatever is cabled to them, optionally without segments."""
+        wanted = site.strip().lower()
+        keep = {node_id for node_id, node in self.nodes.items()
+                if (not wanted or node["site"].lower() == wanted) and (segments or node["kind"] != "segment")}
+        if wanted:
+            local = set(keep)
+            for a, b, _ in self.edges:
+                if a in local or b in local:
+                    keep.update(n for n in (a, b) if segments or self.nodes[n]["kind"] != "segment")
+        graph = TopologyGraph()
+        graph.nodes = {node_id: node for node_id, node in self.nodes.items() if node_id in keep}
+        graph.edges = {key: edge for key, edge in self.edges.items() if key[0] in keep and key[1] in keep}
+        return graph
+
+    def sites(self):
+        return sorted({node["site"] for node in self.nodes.values()})
+
+    def adjacency(self):
+        neighbours = {node_id: [] for node_id in self.nodes}
+        for a, b, _ in self.edges:
+            neighbours[a].append(b)
+            neighbours[b].append(a)
+        return {node_id: sorted(set(ids)) for node_id, ids in sorted(neighbours.items())}
+
+    def find(self, name):
+        """Ids of the devices and circuits labelled `name` (case-insensitive)."""
+        if self._names is None:
+            self._names = {}
+            for node_id, node in self.nodes.items():
+                if node["kind"] != "segment":
+                    self._names.setdefault(node["label"].lower(), []).append(node_id)
+        return self._names.get(name.strip().lower(), [])
+
+    def links(self):
+        """{node id: [(neighbour id, "local port - remote port")]} over connected cables, built once per graph."""
+        if self._links is None:
+            links = {node_id: [] for node_id in self.nodes}
+            for edge in self.edges.values():
+                if _connected(edge):
+                    links[edge["a"]].append((edge["b"], _ports(edge["ports"])))
+                    links[edge["b"]].append((edge["a"], _ports(edge["ports"], reverse=True)))
+            self._links = links
+        return self._links
+
+    def _reach(self, starts, without=None):
+        links = self.links()
+        seen = {start for start in starts if start != without}
+        queue = deque(seen)
+        while queue:
+            for neighbour, _ in links[queue.popleft()]:
+                if neighbour != without and neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+        return seen
+
+    def shortest_path(self, source, target):
+        """Fewest-hop cable path as [(node id, ports of the cable reaching it)], None if unreachable."""
+        links = self.links()
+        parents = {source: (None, "")}
+        queue = deque([source])
+        while queue and target not in parents:
+            current = queue.popleft()
+            for neighbour, ports in links[current]:
+                if neighbour not in parents:
+                    parents[neighbour] = (current, ports)
+                    queue.append(neighbour)
+        if target not in parents:
+            return None
+        path, node_id = [], target
+        while node_id is not None:
+            parent, ports = parents[node_id]
+            path.append((node_id, ports))
+            node_id = parent
+        return path[::-1]
+
+    def within(self, source, hops):
+        """[(node id, distance, node it was reached from, ports)] for everything up to `hops` cables away."""
+        links = self.links()
+        found = {source: 0}
+        rows = []
+        queue = deque([source])
+        while queue:
+            current = queue.popleft()
+            if found[current] == hops:
+                continue
+            for neighbour, ports in links[current]:
+                if neighbour not in found:
+                    found[neighbour] = found[current] + 1
+                    rows.append((neighbour, found[neighbour], current, ports))
+                    queue.append(neighbour)
+        return rows
+
+    def failure_impact(self, failed):
+        """Devices cut off when `failed` goes down, and segments whose devices are all down or cut off.
+
+        Cut off means no longer reachable from any circuit, perimeter or core
+        device (UPSTREAM_LAYERS); without such devices, everything outside the
+        largest piece left of the failed device's component counts.
+        Returns (isolated ids, segment ids, basis).
+        """
+        upstream = {node_id for node_id, node in self.nodes.items()
+                    if node_id != failed and node["layer"] in UPSTREAM_LAYERS}
+        if upstream:
+            before, after, basis = self._reach(upstream), self._reach(upstream, without=failed), "upstream"
+        else:
+            before, basis = self._reach([failed]), "component"
+            after, rest = set(), before - {failed}
+            while rest:
+                piece = self._reach([next(iter(rest))], without=failed)
+                rest -= piece
+                if len(piece) > len(after):
+                    after = piece
+        down = before - after
+        down.add(failed)
+        holders = {}
+        for edge in self.edges.values():
+            if edge["kind"] == "address":
+                device, segment = (edge["a"], edge["b"]) if edge["a"].startswith("D") else (edge["b"], edge["a"])
+                holders.setdefault(segment, set()).add(device)
+        segments = sorted(segment for segment, devices in holders.items() if devices <= down)
+        return sorted(down - {failed}), segments, basis
+
+    def ordered(self, nodes):
+        """Group nodes by layer in top-to-bottom order, sorted by label inside a layer."""
+        groups = OrderedDict((layer, []) for layer in ("circuit",) + LAYERS + ("segment",))
+        for node in sorted(nodes, key=lambda n: (n["label"], n["id"])):
+            groups[node["layer"]].append(node)
+        return [(layer, members) for layer, members in groups.items() if members]
+
+    def by_site(self):
+        sites = OrderedDict((site, []) for site in self.sites())
+        for node in self.nodes.values():
+            sites[node["site"]].append(node)
+        return sites
+
+
+def _ident(site):
+    return re.sub(r"\W", "_", site) if site else "nosite"
+
+
+def _mermaid_label(node):
+    label = node["label"] + (f"<br/>{node['detail']}" if node["detail"] else "")
+    return label.replace('"', "#quot;")
+
+
+def render_mermaid(graph):
+    lines = ["```mermaid", "graph TB", "    %% Styling"]
+    lines += [f"    classDef {name} fill:{fill},stroke:{stroke},stroke-width:2px"
+              for name, (fill, stroke) in CLASSES.items()]
+
+    def layer_blocks(nodes, indent, prefix):
+        for layer, members in graph.ordered(nodes):
+            lines.append(f'{indent}subgraph {prefix}{layer}["{LAYER_TITLES[layer]}"]')
+            lines.append(f"{indent}    direction LR")
+            for node in members:
+                start, end = MERMAID_SHAPES[layer]
+                lines.append(f"{indent}    {node['id']}{start}{_mermaid_label(node)}{end}")
+            lines.append(f"{indent}end")
+
+    sites = graph.by_site()
+    if len(sites) > 1:
+        for site, nodes in sites.items():
+            title = (site or "No site").replace('"', "#quot;")
+            lines.extend(["", f'    subgraph site_{_ident(site)}["{title}"]', "        direction TB"])
+            layer_blocks(nodes, "        ", f"{_ident(site)}_")
+            lines.append("    end")
+    else:
+        lines.append("")
+        layer_blocks(list(graph.nodes.values()), "    ", "")
+
+    if graph.edges:
+        lines.extend(["", "    %% Connections"])
+    for edge in sorted(graph.edges.values(), key=lambda e: (e["a"], e["b"], e["kind"])):
+        text = edge["label"] or _ports(edge["ports"])
+        arrow = "---" if _connected(edge) else "-.-"
+        text = text.replace('"', "#quot;")
+        lines.append(f'    {edge["a"]} {arrow}|"{text}"| {edge["b"]}' if text else f'    {edge["a"]} {arrow} {edge["b"]}')
+
+    classes = {}
+    for node in graph.nodes.values():
+        classes.setdefault(LAYER_CLASSES[node["layer"]], []).append(node["id"])
+    if classes:
+        lines.extend(["", "    %% Apply Styles"])
+    for name, ids in sorted(classes.items()):
+        lines.append(f"    class {','.join(sorted(ids))} {name}")
+    lines.append("```")
+    return "\n".join(lines)
+
+
+def _dot_quote(text):
+    return '"' + str(text).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def render_dot(graph):
+    lines = ["graph topology {", "    rankdir=TB;", "    compound=true;",
+             '    node [style=filled, fontname="Helvetica"];', '    edge [fontname="Helvetica", fontsize=9];']
+
+    def node_lines(nodes, indent):
+        for layer, members in graph.ordered(nodes):
+            fill, stroke = CLASSES[LAYER_CLASSES[layer]]
+            ids = []
+            for node in members:
+                label = node["label"] + (f"\n{node['detail']}" if node["detail"] else "")
+                lines.append(f"{indent}{node['id']} [label={_dot_quote(label)}, shape={DOT_SHAPES[layer]}, "
+                             f'fillcolor="{fill}", color="{stroke}"];')
+                ids.append(node["id"])
+            # Keep each layer on one row
+            lines.append(f"{indent}{{ rank=same; {'; '.join(ids)}; }}")
+
+    sites = graph.by_site()
+    if len(sites) > 1:
+        for site, nodes in sites.items():
+            lines.append(f"    subgraph cluster_{_ident(site)} {{")
+            lines.append(f"        label={_dot_quote(site or 'No site')};")
+            node_lines(nodes, "        ")
+            lines.append("    }")
+    else:
+        node_lines(list(graph.nodes.values()), "    ")
+
+    for edge in sorted(graph.edges.values(), key=lambda e: (e["a"], e["b"], e["kind"])):
+        attrs = [f"label={_dot_quote(edge['label'] or _ports(edge['ports']))}"]
+        if not _connected(edge):
+            attrs.append("style=dashed")
+        lines.append(f"    {edge['a']} -- {edge['b']} [{', '.join(attrs)}];")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def render_json(graph):
+    return json.dumps({
+        "hash": graph.content_hash,
+        "nodes": [graph.nodes[node_id] for node_id in sorted(graph.nodes)],
+        "adjacency": graph.adjacency(),
+        "edges": sorted(graph.edges.values(), key=lambda e: (e["a"], e["b"], e["kind"])),
+    }, separators=(",", ":"))
+
+
+RENDERERS = {"mermaid": render_mermaid, "dot": render_dot, "json": render_json}
+
+
+class DiagramRenderer:
+    """Renders topology graphs, caching the output by (content hash, format).
+
+    Re-rendering an unchanged topology, or the same site subgraph, is a dict
+    lookup; the least recently used renderings are dropped beyond max_entries.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, graph, fmt="mermaid"):
+        if fmt not in RENDERERS:
+            raise ValueError(f"Unknown diagram format {fmt!r}, expected one of {', '.join(RENDERERS)}")
+        key = (graph.content_hash, fmt)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        output = RENDERERS[fmt](graph)
+        with self._lock:
+            self._entries[key] = output
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return output
+
+    def stats(self):
+        return {"entries": len(self._entries), "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses}
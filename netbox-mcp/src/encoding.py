@@ -0,0 +1,45 @@
+import json
+
+# Row lists kept when empty: an empty page says "nothing found", a missing key says nothing
+KEEP_EMPTY = {"results"}
+
+
+def elide(value):
+    """Drop dict entries whose value is None, "", [] or {} (recursively), except empty KEEP_EMPTY lists."""
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            item = elide(item)
+            if key in KEEP_EMPTY and item == []:
+                out[key] = item
+            elif item is not None and item != "" and item != [] and item != {}:
+                out[key] = item
+        return out
+    if isinstance(value, list):
+        return [elide(item) for item in value]
+    return value
+
+
+def tabulate(value):
+    """Rewrite lists of dicts as {"columns": [...], "rows": [[...], ...]} (recursively).
+
+    Columns are the union of the row keys in first-seen order; a row without
+    a column holds null there. Lists with fewer than two dicts are left as is.
+    """
+    if isinstance(value, dict):
+        return {key: tabulate(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if len(value) > 1 and all(isinstance(item, dict) for item in value):
+            columns = list(dict.fromkeys(key for item in value for key in item))
+            return {"columns": columns,
+                    "rows": [[tabulate(item.get(column)) for column in columns] for item in value]}
+        return [tabulate(item) for item in value]
+    return value
+
+
+def encode(value, tabular=True):
+    """Serialize a tool result as minified JSON with empty fields elided, tabular by default."""
+    value = elide(value)
+    if tabular:
+        value = tabulate(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
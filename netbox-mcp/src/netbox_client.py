@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class NetBoxError(Exception):
+    """Raised when NetBox answers with a non-2xx status."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Record:
+    """Read-only view of a NetBox API object.
+
+    Mirrors the parts of pynetbox's Record the tools rely on: attribute access
+    to fields, nested objects wrapped as Records, str() giving the name, label
+    or display value, and dict(record) returning the raw JSON object.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, name):
+        try:
+            value = self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        if isinstance(value, dict):
+            return Record(value)
+        if isinstance(value, list):
+            return [Record(v) if isinstance(v, dict) else v for v in value]
+        return value
+
+    def __iter__(self):
+        return iter(self._data.items())
+
+    def __str__(self):
+        data = self._data
+        return str(data.get("name") or data.get("label") or data.get("display") or "")
+
+    def __repr__(self):
+        return str(self)
+
+
+def endpoint_path(endpoint):
+    """Map a pynetbox-style endpoint name ("ipam.ip_addresses") to its API path ("ipam/ip-addresses/")."""
+    app, name = endpoint.split(".")
+    return f"{app}/{name.replace('_', '-')}/"
+
+
+def _params(filters):
+    params = []
+    for key, value in filters.items():
+        for item in value if isinstance(value, (list, tuple, set)) else [value]:
+            params.append((key, str(item).lower() if isinstance(item, bool) else str(item)))
+    return params
+
+
+class AsyncNetBox:
+    """Async NetBox REST client on a shared keep-alive httpx connection pool.
+
+    HTTP/2 is used when the h2 package is installed and NetBox is served over
+    https (ALPN). In-flight requests are limited per host so parallel page
+    fetches cannot overload NetBox. `on_request(path, status_code, seconds,
+    size)` is called after every request (status 0 when it failed to complete).
+    """
+
+    def __init__(self, url, token, max_connections=20, max_keepalive=10, per_host=8, http2=True, timeout=30.0,
+                 page_size=1000, page_workers=4, on_request=None):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("h2 not installed, using HTTP/1.1 keep-alive")
+                http2 = False
+        scheme = "Bearer" if token.startswith("nbt_") and "." in token else "Token"
+        self.client = httpx.AsyncClient(
+            base_url=url.rstrip("/") + "/api/",
+            headers={"Authorization": f"{scheme} {token}", "Accept": "application/json"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                keepalive_expiry=60),
+            http2=http2,
+            timeout=timeout,
+        )
+        self.per_host = per_host
+        self.page_size = page_size
+        self.page_workers = page_workers
+        self.on_request = on_request
+        self._host_limits = {}
+
+    def _limit(self, url):
+        host = urlsplit(str(self.client.base_url.join(url))).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def request(self, path, **filters):
+        async with self._limit(path):
+            started = time.perf_counter()
+            try:
+                response = await self.client.get(path, params=_params(filters))
+            except Exception:
+                if self.on_request:
+                    self.on_request(path, 0, time.perf_counter() - started, 0)
+                raise
+            if self.on_request:
+                self.on_request(path, response.status_code, time.perf_counter() - started, len(response.content))
+        if response.status_code >= 400:
+            try:
+                detail = response.json()
+            except ValueError:
+                detail = response.text
+            raise NetBoxError(f"The request failed with code {response.status_code} {response.reason_phrase}: {detail}",
+                              response.status_code)
+        return response.json()
+
+    async def page(self, endpoint, limit, offset, **filters):
+        """Fetch one page; returns (total count, records)."""
+        data = await self.request(endpoint_path(endpoint), limit=limit, offset=offset, **filters)
+        return data["count"], [Record(item) for item in data["results"]]
+
+    async def list(self, endpoint, page_size=None, workers=None, **filters):
+        """Fetch every record of an endpoint.
+
+        The first page gives the total count; the remaining offsets are then
+        fetched by at most `workers` concurrent requests and joined in offset
+        order, so the result matches a sequential scan.
+        """
+        count, records = await self.page(endpoint, page_size or self.page_size, 0, **filters)
+        if count <= len(records) or not records:
+            return records
+        # NetBox caps limit at MAX_PAGE_SIZE; step by the size it actually returned.
+        size = len(records)
+        workers = asyncio.Semaphore(max(1, workers or self.page_workers))
+
+        async def fetch(offset):
+            async with workers:
+                return (await self.page(endpoint, size, offset, **filters))[1]
+
+        pages = await asyncio.gather(*(fetch(offset) for offset in range(size, count, size)))
+        for page in pages:
+            records.extend(page)
+        logger.debug(f"{endpoint}: {len(records)} records in {len(pages) + 1} pages of {size}")
+        return records
+
+    async def count(self, endpoint, **filters):
+        data = await self.request(endpoint_path(endpoint), limit=1, brief=1, **filters)
+        return data["count"]
+
+    async def aclose(self):
+        await self.client.aclose()
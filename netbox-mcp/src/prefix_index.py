@@ -0,0 +1,67 @@
+import ipaddress
+
+
+class PrefixIndex:
+    """In-memory radix-style index used to count IP addresses per prefix in one pass.
+
+    Prefixes are bucketed by (VRF, address family, prefix length). Assigning an
+    address costs one masked dict lookup per distinct prefix length, so nested
+    prefixes all receive the address and no per-prefix NetBox query is needed.
+    VRF matching follows NetBox's own utilization rule: a global (no VRF)
+    container prefix counts addresses from every VRF, any other prefix only
+    counts addresses from its own VRF.
+    """
+
+    ANY_VRF = "*"
+
+    def __init__(self):
+        self._buckets = {}
+        self._lengths = {}
+        self.counts = {}
+
+    def add_prefix(self, key, prefix, vrf=None, container=False):
+        network = ipaddress.ip_network(str(prefix), strict=False)
+        scope = self.ANY_VRF if vrf is None and container else vrf
+        bucket = self._buckets.setdefault((scope, network.version), {})
+        bucket.setdefault(network.prefixlen, {}).setdefault(int(network.network_address), []).append(key)
+        self._lengths[(scope, network.version)] = sorted(bucket)
+        self.counts.setdefault(key, 0)
+
+    def add_ip(self, address, vrf=None):
+        ip = ipaddress.ip_interface(str(address)).ip
+        value = int(ip)
+        for scope in {vrf, self.ANY_VRF}:
+            bucket = self._buckets.get((scope, ip.version))
+            if not bucket:
+                continue
+            for length in self._lengths[(scope, ip.version)]:
+                shift = ip.max_prefixlen - length
+                keys = bucket[length].get(value >> shift << shift)
+                if keys:
+                    for key in keys:
+                        self.counts[key] += 1
+
+    def add_ips(self, addresses):
+        """Consume an iterable of (address, vrf) pairs, e.g. a paged NetBox listing."""
+        for address, vrf in addresses:
+            self.add_ip(address, vrf)
+        return self.counts
+
+    def longest_match(self, address, vrf=None):
+        """Keys of the most specific prefix holding the address (same VRF rule), or [] if none does."""
+        ip = ipaddress.ip_interface(str(address)).ip
+        value = int(ip)
+        best, keys = -1, []
+        for scope in {vrf, self.ANY_VRF}:
+            bucket = self._buckets.get((scope, ip.version))
+            if not bucket:
+                continue
+            for length in reversed(self._lengths[(scope, ip.version)]):
+                if length <= best:
+                    break
+                shift = ip.max_prefixlen - length
+                found = bucket[length].get(value >> shift << shift)
+                if found:
+                    best, keys = length, found
+                    break
+        return list(keys)
@@ -0,0 +1,268 @@
+import bisect
+import heapq
+import ipaddress
+import re
+
+# Endpoints indexed, with the kind reported in results
+KINDS = {
+    "dcim.devices": "device",
+    "ipam.ip_addresses": "ip_address",
+    "ipam.prefixes": "prefix",
+    "ipam.vlans": "vlan",
+}
+# Field weights: a hit in the name counts three times a hit in e.g. the role or description
+NAME_WEIGHT = 3.0
+FIELD_WEIGHT = 1.0
+# A query word shares at least this fraction of its trigrams with an indexed word to count as a fuzzy hit
+MIN_SIMILARITY = 0.6
+# Fuzzy hits rank below exact hits in the same field
+FUZZY_FACTOR = 0.8
+# Bonus when the whole query equals the object's name
+NAME_MATCH_BONUS = 5.0
+
+
+def _str(value):
+    if isinstance(value, dict):
+        return str(value.get("name") or value.get("label") or value.get("display") or "")
+    return str(value or "")
+
+
+def tokens(text):
+    """Lowercase alphanumeric words; numbers lose their leading zeros so "01" matches "1"."""
+    return [(word.lstrip("0") or "0") if word.isdigit() else word for word in re.findall(r"[a-z0-9]+", text.lower())]
+
+
+def trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _fields(kind, obj):
+    """(name, site, detail, [(text, weight)]) for a NetBox object."""
+    if kind == "device":
+        name = _str(obj.get("name"))
+        role, device_type = _str(obj.get("role") or obj.get("device_role")), _str(obj.get("device_type"))
+        texts = [(name, NAME_WEIGHT), (role, FIELD_WEIGHT), (device_type, FIELD_WEIGHT),
+                 (_str(obj.get("serial")), FIELD_WEIGHT), (_str(obj.get("description")), FIELD_WEIGHT)]
+        detail = " / ".join(filter(None, (role, device_type)))
+    elif kind == "ip_address":
+        name = _str(obj.get("address"))
+        assigned = obj.get("assigned_object") or {}
+        device = _str(assigned.get("device") or assigned.get("virtual_machine")) if isinstance(assigned, dict) else ""
+        texts = [(_str(obj.get("dns_name")), NAME_WEIGHT), (device, FIELD_WEIGHT),
+                 (_str(obj.get("description")), FIELD_WEIGHT)]
+        detail = " / ".join(filter(None, (device, _str(obj.get("dns_name")), _str(obj.get("description")))))
+    elif kind == "prefix":
+        name = _str(obj.get("prefix"))
+        texts = [(_str(obj.get("description")), FIELD_WEIGHT), (_str(obj.get("vlan")), FIELD_WEIGHT),
+                 (_str(obj.get("vrf")), FIELD_WEIGHT)]
+        detail = _str(obj.get("description"))
+    else:
+        vid = obj.get("vid")
+        name = _str(obj.get("name"))
+        texts = [(str(vid or ""), NAME_WEIGHT), (name, NAME_WEIGHT), (_str(obj.get("description")), FIELD_WEIGHT)]
+        detail = " / ".join(filter(None, (f"VID {vid}", _str(obj.get("description")))))
+    site = _str(obj.get("site")) or (_str(obj.get("scope")) if obj.get("scope_type") == "dcim.site" else "")
+    texts.append((site, FIELD_WEIGHT))
+    texts.append((kind.replace("_", " "), FIELD_WEIGHT))
+    return name, site, detail, texts
+
+
+class SearchIndex:
+    """In-memory inverted index over devices, IP addresses, prefixes and VLANs for fuzzy lookup.
+
+    Names, roles, descriptions, sites and VLAN IDs are split into words, each
+    with a posting map of the objects holding it. A query word matches
+    indexed words exactly or, for words of three or more letters, by shared
+    trigrams ("acess" finds "access"); the trigram index is over the distinct
+    words, not the objects, so it stays small. Objects must match every query
+    word (any word when nothing matches them all). Addresses and prefixes are
+    also kept in a sorted address list and a per-length network table, so an
+    address or CIDR query finds the exact object, the prefixes containing it
+    and the objects inside it without scanning. Objects are added, replaced
+    and removed one at a time, so the index can follow the topology
+    snapshot's change-log deltas.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self._names = {}
+        self._postings = {}
+        self._grams = {}
+        self._addresses = []
+        self._networks = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def reset(self, objects):
+        """Rebuild from {endpoint: {id: record}} (the snapshot's objects)."""
+        self.__init__()
+        for endpoint, records in objects.items():
+            for object_id, record in records.items():
+                self.update(endpoint, object_id, record)
+
+    def update(self, endpoint, object_id, record):
+        """Index, re-index (record given) or drop (record None) one object; other endpoints are ignored."""
+        kind = KINDS.get(endpoint)
+        if kind is None:
+            return
+        key = (kind, object_id)
+        self.remove(key)
+        if record is not None:
+            self.add(key, dict(record))
+
+    def add(self, key, obj):
+        kind = key[0]
+        name, site, detail, texts = _fields(kind, obj)
+        weights = {}
+        for text, weight in texts:
+            for word in tokens(text):
+                weights[word] = max(weights.get(word, 0.0), weight)
+        for word, weight in weights.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                for gram in trigrams(word):
+                    self._grams.setdefault(gram, set()).add(word)
+            postings[key] = weight
+        network = None
+        if kind in ("ip_address", "prefix") and name:
+            network = ipaddress.ip_interface(name).network if kind == "prefix" else ipaddress.ip_interface(name)
+            entry = (network.version, int(network.network_address if kind == "prefix" else network.ip), key)
+            bisect.insort(self._addresses, entry)
+            if kind == "prefix":
+                self._networks.setdefault((network.version, network.prefixlen), {}).setdefault(entry[1], set()).add(key)
+        self._names.setdefault(name.lower(), set()).add(key)
+        self.docs[key] = {"kind": kind, "name": name, "site": site, "detail": detail,
+                          "words": list(weights), "network": network}
+
+    def remove(self, key):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        names = self._names.get(doc["name"].lower(), set())
+        names.discard(key)
+        if not names:
+            self._names.pop(doc["name"].lower(), None)
+        for word in doc["words"]:
+            postings = self._postings.get(word, {})
+            postings.pop(key, None)
+            if not postings:
+                self._postings.pop(word, None)
+                for gram in trigrams(word):
+                    words = self._grams.get(gram)
+                    if words is not None:
+                        words.discard(word)
+                        if not words:
+                            del self._grams[gram]
+        network = doc["network"]
+        if network is not None:
+            value = int(network.network_address) if key[0] == "prefix" else int(network.ip)
+            entry = (network.version, value, key)
+            i = bisect.bisect_left(self._addresses, entry)
+            if i < len(self._addresses) and self._addresses[i] == entry:
+                del self._addresses[i]
+            if key[0] == "prefix":
+                table = self._networks.get((network.version, network.prefixlen), {})
+                table.get(value, set()).discard(key)
+                if not table.get(value, True):
+                    del table[value]
+
+    def _matches(self, word):
+        """{indexed word: score factor} for a query word: itself, plus trigram neighbours for longer words."""
+        matches = {word: 1.0} if word in self._postings else {}
+        if len(word) < 3 or word.isdigit():
+            return matches
+        grams = trigrams(word)
+        shared = {}
+        for gram in grams:
+            for term in self._grams.get(gram, ()):
+                shared[term] = shared.get(term, 0) + 1
+        for term, count in shared.items():
+            # Dice coefficient of the two trigram sets (a padded word of n letters has n trigrams)
+            similarity = 2 * count / (len(grams) + len(term))
+            if term != word and similarity >= MIN_SIMILARITY:
+                matches[term] = FUZZY_FACTOR * similarity
+        return matches
+
+    def _text_scores(self, words, scores):
+        matches = [self._matches(word) for word in words]
+        if not matches:
+            return
+        # Objects per query word (the posting keys themselves when only one term matched)
+        found = sorted((self._postings[next(iter(terms))].keys() if len(terms) == 1 else
+                        set().union(*(self._postings[term] for term in terms)) for terms in matches), key=len)
+        candidates = set(found[0])
+        for keys in found[1:]:
+            candidates = keys & candidates
+        if not candidates:
+            candidates = set().union(*found)
+        for terms in matches:
+            if len(terms) == 1:
+                (term, factor), = terms.items()
+                postings = self._postings[term]
+                for key in postings.keys() & candidates:
+                    scores[key] = scores.get(key, 0.0) + postings[key] * factor
+                continue
+            # Best hit of this query word per object: exact or closest fuzzy term
+            best = {}
+            for term, factor in terms.items():
+                postings = self._postings[term]
+                for key in postings.keys() & candidates:
+                    score = postings[key] * factor
+                    if score > best.get(key, 0.0):
+                        best[key] = score
+            for key, score in best.items():
+                scores[key] = scores.get(key, 0.0) + score
+
+    def _address_scores(self, network, exact_ip, scores, kinds, limit):
+        """Exact address/prefix, the prefixes containing it (most specific first) and the first objects inside."""
+        version, first = network.version, int(network.network_address)
+        for (v, length), table in self._networks.items():
+            if v != version or length > network.prefixlen:
+                continue
+            shift = network.max_prefixlen - length
+            for key in table.get(first >> shift << shift, ()):
+                exact = length == network.prefixlen and not exact_ip
+                scores[key] = scores.get(key, 0.0) + (10.0 if exact else 4.0 + length / network.max_prefixlen)
+        last = int(network.broadcast_address)
+        lo = bisect.bisect_left(self._addresses, (version, first))
+        hi = bisect.bisect_right(self._addresses, (version, last, (chr(0x10FFFF),)))
+        inside = 0
+        for i in range(lo, hi):
+            if inside >= limit:
+                break
+            key = self._addresses[i][2]
+            if kinds and key[0] not in kinds:
+                continue
+            if key[0] == "ip_address":
+                scores[key] = scores.get(key, 0.0) + (10.0 if exact_ip else 3.0)
+                inside += 1
+            elif not exact_ip and self.docs[key]["network"].prefixlen > network.prefixlen:
+                scores[key] = scores.get(key, 0.0) + 3.0
+                inside += 1
+
+    def search(self, query, kinds=(), limit=10):
+        """Rank objects for the query; returns up to `limit` (score, doc) pairs, best first."""
+        scores = {}
+        words = []
+        for part in query.split():
+            try:
+                if "/" in part:
+                    network, exact_ip = ipaddress.ip_network(part, strict=False), False
+                else:
+                    network, exact_ip = ipaddress.ip_network(ipaddress.ip_address(part)), True
+            except ValueError:
+                words.extend(tokens(part))
+                continue
+            self._address_scores(network, exact_ip, scores, kinds, limit)
+        self._text_scores(words, scores)
+        for key in self._names.get(query.strip().lower(), ()):
+            if key in scores:
+                scores[key] += NAME_MATCH_BONUS
+        if kinds:
+            scores = {key: score for key, score in scores.items() if key[0] in kinds}
+        # Ties go to the lower NetBox id of the same kind
+        best = heapq.nsmallest(limit, ((-score, key) for key, score in scores.items()))
+        return [(-score, self.docs[key]) for score, key in best]
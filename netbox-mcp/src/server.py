@@ -1,149 +1,607 @@
 import os
 import json
+import hmac
+import hashlib
+import asyncio
+import contextvars
+import functools
+import ipaddress
 import logging
-import pynetbox
-from mcp.server.fastmcp import FastMCP
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from mcp.server.fastmcp import Context, FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from cache import InventoryCache, parse_ttls
+from diagram import RENDERERS, DiagramRenderer, TopologyGraph, layer_of
+from encoding import encode
+from metrics import SIZE_BUCKETS, Registry, Tracer
+from netbox_client import AsyncNetBox
+from prefix_index import PrefixIndex
+from search_index import KINDS, SearchIndex
+from singleflight import SingleFlight
+from topology_snapshot import TopologySnapshot
 
-# Setup logging
-logging.basicConfig(level=logging.DEBUG)
+# Setup logging (DEBUG logs every NetBox request; keep it for troubleshooting)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 # Configuration
 NETBOX_URL = os.getenv("NETBOX_URL", "http://netbox:8080")
 NETBOX_TOKEN = os.getenv("NETBOX_TOKEN", "1234567890123456789012345678901234567890")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+CACHE_TTLS = os.getenv("CACHE_TTLS", "dcim.sites=300,ipam.vlans=300,ipam.ip_addresses=30")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+WEBHOOK_SECRET = os.getenv("NETBOX_WEBHOOK_SECRET", "")
+DEFAULT_PAGE_LIMIT = int(os.getenv("DEFAULT_PAGE_LIMIT", "50"))
+MAX_PAGE_LIMIT = 1000
+PARENT_CHUNK_SIZE = 100
+# get_devices / get_ip_addresses: keys per NetBox query, keys per call
+BATCH_CHUNK_SIZE = 100
+MAX_BATCH_KEYS = 500
+STREAM_PAGE_SIZE = int(os.getenv("STREAM_PAGE_SIZE", "500"))
+NETBOX_HTTP2 = os.getenv("NETBOX_HTTP2", "true").lower() in ("1", "true", "yes")
+NETBOX_MAX_CONNECTIONS = int(os.getenv("NETBOX_MAX_CONNECTIONS", "20"))
+NETBOX_MAX_INFLIGHT = int(os.getenv("NETBOX_MAX_INFLIGHT", "8"))
+NETBOX_TIMEOUT = float(os.getenv("NETBOX_TIMEOUT", "30"))
+NETBOX_PAGE_SIZE = int(os.getenv("NETBOX_PAGE_SIZE", "1000"))
+NETBOX_PAGE_WORKERS = int(os.getenv("NETBOX_PAGE_WORKERS", "4"))
+TOOL_RESULT_FORMAT = os.getenv("TOOL_RESULT_FORMAT", "table")
+TOPOLOGY_SNAPSHOT = os.getenv("TOPOLOGY_SNAPSHOT", "true").lower() in ("1", "true", "yes")
+TOPOLOGY_FULL_REFRESH = float(os.getenv("TOPOLOGY_FULL_REFRESH", "3600"))
+TOPOLOGY_MAX_DELTA = int(os.getenv("TOPOLOGY_MAX_DELTA", "500"))
+# count_objects uses one count query per group up to this many groups, otherwise one scan
+AGGREGATE_MAX_QUERIES = int(os.getenv("AGGREGATE_MAX_QUERIES", "50"))
+# Rendered diagrams kept, keyed by topology content hash and format
+DIAGRAM_CACHE_SIZE = int(os.getenv("DIAGRAM_CACHE_SIZE", "32"))
+MAX_GRAPH_HOPS = 10
+# search reuses a snapshot checked against the change log this many seconds ago
+SEARCH_MAX_STALENESS = float(os.getenv("SEARCH_MAX_STALENESS", "5"))
+SEARCH_WARMUP = os.getenv("SEARCH_WARMUP", "true").lower() in ("1", "true", "yes")
+MAX_SEARCH_RESULTS = 50
+# Optional JSON-lines span file (tool calls with their NetBox requests as children)
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+# Metrics published on /metrics
+metrics = Registry()
+tool_seconds = metrics.histogram("netbox_mcp_tool_duration_seconds", "MCP tool call latency", ["tool"])
+tool_result_bytes = metrics.histogram("netbox_mcp_tool_result_bytes", "Size of MCP tool results", ["tool"],
+                                      buckets=SIZE_BUCKETS)
+tool_errors = metrics.counter("netbox_mcp_tool_errors_total", "MCP tool calls that returned an error", ["tool"])
+encode_seconds = metrics.histogram("netbox_mcp_encode_duration_seconds", "Time spent serializing tool results",
+                                   ["tool"])
+netbox_seconds = metrics.histogram("netbox_mcp_netbox_request_duration_seconds", "NetBox API request latency",
+                                   ["endpoint"])
+netbox_requests = metrics.counter("netbox_mcp_netbox_requests_total", "NetBox API requests by status code",
+                                  ["endpoint", "status"])
+netbox_bytes = metrics.counter("netbox_mcp_netbox_response_bytes_total", "NetBox API response bytes",
+                               ["endpoint"])
+tracer = Tracer(TRACE_FILE)
+current_tool = contextvars.ContextVar("current_tool", default="")
+
+def _on_netbox_request(path, status_code, seconds, size):
+    netbox_seconds.observe(seconds, endpoint=path)
+    netbox_requests.inc(endpoint=path, status=str(status_code))
+    netbox_bytes.inc(size, endpoint=path)
+    tracer.record("netbox.request", seconds, endpoint=path, status_code=status_code, bytes=size)
 
 # Initialize FastMCP with SSE settings
-mcp = FastMCP("netbox-mcp")
-nb = pynetbox.api(NETBOX_URL, token=NETBOX_TOKEN)
+@asynccontextmanager
+async def _session_lifespan(server):
+    """Runs for every MCP client session; the first one starts building the search index."""
+    global search_warmup
+    if SEARCH_WARMUP and search_warmup is None:
+        search_warmup = asyncio.create_task(_warm_search())
+    yield {}
+
+mcp = FastMCP("netbox-mcp", lifespan=_session_lifespan)
+nb = AsyncNetBox(NETBOX_URL, NETBOX_TOKEN, max_connections=NETBOX_MAX_CONNECTIONS,
+                 per_host=NETBOX_MAX_INFLIGHT, http2=NETBOX_HTTP2, timeout=NETBOX_TIMEOUT,
+                 page_size=NETBOX_PAGE_SIZE, page_workers=NETBOX_PAGE_WORKERS, on_request=_on_netbox_request)
+cache = InventoryCache(max_entries=CACHE_MAX_ENTRIES, default_ttl=CACHE_TTL, ttls=parse_ttls(CACHE_TTLS))
+diagrams = DiagramRenderer(max_entries=DIAGRAM_CACHE_SIZE)
+# Kept current by the topology snapshot (a listener of its rebuilds and deltas)
+search_index = SearchIndex()
+search_warmup = None
+# Concurrent identical tool calls / NetBox fetches share one in-flight run
+tool_flight = SingleFlight()
+fetch_flight = SingleFlight()
+
+def _instrumented(tool):
+    """Record latency, result size and errors of a tool, plus a span when TRACE_FILE is set."""
+    name = tool.__name__
+
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        token = current_tool.set(name)
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"tool.{name}") as span:
+                result = await tool(*args, **kwargs)
+                span["attributes"]["bytes"] = len(result)
+        except Exception:
+            tool_errors.inc(tool=name)
+            raise
+        finally:
+            current_tool.reset(token)
+            tool_seconds.observe(time.perf_counter() - started, tool=name)
+        tool_result_bytes.observe(len(result.encode()), tool=name)
+        if result.startswith("Error"):
+            tool_errors.inc(tool=name)
+        return result
+    return wrapper
+
+def _coalesced(tool):
+    """Share one run among concurrent identical calls of a tool; streaming calls report to their own client."""
+    return tool_flight.wrap(tool, bypass=lambda arguments: arguments.get("stream"))
+
+def _result(value):
+    """Encode a tool result: minified JSON without empty fields, lists of rows as columns + rows."""
+    started = time.perf_counter()
+    text = encode(value, tabular=TOOL_RESULT_FORMAT == "table")
+    encode_seconds.observe(time.perf_counter() - started, tool=current_tool.get())
+    return text
+
+async def _list(endpoint, **filters):
+    """List NetBox records for an endpoint such as "dcim.devices", served from the cache when fresh."""
+    hit, records = cache.get(endpoint, filters)
+    if hit:
+        logger.debug(f"Cache hit for {endpoint} {filters}")
+        return records
+
+    async def fetch():
+        generation = cache.generation(endpoint)
+        records = await nb.list(endpoint, **filters)
+        cache.set(endpoint, filters, records, generation)
+        return records
+    return await fetch_flight.do(cache.key(endpoint, filters), fetch)
+
+async def _get(endpoint, **filters):
+    """Return the first record matching the filters, or None."""
+    records = await _list(endpoint, **filters)
+    return records[0] if records else None
+
+async def _page(endpoint, limit, offset, **filters):
+    """Fetch one page of an endpoint through the cache; returns (total count, records)."""
+    key = dict(filters, _limit=limit, _offset=offset)
+    hit, page = cache.get(endpoint, key)
+    if hit:
+        return page
+
+    async def fetch():
+        generation = cache.generation(endpoint)
+        page = await nb.page(endpoint, limit, offset, **filters)
+        cache.set(endpoint, key, page, generation)
+        return page
+    return await fetch_flight.do(cache.key(endpoint, key), fetch)
+
+async def _iter_pages(endpoint, page_size=STREAM_PAGE_SIZE, offset=0, **filters):
+    """Yield (total count, records) one NetBox page at a time.
+
+    Pages are fetched lazily and bypass the cache, so only the current page
+    is held in memory.
+    """
+    while True:
+        count, records = await nb.page(endpoint, page_size, offset, **filters)
+        if not records:
+            return
+        yield count, records
+        offset += len(records)
+        if offset >= count:
+            return
+
+class PageStream:
+    """Sends each serialized page of a streaming tool as an MCP progress notification.
+
+    Each page is a JSON object {"section", "results", "count"} serialized on
+    its own. If the client did not request progress notifications the pages
+    are buffered and returned as NDJSON instead, so it still gets the data.
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        meta = ctx.request_context.meta if ctx else None
+        self.forward = bool(meta and meta.progressToken is not None)
+        self.buffered = []
+        self.pages = 0
+
+    async def send(self, section, results, count=None):
+        chunk = _result({"section": section, "count": count, "results": results})
+        self.pages += 1
+        if self.forward:
+            await self.ctx.report_progress(self.pages, None, message=chunk)
+        else:
+            self.buffered.append(chunk)
+
+    def result(self):
+        if self.forward:
+            return json.dumps({"streamed": True, "pages": self.pages})
+        return "\n".join(self.buffered)
+
+async def _count(endpoint, **filters):
+    key = dict(filters, _count=True)
+    hit, count = cache.get(endpoint, key)
+    if hit:
+        return count
+
+    async def fetch():
+        generation = cache.generation(endpoint)
+        count = await nb.count(endpoint, **filters)
+        cache.set(endpoint, key, count, generation)
+        return count
+    return await fetch_flight.do(cache.key(endpoint, key), fetch)
+
+def _vrf_id(obj):
+    """Return the VRF id of a prefix/IP record, or None for the global table."""
+    vrf = getattr(obj, "vrf", None)
+    return vrf.id if vrf else None
+
+def _is_container(prefix):
+    status = getattr(prefix, "status", None)
+    return str(getattr(status, "value", status)) == "container"
+
+async def _prefix_ip_counts(prefixes, scoped=False, ips=None):
+    """Count IP addresses per prefix with a single paged scan of NetBox IP addresses.
+
+    Replaces one ip_addresses.count(parent=...) request per prefix. With
+    scoped=True only addresses inside the given prefixes are fetched (one
+    parent=[...] query per chunk, chunks in parallel), which suits a single
+    page of prefixes. An already fetched IP list can be passed as `ips`.
+    Returns {prefix id: ip_count}; counts fall back to 0 if the scan fails.
+    """
+    index = PrefixIndex()
+    for prefix in prefixes:
+        index.add_prefix(prefix.id, prefix.prefix, vrf=_vrf_id(prefix), container=_is_container(prefix))
+    if not index.counts:
+        return index.counts
+    try:
+        if ips is not None:
+            pass
+        elif scoped:
+            parents = sorted({str(p.prefix) for p in prefixes})
+            chunks = await asyncio.gather(*(_list("ipam.ip_addresses", parent=parents[i:i + PARENT_CHUNK_SIZE])
+                                            for i in range(0, len(parents), PARENT_CHUNK_SIZE)))
+            # Nested prefixes in different chunks return the same address twice
+            ips = {ip.id: ip for chunk in chunks for ip in chunk}.values()
+        else:
+            ips = await _list("ipam.ip_addresses")
+        index.add_ips((ip.address, _vrf_id(ip)) for ip in ips)
+    except Exception as e:
+        logger.warning(f"IP address scan failed, reporting ip_count=0: {e}")
+        return {key: 0 for key in index.counts}
+    return index.counts
+
+async def _lookup(endpoint, value):
+    """Find a record of a small reference table (sites, roles, tenants, VRFs, tags) by name, slug or RD."""
+    wanted = value.strip().lower()
+    for record in await _list(endpoint):
+        values = dict(record)
+        if wanted in {str(values.get(attr) or "").lower() for attr in ("name", "slug", "rd")}:
+            return record
+    return None
+
+async def _filters(site="", role="", status="", tag="", vrf="", tenant="", role_endpoint="dcim.device_roles"):
+    """Translate tool filter arguments into NetBox query parameters.
+
+    Names are resolved to ids so the LLM can pass "Data Center A" as well as
+    the slug "dc-a"; unknown values are passed through as slugs. Roles are
+    looked up in `role_endpoint` (ipam.roles for prefixes and VLANs).
+    """
+    filters = {}
+    for param, endpoint, value in (("site", "dcim.sites", site), ("role", role_endpoint, role),
+                                   ("tenant", "tenancy.tenants", tenant)):
+        if value:
+            record = await _lookup(endpoint, value)
+            if record:
+                filters[f"{param}_id"] = record.id
+            else:
+                filters[param] = value
+    if tag:
+        record = await _lookup("extras.tags", tag)
+        filters["tag"] = record.slug if record else tag
+    if vrf:
+        if vrf.lower() == "global":
+            filters["vrf_id"] = "null"
+        else:
+            record = await _lookup("ipam.vrfs", vrf)
+            filters.update({"vrf_id": record.id} if record else {"vrf": vrf})
+    if status:
+        filters["status"] = status.lower()
+    return filters
+
+def _project(rows, fields):
+    """Keep only the comma separated `fields` of each row; unknown names are ignored."""
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    if wanted and rows and any(f in rows[0] for f in wanted):
+        rows = [{f: row[f] for f in wanted if f in row} for row in rows]
+    return rows
+
+async def _batch_lookup(endpoint, param, keys, key_of):
+    """Fetch the records for many keys with one `param=[...]` query per chunk, chunks in parallel.
+
+    Returns ({key: [records]}, [keys not found]); `key_of(record)` gives the
+    requested keys a record answers, so e.g. "10.0.0.1" finds 10.0.0.1/24.
+    """
+    chunks = await asyncio.gather(*(_list(endpoint, **{param: keys[i:i + BATCH_CHUNK_SIZE]})
+                                    for i in range(0, len(keys), BATCH_CHUNK_SIZE)))
+    found = {}
+    for record in {record.id: record for chunk in chunks for record in chunk}.values():
+        for key in key_of(record):
+            found.setdefault(key, []).append(record)
+    return found, [key for key in keys if key not in found]
+
+def _batch_keys(values):
+    """Distinct non-empty keys in request order."""
+    keys = list(dict.fromkeys(str(value).strip() for value in values if str(value).strip()))
+    if len(keys) > MAX_BATCH_KEYS:
+        raise ValueError(f"At most {MAX_BATCH_KEYS} keys per call")
+    return keys
+
+async def _paged(endpoint, make_row, limit, offset, fields, filters, prepare=None):
+    """Build a paged tool result: {count, offset, limit, next_cursor, results}.
+
+    `fields` is a comma separated projection of the row keys; unknown names
+    are ignored. `await prepare(records)` can compute per-page data for make_row.
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT))
+    offset = max(0, offset)
+    count, records = await _page(endpoint, limit, offset, **filters)
+    extra = await prepare(records) if prepare else None
+    rows = _project([make_row(record, extra) for record in records], fields)
+    next_cursor = offset + len(records) if offset + len(records) < count else None
+    return {"count": count, "offset": offset, "limit": limit, "next_cursor": next_cursor, "results": rows}
 
 @mcp.tool()
-def get_device(name: str) -> str:
+@_instrumented
+@_coalesced
+async def get_device(name: str) -> str:
     """Get device details by name."""
     try:
-        device = nb.dcim.devices.get(name=name)
+        device = await _get("dcim.devices", name=name)
         if device:
-            return str(dict(device))
+            return _result(dict(device))
         return "Device not found."
     except Exception as e:
         return f"Error: {str(e)}"
 
+def _device_detail(device):
+    """Device fields for batch lookups: nested objects as names, no URLs, ids or custom fields."""
+    primary_ip = getattr(device, "primary_ip", None) or getattr(device, "primary_ip4", None)
+    return dict(
+        _device_row(device),
+        tenant=str(device.tenant) if getattr(device, "tenant", None) else "",
+        platform=str(device.platform) if getattr(device, "platform", None) else "",
+        rack=str(device.rack) if getattr(device, "rack", None) else "",
+        serial=getattr(device, "serial", "") or "",
+        primary_ip=str(primary_ip.address) if primary_ip else "",
+        description=getattr(device, "description", "") or "",
+    )
+
 @mcp.tool()
-def list_sites() -> str:
+@_instrumented
+@_coalesced
+async def get_devices(names: list[str], fields: str = "") -> str:
+    """Get details of many devices by name in one call.
+
+    fields: comma separated subset of name,device_type,role,site,status,tenant,platform,rack,serial,primary_ip,description.
+    Returns count, results (one row per device) and missing (names not found).
+    """
+    try:
+        keys = _batch_keys(names)
+        found, missing = await _batch_lookup("dcim.devices", "name", keys, lambda device: [device.name])
+        rows = _project([_device_detail(device) for key in keys for device in found.get(key, ())], fields)
+        return _result({"count": len(rows), "results": rows, "missing": missing})
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def list_sites() -> str:
     """List all sites."""
     try:
-        sites = nb.dcim.sites.all()
-        return str([site.name for site in sites])
+        sites = await _list("dcim.sites")
+        return _result([site.name for site in sites])
     except Exception as e:
         return f"Error: {str(e)}"
 
+def _device_row(device, extra=None):
+    return {
+        "name": device.name,
+        "device_type": str(device.device_type) if device.device_type else "",
+        "role": str(device.role) if device.role else "",
+        "site": str(device.site) if device.site else "",
+        "status": str(device.status) if device.status else "unknown"
+    }
+
 @mcp.tool()
-def list_devices() -> str:
-    """List all devices in NetBox."""
+@_instrumented
+@_coalesced
+async def list_devices(site: str = "", role: str = "", status: str = "", tag: str = "", tenant: str = "",
+                       limit: int = DEFAULT_PAGE_LIMIT, offset: int = 0, fields: str = "") -> str:
+    """List devices in NetBox, one page at a time.
+
+    Optional filters: site, role, status, tag, tenant (name or slug).
+    fields: comma separated subset of name,device_type,role,site,status.
+    Returns count (total matches) and next_cursor; pass next_cursor as offset to get the next page.
+    """
     logger.info("list_devices called")
     try:
         logger.debug("Fetching devices from NetBox...")
-        devices = nb.dcim.devices.all()
-        result = []
-        for device in devices:
-            result.append({
-                "name": device.name,
-                "device_type": str(device.device_type) if device.device_type else "",
-                "role": str(device.role) if device.role else "",
-                "site": str(device.site) if device.site else "",
-                "status": str(device.status) if device.status else "unknown"
-            })
-        logger.info(f"Found {len(result)} devices")
-        return json.dumps(result)
+        filters = await _filters(site=site, role=role, status=status, tag=tag, tenant=tenant)
+        result = await _paged("dcim.devices", _device_row, limit, offset, fields, filters)
+        logger.info(f"Found {result['count']} devices, returning {len(result['results'])}")
+        return _result(result)
     except Exception as e:
         logger.error(f"Error in list_devices: {e}")
         return f"Error: {str(e)}"
 
 @mcp.tool()
-def get_ip_address(address: str) -> str:
+@_instrumented
+@_coalesced
+async def get_ip_address(address: str) -> str:
     """Get IP address details."""
     try:
-        ip = nb.ipam.ip_addresses.get(address=address)
+        ip = await _get("ipam.ip_addresses", address=address)
         if ip:
-            return str(dict(ip))
+            return _result(dict(ip))
         return "IP Address not found."
     except Exception as e:
         return f"Error: {str(e)}"
 
+def _ip_row(ip, extra=None):
+    return {
+        "address": str(ip.address),
+        "description": ip.description or "",
+        "status": str(ip.status) if ip.status else "unknown",
+        "vrf": str(ip.vrf) if ip.vrf else ""
+    }
+
+def _ip_detail(ip):
+    """IP address fields for batch lookups: the assigned device and interface by name, no URLs or ids."""
+    assigned = getattr(ip, "assigned_object", None)
+    device = (getattr(assigned, "device", None) or getattr(assigned, "virtual_machine", None)) if assigned else None
+    return dict(
+        _ip_row(ip),
+        tenant=str(ip.tenant) if getattr(ip, "tenant", None) else "",
+        role=str(ip.role) if getattr(ip, "role", None) else "",
+        dns_name=getattr(ip, "dns_name", "") or "",
+        device=str(device) if device else "",
+        interface=str(assigned) if assigned else "",
+    )
+
+def _ip_keys(address, requested):
+    """Requested keys answered by an IP record: its address as stored and, for keys without a mask, its host."""
+    host = str(ipaddress.ip_interface(address).ip)
+    return [key for key in (address, host) if key in requested]
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def get_ip_addresses(addresses: list[str], fields: str = "") -> str:
+    """Get details of many IP addresses in one call; an address without a mask matches any mask.
+
+    fields: comma separated subset of address,description,status,vrf,tenant,role,dns_name,device,interface.
+    Returns count, results (one row per address; the same address in several VRFs gives several rows),
+    missing (addresses not found) and invalid (not IP addresses).
+    """
+    try:
+        keys, invalid = [], []
+        for key in _batch_keys(addresses):
+            try:
+                keys.append(str(ipaddress.ip_interface(key)) if "/" in key else str(ipaddress.ip_address(key)))
+            except ValueError:
+                invalid.append(key)
+        requested = set(keys)
+        found, missing = await _batch_lookup("ipam.ip_addresses", "address", keys,
+                                             lambda ip: _ip_keys(str(ip.address), requested))
+        rows = _project([_ip_detail(ip) for ip in {ip.id: ip for key in keys for ip in found.get(key, ())}.values()],
+                        fields)
+        return _result({"count": len(rows), "results": rows, "missing": missing, "invalid": invalid})
+    except Exception as e:
+        return f"Error: {str(e)}"
+
 @mcp.tool()
-def list_ip_addresses() -> str:
-    """List all IP addresses in NetBox."""
+@_instrumented
+@_coalesced
+async def list_ip_addresses(status: str = "", tag: str = "", vrf: str = "", tenant: str = "",
+                            limit: int = DEFAULT_PAGE_LIMIT, offset: int = 0, fields: str = "",
+                            stream: bool = False, ctx: Context = None) -> str:
+    """List IP addresses in NetBox, one page at a time.
+
+    Optional filters: status, tag, vrf (name, RD or "global"), tenant.
+    fields: comma separated subset of address,description,status,vrf.
+    Returns count (total matches) and next_cursor; pass next_cursor as offset to get the next page.
+    stream=true returns every match from offset onwards, sent page by page as NetBox returns them.
+    """
     logger.info("list_ip_addresses called")
     try:
         logger.debug("Fetching IP addresses from NetBox...")
-        ips = nb.ipam.ip_addresses.all()
-        result = []
-        for ip in ips:
-            result.append({
-                "address": str(ip.address),
-                "description": ip.description or "",
-                "status": str(ip.status) if ip.status else "unknown"
-            })
-        logger.info(f"Found {len(result)} IP addresses")
-        return json.dumps(result)
+        filters = await _filters(status=status, tag=tag, vrf=vrf, tenant=tenant)
+        if stream:
+            page_stream = PageStream(ctx)
+            wanted = [f.strip() for f in fields.split(",") if f.strip()]
+            async for count, records in _iter_pages("ipam.ip_addresses", offset=max(0, offset), **filters):
+                rows = [_ip_row(ip) for ip in records]
+                if wanted:
+                    rows = [{f: row[f] for f in wanted if f in row} for row in rows]
+                await page_stream.send("ip_addresses", rows, count)
+            logger.info(f"Streamed IP addresses in {page_stream.pages} pages")
+            return page_stream.result()
+        result = await _paged("ipam.ip_addresses", _ip_row, limit, offset, fields, filters)
+        logger.info(f"Found {result['count']} IP addresses, returning {len(result['results'])}")
+        return _result(result)
     except Exception as e:
         logger.error(f"Error in list_ip_addresses: {e}")
         return f"Error: {str(e)}"
 
+def _prefix_row(prefix, ip_counts):
+    # Safely get site attribute
+    site_name = ""
+    try:
+        if hasattr(prefix, 'site') and prefix.site:
+            site_name = str(prefix.site)
+    except Exception:
+        pass
+
+    return {
+        "prefix": str(prefix.prefix),
+        "description": prefix.description or "",
+        "status": str(prefix.status) if prefix.status else "unknown",
+        "site": site_name,
+        "vrf": str(prefix.vrf) if getattr(prefix, "vrf", None) else "",
+        "ip_count": ip_counts.get(prefix.id, 0)
+    }
+
 @mcp.tool()
-def list_prefixes() -> str:
-    """List all IP prefixes/subnets in NetBox with utilization info."""
+@_instrumented
+@_coalesced
+async def list_prefixes(site: str = "", status: str = "", tag: str = "", vrf: str = "", tenant: str = "",
+                        limit: int = DEFAULT_PAGE_LIMIT, offset: int = 0, fields: str = "") -> str:
+    """List IP prefixes/subnets in NetBox with utilization info, one page at a time.
+
+    Optional filters: site, status, tag, vrf (name, RD or "global"), tenant.
+    fields: comma separated subset of prefix,description,status,site,vrf,ip_count.
+    Returns count (total matches) and next_cursor; pass next_cursor as offset to get the next page.
+    """
     logger.info("list_prefixes called")
     try:
         logger.debug("Fetching prefixes from NetBox...")
-        prefixes = nb.ipam.prefixes.all()
-        result = []
-        for prefix in prefixes:
-            # Get IP count in this prefix
-            try:
-                ip_count = nb.ipam.ip_addresses.count(parent=str(prefix.prefix))
-            except:
-                ip_count = 0
-            
-            # Safely get site attribute
-            site_name = ""
-            try:
-                if hasattr(prefix, 'site') and prefix.site:
-                    site_name = str(prefix.site)
-            except:
-                pass
-                
-            result.append({
-                "prefix": str(prefix.prefix),
-                "description": prefix.description or "",
-                "status": str(prefix.status) if prefix.status else "unknown",
-                "site": site_name,
-                "ip_count": ip_count
-            })
-        logger.info(f"Found {len(result)} prefixes")
-        return json.dumps(result)
+        filters = await _filters(site=site, status=status, tag=tag, vrf=vrf, tenant=tenant)
+        result = await _paged("ipam.prefixes", _prefix_row, limit, offset, fields, filters,
+                              prepare=lambda page: _prefix_ip_counts(page, scoped=True))
+        logger.info(f"Found {result['count']} prefixes, returning {len(result['results'])}")
+        return _result(result)
     except Exception as e:
         logger.error(f"Error in list_prefixes: {e}")
         return f"Error: {str(e)}"
 
 @mcp.tool()
-def get_prefix(prefix: str) -> str:
+@_instrumented
+@_coalesced
+async def get_prefix(prefix: str) -> str:
     """Get details of a specific IP prefix/subnet."""
     try:
-        p = nb.ipam.prefixes.get(prefix=prefix)
+        p = await _get("ipam.prefixes", prefix=prefix)
         if p:
+            # A single prefix needs one count query, scoped to its VRF like the bulk index
             try:
-                ip_count = nb.ipam.ip_addresses.count(parent=str(p.prefix))
-            except:
+                filters = {"parent": str(p.prefix)}
+                if not (_vrf_id(p) is None and _is_container(p)):
+                    filters["vrf_id"] = _vrf_id(p) or "null"
+                ip_count = await _count("ipam.ip_addresses", **filters)
+            except Exception:
                 ip_count = 0
             
             site_name = ""
             try:
                 if hasattr(p, 'site') and p.site:
                     site_name = str(p.site)
-            except:
+            except Exception:
                 pass
                 
-            return json.dumps({
+            return _result({
                 "prefix": str(p.prefix),
                 "description": p.description or "",
                 "status": str(p.status) if p.status else "unknown",
@@ -154,245 +612,674 @@ def get_prefix(prefix: str) -> str:
     except Exception as e:
         return f"Error: {str(e)}"
 
+def _vlan_row(vlan, extra=None):
+    return {
+        "vid": vlan.vid,
+        "name": vlan.name,
+        "description": vlan.description or "",
+        "status": str(vlan.status) if vlan.status else "unknown",
+        "site": str(vlan.site) if getattr(vlan, "site", None) else ""
+    }
+
 @mcp.tool()
-def list_vlans() -> str:
-    """List all VLANs in NetBox."""
+@_instrumented
+@_coalesced
+async def list_vlans(site: str = "", status: str = "", tag: str = "", tenant: str = "", vid: int = 0,
+                     limit: int = DEFAULT_PAGE_LIMIT, offset: int = 0, fields: str = "") -> str:
+    """List VLANs in NetBox, one page at a time.
+
+    Optional filters: site, status, tag, tenant (name or slug), vid (VLAN ID).
+    fields: comma separated subset of vid,name,description,status,site.
+    Returns count (total matches) and next_cursor; pass next_cursor as offset to get the next page.
+    """
     logger.info("list_vlans called")
     try:
         logger.debug("Fetching VLANs from NetBox...")
-        vlans = nb.ipam.vlans.all()
-        result = []
-        for vlan in vlans:
-            result.append({
-                "vid": vlan.vid,
-                "name": vlan.name,
-                "description": vlan.description or "",
-                "status": str(vlan.status) if vlan.status else "unknown"
-            })
-        logger.info(f"Found {len(result)} VLANs")
-        return json.dumps(result)
+        filters = await _filters(site=site, status=status, tag=tag, tenant=tenant)
+        if vid:
+            filters["vid"] = vid
+        result = await _paged("ipam.vlans", _vlan_row, limit, offset, fields, filters)
+        logger.info(f"Found {result['count']} VLANs, returning {len(result['results'])}")
+        return _result(result)
     except Exception as e:
         logger.error(f"Error in list_vlans: {e}")
         return f"Error: {str(e)}"
 
+# count_objects: object type -> endpoint and the fields it can group by, mapped to the
+# reference table whose records are the groups (None: the status choices below)
+# object_type: (endpoint, {group_by: reference endpoint}, {filter: role endpoint or None})
+AGGREGATES = {
+    "devices": ("dcim.devices", {"site": "dcim.sites", "role": "dcim.device_roles",
+                                 "device_type": "dcim.device_types", "tenant": "tenancy.tenants", "status": None},
+                {"site": None, "role": "dcim.device_roles", "status": None, "tag": None, "tenant": None}),
+    "prefixes": ("ipam.prefixes", {"site": "dcim.sites", "vrf": "ipam.vrfs", "tenant": "tenancy.tenants",
+                                   "status": None},
+                 {"site": None, "role": "ipam.roles", "status": None, "tag": None, "vrf": None, "tenant": None}),
+    "ip_addresses": ("ipam.ip_addresses", {"vrf": "ipam.vrfs", "tenant": "tenancy.tenants", "status": None},
+                     {"status": None, "tag": None, "vrf": None, "tenant": None}),
+    "vlans": ("ipam.vlans", {"site": "dcim.sites", "tenant": "tenancy.tenants", "status": None},
+              {"site": None, "role": "ipam.roles", "status": None, "tag": None, "tenant": None}),
+}
+STATUS_CHOICES = {
+    "devices": ["active", "offline", "planned", "staged", "failed", "inventory", "decommissioning"],
+    "prefixes": ["container", "active", "reserved", "deprecated"],
+    "ip_addresses": ["active", "reserved", "deprecated", "dhcp", "slaac"],
+    "vlans": ["active", "reserved", "deprecated"],
+}
+NO_GROUP = "(none)"
+# Objects whose status is not in STATUS_CHOICES (custom statuses)
+OTHER_STATUS = "(other)"
+
+def _group_label(record):
+    values = dict(record)
+    return str(values.get("name") or values.get("model") or values.get("display") or record.id)
+
+def _group_of(record, field):
+    value = getattr(record, field, None)
+    if not value:
+        return NO_GROUP
+    if field == "status":
+        return str(getattr(value, "value", value))
+    return _group_label(value)
+
+async def _grouped_counts(object_type, endpoint, group_by, filters, total):
+    """{group: count}; one count query per group for short group lists, else one scan of the endpoint."""
+    reference = AGGREGATES[object_type][1][group_by]
+    if reference:
+        groups = [(_group_label(record), {f"{group_by}_id": record.id}) for record in await _list(reference)]
+    else:
+        groups = [(status, {"status": status}) for status in STATUS_CHOICES[object_type]]
+
+    # A filter on the grouped field itself cannot be combined with the per-group filter
+    overlapping = filters.keys() & {key for _, group_filter in groups for key in group_filter}
+    if overlapping or len(groups) > AGGREGATE_MAX_QUERIES:
+        counts = Counter(_group_of(record, group_by) for record in await _list(endpoint, **filters))
+    else:
+        values = await asyncio.gather(*(_count(endpoint, **filters, **group_filter) for _, group_filter in groups))
+        counts = Counter()
+        for (label, _), value in zip(groups, values):
+            counts[label] += value
+        if total > sum(counts.values()):
+            counts[NO_GROUP if reference else OTHER_STATUS] = total - sum(counts.values())
+    return {label: value for label, value in counts.most_common() if value}
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def count_objects(object_type: str = "devices", group_by: str = "", site: str = "", role: str = "",
+                        status: str = "", tag: str = "", vrf: str = "", tenant: str = "") -> str:
+    """Count NetBox objects, optionally grouped, without listing them.
+
+    object_type: devices, prefixes, ip_addresses or vlans.
+    group_by: devices: site, role, device_type, tenant, status; prefixes: site, vrf, tenant, status;
+    ip_addresses: vrf, tenant, status; vlans: site, tenant, status.
+    Optional filters: devices: site, role, status, tag, tenant; prefixes: site, role, status, tag, vrf, tenant;
+    ip_addresses: status, tag, vrf, tenant; vlans: site, role, status, tag, tenant.
+    Returns the total and {group: count} sorted by count, e.g. to answer "how many devices per site".
+    """
+    logger.info(f"count_objects called for {object_type} by {group_by or 'nothing'}")
+    try:
+        if object_type not in AGGREGATES:
+            return f"Error: object_type must be one of {', '.join(AGGREGATES)}"
+        endpoint, dimensions, allowed = AGGREGATES[object_type]
+        if group_by and group_by not in dimensions:
+            return f"Error: {object_type} can be grouped by {', '.join(dimensions)}"
+        given = {"site": site, "role": role, "status": status, "tag": tag, "vrf": vrf, "tenant": tenant}
+        unsupported = [name for name, value in given.items() if value and name not in allowed]
+        if unsupported:
+            return (f"Error: {object_type} cannot be filtered by {', '.join(unsupported)}; "
+                    f"filters: {', '.join(allowed)}")
+        filters = await _filters(**{name: value for name, value in given.items() if value},
+                                 role_endpoint=allowed.get("role") or "dcim.device_roles")
+        total = await _count(endpoint, **filters)
+        result = {"object_type": object_type, "total": total}
+        if group_by:
+            result["group_by"] = group_by
+            result["counts"] = await _grouped_counts(object_type, endpoint, group_by, filters, total)
+        return _result(result)
+    except Exception as e:
+        logger.error(f"Error in count_objects: {e}")
+        return f"Error: {str(e)}"
+
+def _usable_range(prefix):
+    """(network, first, last) of the addresses NetBox counts as available in a prefix record.
+
+    IPv4 subnets larger than /31 lose the network and broadcast address,
+    except pools (is_pool), where every address is assignable.
+    """
+    network = ipaddress.ip_network(str(prefix.prefix), strict=False)
+    first, last = int(network.network_address), int(network.broadcast_address)
+    if network.version == 4 and network.prefixlen < 31 and not getattr(prefix, "is_pool", False):
+        first, last = first + 1, last - 1
+    return network, first, last
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def top_prefix_utilization(limit: int = 10, min_utilization: float = 0, site: str = "", status: str = "",
+                                 vrf: str = "", tenant: str = "") -> str:
+    """Rank prefixes by IP address utilization (percentage of usable addresses in use).
+
+    limit: number of prefixes to return (default 10). min_utilization: only prefixes at or
+    above this percentage, e.g. 80 for "which prefixes are over 80% full".
+    Optional filters: site, status, vrf, tenant. Container prefixes are skipped.
+    Returns matches (how many prefixes qualify) and the top rows.
+    """
+    logger.info("top_prefix_utilization called")
+    try:
+        filters = await _filters(site=site, status=status, vrf=vrf, tenant=tenant)
+        prefixes = [p for p in await _list("ipam.prefixes", **filters) if not _is_container(p)]
+        # One scan of all IP addresses through the in-memory prefix index
+        ip_counts = await _prefix_ip_counts(prefixes)
+        rows = []
+        for prefix in prefixes:
+            _, first, last = _usable_range(prefix)
+            size = last - first + 1
+            used = ip_counts.get(prefix.id, 0)
+            # NetBox reports prefixes marked utilized as full
+            if getattr(prefix, "mark_utilized", False):
+                utilization = 100.0
+            else:
+                utilization = round(100.0 * used / size, 1) if size else 0.0
+            if utilization >= min_utilization:
+                rows.append({"prefix": str(prefix.prefix),
+                             "site": str(prefix.site) if getattr(prefix, "site", None) else "",
+                             "vrf": str(prefix.vrf) if getattr(prefix, "vrf", None) else "",
+                             "ip_count": used, "size": size, "utilization": utilization})
+        rows.sort(key=lambda row: (-row["utilization"], -row["ip_count"]))
+        limit = max(1, min(limit or 10, MAX_PAGE_LIMIT))
+        return _result({"matches": len(rows), "results": rows[:limit]})
+    except Exception as e:
+        logger.error(f"Error in top_prefix_utilization: {e}")
+        return f"Error: {str(e)}"
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def find_free_ips(prefix: str, count: int = 5) -> str:
+    """Find unused IP addresses in a prefix.
+
+    Returns the usable size, used and free address counts, and the first `count` free addresses (max 100).
+    A prefix marked utilized in NetBox has no free addresses.
+    """
+    logger.info(f"find_free_ips called for {prefix}")
+    try:
+        p = await _get("ipam.prefixes", prefix=prefix)
+        if not p:
+            return "Prefix not found."
+        # Same VRF scoping as the utilization counts
+        filters = {"parent": str(p.prefix)}
+        if not (_vrf_id(p) is None and _is_container(p)):
+            filters["vrf_id"] = _vrf_id(p) or "null"
+        # size, used and free all cover the same usable range
+        network, first, last = _usable_range(p)
+        used = {value for value in (int(ipaddress.ip_interface(str(ip.address)).ip)
+                                    for ip in await _list("ipam.ip_addresses", **filters)) if first <= value <= last}
+        size = last - first + 1
+        wanted = max(1, min(count, 100))
+        free = []
+        marked = bool(getattr(p, "mark_utilized", False))
+        # At most len(used) + wanted addresses are visited, however large the prefix is
+        address = type(network.network_address)
+        for value in range(first, last + 1) if not marked else ():
+            if value not in used:
+                free.append(f"{address(value)}/{network.prefixlen}")
+                if len(free) >= wanted:
+                    break
+        return _result({"prefix": str(p.prefix), "vrf": str(p.vrf) if getattr(p, "vrf", None) else "",
+                        "size": size, "used": len(used), "free": 0 if marked else max(0, size - len(used)),
+                        "mark_utilized": marked or None, "first_free": free})
+    except Exception as e:
+        logger.error(f"Error in find_free_ips: {e}")
+        return f"Error: {str(e)}"
+
+def _device_info(device):
+    return {
+        "name": device.name,
+        "device_type": str(device.device_type) if device.device_type else "",
+        "role": str(device.role) if device.role else "Unknown",
+        "site": str(device.site) if device.site else "",
+        "status": str(device.status) if device.status else "unknown"
+    }
+
+def _segment_info(prefix, ip_counts):
+    return {
+        "prefix": str(prefix.prefix),
+        "description": prefix.description or "",
+        "status": str(prefix.status) if prefix.status else "unknown",
+        "ip_count": ip_counts.get(prefix.id, 0)
+    }
+
+def _vlan_info(vlan):
+    return {
+        "vid": vlan.vid,
+        "name": vlan.name,
+        "description": vlan.description or ""
+    }
+
+def _topology_layers(all_devices):
+    layers = {layer: [] for layer in ("perimeter", "core", "distribution", "access", "security")}
+    for d in all_devices:
+        layers.get(layer_of(d["role"], d["name"]), []).append(d)
+    return layers
+
+def _segment_links(prefixes, ips):
+    """(prefix id, device id) pairs for IP addresses assigned to a device interface, by most specific prefix."""
+    index = PrefixIndex()
+    for prefix in prefixes:
+        if not _is_container(prefix):
+            index.add_prefix(prefix.id, prefix.prefix, vrf=_vrf_id(prefix))
+    links = set()
+    for ip in ips:
+        assigned = getattr(ip, "assigned_object", None)
+        device = getattr(assigned, "device", None) if assigned else None
+        if device is None:
+            continue
+        for key in index.longest_match(ip.address, _vrf_id(ip)):
+            links.add((key, device.id))
+    return links
+
+def _topology_graph(devices, cables, prefixes=(), links=()):
+    """Diagram graph: devices linked by their NetBox cables, segments linked to devices holding an address in them."""
+    graph = TopologyGraph()
+    for device in devices:
+        graph.add_device(dict(device))
+    for cable in cables:
+        graph.add_cable(dict(cable))
+    for prefix in prefixes:
+        graph.add_segment(dict(prefix))
+    for prefix_id, device_id in links:
+        if f"D{device_id}" in graph.nodes:
+            graph.add_edge(f"D{device_id}", f"P{prefix_id}", kind="address")
+    return graph
+
+def _topology_result(all_devices, network_segments, vlan_list, graph):
+    """Assemble the generate_topology document from device, segment and VLAN rows and the diagram graph."""
+    devices_by_role = {}
+    for device_info in all_devices:
+        devices_by_role.setdefault(device_info["role"], []).append(device_info)
+
+    # Build topology summary
+    result = {
+        "summary": {
+            "total_devices": len(all_devices),
+            "total_prefixes": len(network_segments),
+            "total_vlans": len(vlan_list),
+            "device_roles": list(devices_by_role.keys())
+        },
+        "devices_by_role": devices_by_role,
+        "network_segments": network_segments,
+        "vlans": vlan_list,
+        "topology_layers": _topology_layers(all_devices)
+    }
+    result["diagram"] = {"hash": graph.content_hash, "nodes": len(graph.nodes), "links": len(graph.edges)}
+    result["mermaid_diagram"] = diagrams.render(graph, "mermaid")
+    return result
+
+async def _topology_from(devices, prefixes, ips, vlans, cables):
+    all_devices = [_device_info(device) for device in devices]
+
+    # Network segments
+    ip_counts = await _prefix_ip_counts(prefixes, ips=ips)
+    network_segments = [_segment_info(prefix, ip_counts) for prefix in prefixes]
+
+    vlan_list = [_vlan_info(vlan) for vlan in vlans]
+    graph = _topology_graph(devices, cables, prefixes, _segment_links(prefixes, ips))
+    return _topology_result(all_devices, network_segments, vlan_list, graph)
+
+async def _build_topology():
+    # Fetch devices, prefixes, IP addresses (for ip_count), VLANs and cables concurrently
+    lists = await asyncio.gather(
+        _list("dcim.devices"), _list("ipam.prefixes"), _list("ipam.ip_addresses"), _list("ipam.vlans"),
+        _list("dcim.cables")
+    )
+    return await _topology_from(*lists)
+
+async def _snapshot_topology(objects):
+    return await _topology_from(*(list(objects[endpoint].values()) for endpoint in
+                                  ("dcim.devices", "ipam.prefixes", "ipam.ip_addresses", "ipam.vlans",
+                                   "dcim.cables")))
+
+snapshot = TopologySnapshot(nb, _snapshot_topology, full_refresh=TOPOLOGY_FULL_REFRESH,
+                            max_delta=TOPOLOGY_MAX_DELTA, listeners=[search_index])
+
+async def _stream_topology(stream):
+    """Send devices (and their layers by name), segments and VLANs page by page, then the summary and diagram.
+
+    No records or rows are kept between pages; only the diagram graph (one
+    small node per device and segment, one edge per cabled pair) and the
+    summary counts grow with the inventory.
+    """
+    graph = TopologyGraph()
+    roles, total_devices = {}, 0
+    async for count, records in _iter_pages("dcim.devices"):
+        rows = [_device_info(device) for device in records]
+        for device in records:
+            graph.add_device(dict(device))
+        for row in rows:
+            roles.setdefault(row["role"], None)
+        total_devices = count
+        await stream.send("devices", rows, count)
+        layers = {layer: [row["name"] for row in members] for layer, members in _topology_layers(rows).items()}
+        await stream.send("topology_layers", layers, count)
+
+    total_prefixes = 0
+    async for count, records in _iter_pages("ipam.prefixes"):
+        ip_counts = await _prefix_ip_counts(records, scoped=True)
+        for prefix in records:
+            graph.add_segment(dict(prefix))
+        total_prefixes = count
+        await stream.send("network_segments", [_segment_info(prefix, ip_counts) for prefix in records], count)
+
+    total_vlans = 0
+    async for count, records in _iter_pages("ipam.vlans"):
+        total_vlans = count
+        await stream.send("vlans", [_vlan_info(vlan) for vlan in records], count)
+
+    # IP addresses were only counted per page, so segments are not linked to devices here
+    async for count, records in _iter_pages("dcim.cables"):
+        for cable in records:
+            graph.add_cable(dict(cable))
+    await stream.send("topology", {
+        "summary": {"total_devices": total_devices, "total_prefixes": total_prefixes, "total_vlans": total_vlans,
+                    "device_roles": list(roles)},
+        "diagram": {"hash": graph.content_hash, "nodes": len(graph.nodes), "links": len(graph.edges)},
+        "mermaid_diagram": diagrams.render(graph, "mermaid"),
+    })
+
 @mcp.tool()
-def generate_topology() -> str:
+@_instrumented
+@_coalesced
+async def generate_topology(stream: bool = False, ctx: Context = None) -> str:
     """Generate comprehensive network topology data for documentation and diagram generation.
-    Returns devices grouped by role, network segments, and interconnection summary."""
+    Returns devices grouped by role, network segments, and interconnection summary.
+    stream=true sends devices, segments and VLANs page by page as NetBox returns them."""
     logger.info("generate_topology called")
     try:
-        # Fetch all devices
-        devices = nb.dcim.devices.all()
-        devices_by_role = {}
-        all_devices = []
-        
-        for device in devices:
-            role_name = str(device.role) if device.role else "Unknown"
-            if role_name not in devices_by_role:
-                devices_by_role[role_name] = []
-            
-            device_info = {
-                "name": device.name,
-                "device_type": str(device.device_type) if device.device_type else "",
-                "role": role_name,
-                "site": str(device.site) if device.site else "",
-                "status": str(device.status) if device.status else "unknown"
-            }
-            devices_by_role[role_name].append(device_info)
-            all_devices.append(device_info)
-        
-        # Fetch all prefixes for network segments
-        prefixes = nb.ipam.prefixes.all()
-        network_segments = []
-        for prefix in prefixes:
-            try:
-                ip_count = nb.ipam.ip_addresses.count(parent=str(prefix.prefix))
-            except:
-                ip_count = 0
-            network_segments.append({
-                "prefix": str(prefix.prefix),
-                "description": prefix.description or "",
-                "status": str(prefix.status) if prefix.status else "unknown",
-                "ip_count": ip_count
-            })
-        
-        # Fetch VLANs
-        vlans = nb.ipam.vlans.all()
-        vlan_list = []
-        for vlan in vlans:
-            vlan_list.append({
-                "vid": vlan.vid,
-                "name": vlan.name,
-                "description": vlan.description or ""
-            })
-        
-        # Build topology summary
-        result = {
-            "summary": {
-                "total_devices": len(all_devices),
-                "total_prefixes": len(network_segments),
-                "total_vlans": len(vlan_list),
-                "device_roles": list(devices_by_role.keys())
-            },
-            "devices_by_role": devices_by_role,
-            "network_segments": network_segments,
-            "vlans": vlan_list,
-            "topology_layers": {
-                "perimeter": [d for d in all_devices if "firewall" in d["role"].lower() and "perimeter" in d["name"].lower()],
-                "core": [d for d in all_devices if "router" in d["role"].lower() or "core" in d["role"].lower()],
-                "distribution": [d for d in all_devices if "distribution" in d["role"].lower()],
-                "access": [d for d in all_devices if "access" in d["role"].lower()],
-                "security": [d for d in all_devices if "firewall" in d["role"].lower() and "internal" in d["name"].lower()]
-            }
-        }
-        
-        # Generate Professional Mermaid diagram (clean syntax)
-        mermaid_lines = [
-            "```mermaid",
-            "graph TB",
-            "    %% Styling",
-            "    classDef internet fill:#e1f5fe,stroke:#01579b,stroke-width:2px",
-            "    classDef firewall fill:#ffebee,stroke:#c62828,stroke-width:2px",
-            "    classDef router fill:#fff3e0,stroke:#ef6c00,stroke-width:2px",
-            "    classDef switch fill:#e8f5e9,stroke:#2e7d32,stroke-width:2px",
-            "    classDef network fill:#f3e5f5,stroke:#7b1fa2,stroke-width:2px",
-            "",
-            "    %% Internet Cloud",
-            '    INET(("Internet"))',
-            ""
-        ]
-        
-        # Perimeter layer
-        perimeter = result["topology_layers"]["perimeter"]
-        if perimeter:
-            mermaid_lines.append('    subgraph Perimeter["Perimeter Zone"]')
-            mermaid_lines.append('        direction TB')
-            for i, d in enumerate(perimeter):
-                dt = d["device_type"].split()[-1] if d["device_type"] else ""
-                mermaid_lines.append(f'        FW{i+1}[["{d["name"]}<br/>{dt}"]]')
-            mermaid_lines.append('    end')
-            mermaid_lines.append('    INET --> FW1')
-        
-        # Core layer
-        core = result["topology_layers"]["core"]
-        if core:
-            mermaid_lines.append('')
-            mermaid_lines.append('    subgraph Core["Core Layer"]')
-            mermaid_lines.append('        direction LR')
-            for i, d in enumerate(core):
-                dt = d["device_type"].split()[-1] if d["device_type"] else ""
-                mermaid_lines.append(f'        CR{i+1}[("{d["name"]}<br/>{dt}")]')
-            mermaid_lines.append('    end')
-        
-        # Distribution layer
-        dist = result["topology_layers"]["distribution"]
-        if dist:
-            mermaid_lines.append('')
-            mermaid_lines.append('    subgraph Distribution["Distribution Layer"]')
-            mermaid_lines.append('        direction LR')
-            for i, d in enumerate(dist):
-                dt = d["device_type"].split()[-1] if d["device_type"] else ""
-                mermaid_lines.append(f'        DS{i+1}[["{d["name"]}<br/>{dt}"]]')
-            mermaid_lines.append('    end')
-        
-        # Internal Security
-        security = result["topology_layers"]["security"]
-        if security:
-            mermaid_lines.append('')
-            mermaid_lines.append('    subgraph InternalSec["Internal Security"]')
-            for i, d in enumerate(security):
-                dt = d["device_type"].split()[-1] if d["device_type"] else ""
-                mermaid_lines.append(f'        SEC{i+1}[["{d["name"]}<br/>{dt}"]]')
-            mermaid_lines.append('    end')
-        
-        # Access layer
-        access = result["topology_layers"]["access"]
-        if access:
-            mermaid_lines.append('')
-            mermaid_lines.append('    subgraph Access["Access Layer"]')
-            mermaid_lines.append('        direction LR')
-            for i, d in enumerate(access):
-                dt = d["device_type"].split()[-1] if d["device_type"] else ""
-                mermaid_lines.append(f'        AS{i+1}["{d["name"]}<br/>{dt}"]')
-            mermaid_lines.append('    end')
-        
-        # Network Segments
-        segments = result["network_segments"]
-        if segments:
-            mermaid_lines.append('')
-            mermaid_lines.append('    subgraph Networks["Network Segments"]')
-            mermaid_lines.append('        direction LR')
-            for i, seg in enumerate(segments):
-                desc = seg["description"] or f"Segment {i+1}"
-                mermaid_lines.append(f'        NET{i+1}["{seg["prefix"]}<br/>{desc}"]')
-            mermaid_lines.append('    end')
-        
-        # Connections (clean syntax without pipe issues)
-        mermaid_lines.append('')
-        mermaid_lines.append('    %% Connections')
-        
-        if perimeter and core:
-            for i in range(len(core)):
-                mermaid_lines.append(f'    FW1 -- trunk --> CR{i+1}')
-        
-        if len(core) > 1:
-            mermaid_lines.append('    CR1 <-- iBGP --> CR2')
-        
-        if core and dist:
-            mermaid_lines.append('    CR1 -- L3 --> DS1')
-            if len(core) > 1 and len(dist) > 1:
-                mermaid_lines.append('    CR2 -- L3 --> DS2')
-        
-        if len(dist) > 1:
-            mermaid_lines.append('    DS1 <-- vPC --> DS2')
-        
-        if dist and security:
-            mermaid_lines.append('    DS1 --> SEC1')
-            mermaid_lines.append('    DS2 --> SEC1')
-        
-        if security and access:
-            for i in range(len(access)):
-                mermaid_lines.append(f'    SEC1 --> AS{i+1}')
-        elif dist and access:
-            for i in range(len(access)):
-                mermaid_lines.append(f'    DS1 --> AS{i+1}')
-                if len(dist) > 1:
-                    mermaid_lines.append(f'    DS2 --> AS{i+1}')
-        
-        if access and segments:
-            for i in range(len(segments)):
-                as_idx = i % len(access) + 1
-                mermaid_lines.append(f'    AS{as_idx} -.-> NET{i+1}')
-        
-        # Apply styles
-        mermaid_lines.append('')
-        mermaid_lines.append('    %% Apply Styles')
-        mermaid_lines.append('    class INET internet')
-        if perimeter:
-            mermaid_lines.append('    class FW1 firewall')
-        if security:
-            mermaid_lines.append('    class SEC1 firewall')
-        if core:
-            mermaid_lines.append('    class ' + ','.join([f'CR{i+1}' for i in range(len(core))]) + ' router')
-        if dist:
-            mermaid_lines.append('    class ' + ','.join([f'DS{i+1}' for i in range(len(dist))]) + ' switch')
-        if access:
-            mermaid_lines.append('    class ' + ','.join([f'AS{i+1}' for i in range(len(access))]) + ' switch')
-        if segments:
-            mermaid_lines.append('    class ' + ','.join([f'NET{i+1}' for i in range(len(segments))]) + ' network')
-        
-        mermaid_lines.append("```")
-        
-        result["mermaid_diagram"] = "\n".join(mermaid_lines)
-        
-        logger.info(f"Generated topology with {len(all_devices)} devices")
-        return json.dumps(result, indent=2)
+        if stream:
+            page_stream = PageStream(ctx)
+            await _stream_topology(page_stream)
+            logger.info(f"Streamed topology in {page_stream.pages} pages")
+            return page_stream.result()
+
+        result = await (snapshot.sync() if TOPOLOGY_SNAPSHOT else _build_topology())
+        logger.info(f"Generated topology with {result['summary']['total_devices']} devices")
+        return _result(result)
     except Exception as e:
         logger.error(f"Error in generate_topology: {e}")
         return f"Error: {str(e)}"
 
+# (snapshot version, graph): the graph is rebuilt only when the snapshot changed
+snapshot_graph = (None, None)
+
+async def _current_graph():
+    """Topology graph from the snapshot when it is enabled, otherwise from (cached) NetBox listings."""
+    global snapshot_graph
+    if TOPOLOGY_SNAPSHOT:
+        await snapshot.sync()
+        if snapshot_graph[0] == snapshot.version:
+            return snapshot_graph[1]
+        version = snapshot.version
+        objects = {endpoint: list(records.values()) for endpoint, records in snapshot.objects.items()}
+    else:
+        lists = await asyncio.gather(*(_list(endpoint) for endpoint in
+                                       ("dcim.devices", "dcim.cables", "ipam.prefixes", "ipam.ip_addresses")))
+        objects = dict(zip(("dcim.devices", "dcim.cables", "ipam.prefixes", "ipam.ip_addresses"), lists))
+    prefixes = objects["ipam.prefixes"]
+    graph = _topology_graph(objects["dcim.devices"], objects["dcim.cables"], prefixes,
+                            _segment_links(prefixes, objects["ipam.ip_addresses"]))
+    if TOPOLOGY_SNAPSHOT:
+        snapshot_graph = (version, graph)
+    return graph
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def render_topology(format: str = "mermaid", site: str = "", segments: bool = True) -> str:
+    """Render the network topology diagram from NetBox devices and cables.
+    format: mermaid, dot (Graphviz) or json (nodes with adjacency lists).
+    site limits the diagram to one site plus the devices cabled to it; segments=false leaves prefixes out."""
+    logger.info(f"render_topology called with format={format}, site={site}")
+    try:
+        if format not in RENDERERS:
+            return f"Error: format must be one of {', '.join(RENDERERS)}"
+        if site:
+            record = await _lookup("dcim.sites", site)
+            if record is None:
+                return f"Error: Site {site} not found"
+            site = str(record.name)
+        graph = await _current_graph()
+        if site or not segments:
+            graph = graph.subgraph(site, segments=segments)
+            if site and not graph.nodes:
+                return f"Error: No devices found at site {site}"
+        return diagrams.render(graph, format)
+    except Exception as e:
+        logger.error(f"Error in render_topology: {e}")
+        return f"Error: {str(e)}"
+
+def _graph_device(graph, name):
+    """(node id, None) for the device called `name`, or (None, error message)."""
+    ids = graph.find(name)
+    if len(ids) == 1:
+        return ids[0], None
+    if not ids:
+        return None, f"Error: Device {name} not found"
+    sites = ", ".join(sorted(graph.nodes[node_id]["site"] or "-" for node_id in ids))
+    return None, f"Error: {len(ids)} devices are named {name} (sites: {sites})"
+
+def _graph_row(graph, node_id, **extra):
+    node = graph.nodes[node_id]
+    return dict({"name": node["label"], "site": node["site"], "layer": node["layer"]}, **extra)
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def find_path(source: str, target: str) -> str:
+    """Shortest cable path between two devices (fewest hops), with the interfaces used on each hop.
+    Only connected cables count; the path is computed from the cached cable graph."""
+    logger.info(f"find_path called with source={source}, target={target}")
+    try:
+        graph = await _current_graph()
+        start, error = _graph_device(graph, source)
+        end, error = (None, error) if error else _graph_device(graph, target)
+        if error:
+            return error
+        path = graph.shortest_path(start, end)
+        if path is None:
+            return _result({"source": source, "target": target, "reachable": False})
+        return _result({"source": source, "target": target, "reachable": True, "hops": len(path) - 1,
+                        "path": [_graph_row(graph, node_id, via=ports) for node_id, ports in path]})
+    except Exception as e:
+        logger.error(f"Error in find_path: {e}")
+        return f"Error: {str(e)}"
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def get_neighbors(device: str, hops: int = 1) -> str:
+    """Devices reachable from a device within `hops` cables (1-10), each with its distance and the hop before it."""
+    logger.info(f"get_neighbors called with device={device}, hops={hops}")
+    try:
+        hops = max(1, min(hops, MAX_GRAPH_HOPS))
+        graph = await _current_graph()
+        node_id, error = _graph_device(graph, device)
+        if error:
+            return error
+        rows = [_graph_row(graph, neighbour, hops=distance, from_device=graph.nodes[parent]["label"], via=ports)
+                for neighbour, distance, parent, ports in graph.within(node_id, hops)]
+        return _result({"device": device, "hops": hops, "count": len(rows), "neighbors": rows})
+    except Exception as e:
+        logger.error(f"Error in get_neighbors: {e}")
+        return f"Error: {str(e)}"
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def failure_impact(device: str) -> str:
+    """Blast radius of a device failure: devices that lose their cable path to every circuit,
+    perimeter firewall and core router, and network segments left without a reachable device."""
+    logger.info(f"failure_impact called with device={device}")
+    try:
+        graph = await _current_graph()
+        node_id, error = _graph_device(graph, device)
+        if error:
+            return error
+        isolated, segments, basis = graph.failure_impact(node_id)
+        return _result({
+            "device": device,
+            "basis": basis,
+            "isolated_count": len(isolated),
+            "isolated": [_graph_row(graph, n) for n in isolated],
+            "affected_segments": [graph.nodes[n]["label"] for n in segments],
+        })
+    except Exception as e:
+        logger.error(f"Error in failure_impact: {e}")
+        return f"Error: {str(e)}"
+
+# Without the snapshot: (source lists, index), rebuilt when the cache hands out new lists
+search_source = (None, None)
+
+async def _search_ready():
+    """The search index, brought up to date from the snapshot (or from cached listings without one)."""
+    global search_source
+    if TOPOLOGY_SNAPSHOT:
+        await snapshot.sync(max_age=SEARCH_MAX_STALENESS)
+        return search_index
+    lists = await asyncio.gather(*(_list(endpoint) for endpoint in KINDS))
+    previous, index = search_source
+    if previous is None or any(old is not new for old, new in zip(previous, lists)):
+        index = SearchIndex()
+        index.reset({endpoint: {record.id: record for record in records} for endpoint, records in zip(KINDS, lists)})
+        search_source = (lists, index)
+    return index
+
+async def _warm_search():
+    try:
+        started = time.perf_counter()
+        index = await _search_ready()
+        logger.info(f"Search index ready: {len(index)} objects in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.warning(f"Search index warm-up failed, it is built on the first search: {e}")
+
+@mcp.tool()
+@_instrumented
+@_coalesced
+async def search(query: str, kind: str = "", limit: int = 10) -> str:
+    """Fuzzy search for devices, IP addresses, prefixes and VLANs by name, role, site, description or VLAN ID.
+    Accepts partial or misspelled names ("core router 1"), an address without mask ("10.0.0.1")
+    or a CIDR ("10.0.0.0/16": that prefix, the prefixes containing it and objects inside it).
+    kind narrows the results: device, ip_address, prefix or vlan (comma separated). Best matches first."""
+    logger.info(f"search called with query={query}, kind={kind}")
+    try:
+        kinds = {k.strip().lower() for k in kind.split(",") if k.strip()}
+        if kinds - set(KINDS.values()):
+            return f"Error: kind must be one of {', '.join(KINDS.values())}"
+        index = await _search_ready()
+        matches = index.search(query, kinds, max(1, min(limit, MAX_SEARCH_RESULTS)))
+        return _result({"query": query, "results": [
+            {"kind": doc["kind"], "name": doc["name"], "site": doc["site"], "detail": doc["detail"],
+             "score": round(score, 2)} for score, doc in matches]})
+    except Exception as e:
+        logger.error(f"Error in search: {e}")
+        return f"Error: {str(e)}"
+
+# Clients subscribe to this resource and get notifications/resources/updated when
+# a webhook reports a NetBox change, so they can drop memoized tool results.
+INVENTORY_URI = "netbox://inventory"
+inventory_version = 0
+subscribers = set()
+
+@mcp.resource(INVENTORY_URI)
+async def inventory() -> str:
+    """Version counter of the NetBox inventory, bumped on every webhook change."""
+    return json.dumps({"version": inventory_version})
+
+# FastMCP has no decorator for resources/subscribe, register on the low-level server
+@mcp._mcp_server.subscribe_resource()
+async def subscribe(uri):
+    subscribers.add(mcp._mcp_server.request_context.session)
+
+@mcp._mcp_server.unsubscribe_resource()
+async def unsubscribe(uri):
+    subscribers.discard(mcp._mcp_server.request_context.session)
+
+async def _notify_inventory_changed():
+    global inventory_version
+    inventory_version += 1
+    for session in list(subscribers):
+        try:
+            await session.send_resource_updated(INVENTORY_URI)
+        except Exception:
+            # Session is gone
+            subscribers.discard(session)
+
+@mcp.custom_route("/webhook", methods=["POST"])
+async def netbox_webhook(request: Request):
+    """Receive NetBox webhook events and drop the cache entries they make stale."""
+    body = await request.body()
+    if WEBHOOK_SECRET:
+        expected = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha512).hexdigest()
+        if not hmac.compare_digest(expected, request.headers.get("X-Hook-Signature", "")):
+            logger.warning("Rejected webhook with invalid signature")
+            return JSONResponse({"error": "invalid signature"}, status_code=403)
+    try:
+        event = json.loads(body)
+    except ValueError:
+        return JSONResponse({"error": "invalid JSON"}, status_code=400)
+    model = event.get("model", "")
+    dropped = cache.invalidate_model(model)
+    if TOPOLOGY_SNAPSHOT:
+        snapshot.mark_stale()
+    # Calls started before the change must not hand their results to new callers; their
+    # NetBox reads still finish, but the cache drops them (see InventoryCache.generation)
+    tool_flight.forget()
+    fetch_flight.forget()
+    await _notify_inventory_changed()
+    logger.info(f"Webhook {event.get('event')} for {model}: dropped {dropped} cache entries, "
+                f"notified {len(subscribers)} subscribers")
+    return JSONResponse({"model": model, "invalidated": dropped})
+
+@mcp.custom_route("/cache/stats", methods=["GET"])
+async def cache_stats(request: Request):
+    """Expose cache hit/miss counters for sizing."""
+    stats = cache.stats()
+    stats["single_flight"] = {"tools": tool_flight.stats(), "netbox": fetch_flight.stats()}
+    stats["diagrams"] = diagrams.stats()
+    if TOPOLOGY_SNAPSHOT:
+        stats["topology_snapshot"] = snapshot.stats()
+    return JSONResponse(stats)
+
+def _collect_state():
+    """Cache, single-flight and snapshot counters, read at scrape time."""
+    stats = cache.stats()
+    yield "netbox_mcp_cache_hits_total", "counter", "Inventory cache hits", [({}, stats["hits"])]
+    yield "netbox_mcp_cache_misses_total", "counter", "Inventory cache misses", [({}, stats["misses"])]
+    yield "netbox_mcp_cache_entries", "gauge", "Inventory cache entries", [({}, stats["entries"])]
+    flights = {"tools": tool_flight.stats(), "netbox": fetch_flight.stats()}
+    yield ("netbox_mcp_single_flight_calls_total", "counter", "Calls that ran (not coalesced)",
+           [({"kind": kind}, s["calls"]) for kind, s in flights.items()])
+    yield ("netbox_mcp_single_flight_shared_total", "counter", "Calls that shared an in-flight run",
+           [({"kind": kind}, s["shared"]) for kind, s in flights.items()])
+    rendered = diagrams.stats()
+    yield ("netbox_mcp_diagram_renders_total", "counter", "Diagram requests by render cache result",
+           [({"result": "hit"}, rendered["hits"]), ({"result": "miss"}, rendered["misses"])])
+    if TOPOLOGY_SNAPSHOT:
+        snap = snapshot.stats()
+        yield ("netbox_mcp_topology_rebuilds_total", "counter", "Full topology snapshot rebuilds",
+               [({}, snap["full_rebuilds"])])
+        yield ("netbox_mcp_topology_changes_applied_total", "counter", "Change-log entries applied to the snapshot",
+               [({}, snap["changes_applied"])])
+
+metrics.collectors.append(_collect_state)
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request):
+    """Prometheus/OpenMetrics text exposition of the tool, NetBox and cache metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     # Run with SSE transport on port 8000, bind to all interfaces
-    mcp.settings.host = "0.0.0.0"
-    mcp.settings.port = 8000
+    mcp.settings.host = os.getenv("MCP_HOST", "0.0.0.0")
+    mcp.settings.port = int(os.getenv("MCP_PORT", "8000"))
     mcp.run(transport="sse")
@@ -0,0 +1,77 @@
+import asyncio
+import functools
+import inspect
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one.
+
+    While a call for a key is in flight, later callers with the same key await
+    its result instead of starting their own; errors reach every waiter.
+    Nothing is kept once the call finishes (InventoryCache does that). The
+    call runs as its own task, so a caller that gives up does not cancel it
+    for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """Return the result of `await fn()`, shared with concurrent callers of the same key."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+            self.calls += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved here so a failure nobody awaited any more is not logged as unhandled
+            task.exception()
+
+    def forget(self):
+        """Make later callers start fresh calls (e.g. after NetBox changed); current waiters are unaffected."""
+        self._calls.clear()
+
+    def wrap(self, fn, exclude=("ctx",), bypass=None):
+        """Decorate an async function so concurrent calls with equal arguments share one run.
+
+        Parameters named in `exclude` are left out of the key; calls for which
+        `bypass(arguments)` is true always run on their own.
+        """
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {k: v for k, v in bound.arguments.items() if k not in exclude}
+            if bypass and bypass(arguments):
+                return await fn(*args, **kwargs)
+            return await self.do((fn.__name__, _freeze(arguments)), lambda: fn(*args, **kwargs))
+        return wrapper
+
+    def stats(self):
+        total = self.calls + self.shared
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+            "shared_ratio": round(self.shared / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+
+from netbox_client import NetBoxError
+
+logger = logging.getLogger(__name__)
+
+# Change-log object types mirrored by the snapshot, mapped to the endpoint they are read from.
+TRACKED_TYPES = {
+    "dcim.device": "dcim.devices",
+    "ipam.prefix": "ipam.prefixes",
+    "ipam.ipaddress": "ipam.ip_addresses",
+    "ipam.vlan": "ipam.vlans",
+    "dcim.cable": "dcim.cables",
+}
+# Objects referenced by name from the tracked ones (a renamed site or role changes every
+# row that shows it); a change to one of these triggers a full rebuild.
+REBUILD_TYPES = {"dcim.site", "dcim.devicerole", "dcim.devicetype", "dcim.manufacturer", "ipam.vrf"}
+# Interfaces are not mirrored, but cables and IP addresses show them by name; a change to
+# one re-fetches the cables ending on it and the addresses assigned to it.
+INTERFACE_TYPE = "dcim.interface"
+# NetBox 4.1 moved the change log from extras to core.
+CHANGELOG_ENDPOINTS = ("core.object_changes", "extras.object_changes")
+ID_CHUNK_SIZE = 100
+
+
+class TopologySnapshot:
+    """Materialized copy of the NetBox objects generate_topology reads, kept current from the change log.
+
+    The first sync reads every tracked endpoint and remembers the newest
+    change-log id. Later syncs read only the change-log entries after that id,
+    re-fetch the created/updated objects by id, drop deleted ones and rebuild
+    the result from memory. `build` is an async callable turning
+    {endpoint: {id: record}} into the topology document. `listeners` get
+    reset(objects) after a full rebuild and update(endpoint, id, record or
+    None) for each object a delta re-fetched or deleted.
+    """
+
+    def __init__(self, nb, build, full_refresh=3600.0, max_delta=500, listeners=()):
+        self.nb = nb
+        self.build = build
+        self.listeners = list(listeners)
+        self.full_refresh = full_refresh
+        self.max_delta = max_delta
+        self.objects = {endpoint: {} for endpoint in TRACKED_TYPES.values()}
+        self.result = None
+        # Bumped whenever result is rebuilt, so derived data can be cached per version
+        self.version = 0
+        self.last_change_id = None
+        self.built_at = 0.0
+        self.synced_at = 0.0
+        self.full_rebuilds = 0
+        self.delta_syncs = 0
+        self.changes_applied = 0
+        self._changelog = None
+        self._lock = asyncio.Lock()
+
+    async def _changes(self, limit, **filters):
+        """Read the change log, using whichever of core/extras this NetBox serves."""
+        for endpoint in ((self._changelog,) if self._changelog else CHANGELOG_ENDPOINTS):
+            try:
+                page = await self.nb.page(endpoint, limit, 0, **filters)
+            except NetBoxError as e:
+                if e.status_code == 404 and endpoint != CHANGELOG_ENDPOINTS[-1]:
+                    continue
+                raise
+            self._changelog = endpoint
+            return page
+
+    async def _latest_change_id(self):
+        try:
+            _, records = await self._changes(1, ordering="-id")
+        except Exception as e:
+            logger.warning(f"Change log unavailable, topology will be rebuilt on every call: {e}")
+            return None
+        return records[0].id if records else 0
+
+    async def rebuild(self):
+        # Take the change-log mark first so changes made during the scan are replayed next sync.
+        mark = await self._latest_change_id()
+        endpoints = list(self.objects)
+        lists = await asyncio.gather(*(self.nb.list(endpoint) for endpoint in endpoints))
+        self.objects = {endpoint: {record.id: record for record in records}
+                        for endpoint, records in zip(endpoints, lists)}
+        for listener in self.listeners:
+            listener.reset(self.objects)
+        self.result = await self.build(self.objects)
+        self.version += 1
+        self.last_change_id = mark
+        self.built_at = time.monotonic()
+        self.full_rebuilds += 1
+        logger.info(f"Topology snapshot rebuilt at change {mark}: "
+                    + ", ".join(f"{len(v)} {k}" for k, v in self.objects.items()))
+
+    def _interface_dependents(self, interface_ids):
+        """{endpoint: ids} of the mirrored cables ending on and IP addresses assigned to these interfaces."""
+        found = {"dcim.cables": set(), "ipam.ip_addresses": set()}
+        if not interface_ids:
+            return found
+        for cable_id, cable in self.objects["dcim.cables"].items():
+            data = dict(cable)
+            for termination in (data.get("a_terminations") or []) + (data.get("b_terminations") or []):
+                if termination.get("object_type") == INTERFACE_TYPE and termination.get("object_id") in interface_ids:
+                    found["dcim.cables"].add(cable_id)
+        for ip_id, ip in self.objects["ipam.ip_addresses"].items():
+            data = dict(ip)
+            if data.get("assigned_object_type") == INTERFACE_TYPE and data.get("assigned_object_id") in interface_ids:
+                found["ipam.ip_addresses"].add(ip_id)
+        return found
+
+    async def _apply_delta(self):
+        """Apply change-log entries after last_change_id; returns False when a full rebuild is needed."""
+        count, changes = await self._changes(self.max_delta, id__gt=self.last_change_id, ordering="id")
+        if count > len(changes):
+            logger.info(f"{count} changes since {self.last_change_id}, rebuilding topology snapshot")
+            return False
+        refetch = {endpoint: set() for endpoint in self.objects}
+        interfaces = set()
+        deleted = 0
+        for change in changes:
+            object_type = str(change.changed_object_type)
+            if object_type in REBUILD_TYPES:
+                logger.info(f"{object_type} changed, rebuilding topology snapshot")
+                return False
+            if object_type == INTERFACE_TYPE:
+                interfaces.add(change.changed_object_id)
+                continue
+            endpoint = TRACKED_TYPES.get(object_type)
+            if endpoint is None:
+                continue
+            object_id = change.changed_object_id
+            action = change.action
+            if str(getattr(action, "value", action)) == "delete":
+                refetch[endpoint].discard(object_id)
+                if self.objects[endpoint].pop(object_id, None) is not None:
+                    deleted += 1
+                    for listener in self.listeners:
+                        listener.update(endpoint, object_id, None)
+            else:
+                refetch[endpoint].add(object_id)
+        for endpoint, ids in self._interface_dependents(interfaces).items():
+            refetch[endpoint].update(ids)
+
+        for endpoint, ids in refetch.items():
+            ids = sorted(ids)
+            chunks = await asyncio.gather(*(self.nb.list(endpoint, id=ids[i:i + ID_CHUNK_SIZE])
+                                            for i in range(0, len(ids), ID_CHUNK_SIZE)))
+            fetched = {record.id: record for chunk in chunks for record in chunk}
+            for object_id in ids:
+                # None: created and deleted again after this change entry was written
+                record = fetched.get(object_id)
+                if record is not None:
+                    self.objects[endpoint][object_id] = record
+                else:
+                    self.objects[endpoint].pop(object_id, None)
+                for listener in self.listeners:
+                    listener.update(endpoint, object_id, record)
+
+        if changes:
+            self.last_change_id = changes[-1].id
+            if deleted or any(refetch.values()):
+                self.result = await self.build(self.objects)
+                self.version += 1
+                self.changes_applied += len(changes)
+                logger.info(f"Applied {len(changes)} changes to topology snapshot "
+                            f"(up to change {self.last_change_id})")
+        self.delta_syncs += 1
+        return True
+
+    async def sync(self, max_age=0.0):
+        """Bring the snapshot up to date and return the topology document.
+
+        With max_age, a snapshot checked against the change log less than
+        max_age seconds ago is returned without asking NetBox.
+        """
+        async with self._lock:
+            if self.result is not None and time.monotonic() - self.synced_at < max_age:
+                return self.result
+            self.synced_at = time.monotonic()
+            if (self.result is None or self.last_change_id is None
+                    or time.monotonic() - self.built_at > self.full_refresh):
+                await self.rebuild()
+                return self.result
+            try:
+                current = await self._apply_delta()
+            except Exception as e:
+                logger.warning(f"Change log sync failed, rebuilding topology snapshot: {e}")
+                current = False
+            if not current:
+                await self.rebuild()
+            return self.result
+
+    def mark_stale(self):
+        """Make the next sync read the change log even within max_age (e.g. after a webhook)."""
+        self.synced_at = 0.0
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "last_change_id": self.last_change_id,
+            "changelog": self._changelog,
+            "age_seconds": round(now - self.built_at, 1) if self.result is not None else None,
+            "full_rebuilds": self.full_rebuilds,
+            "delta_syncs": self.delta_syncs,
+            "changes_applied": self.changes_applied,
+            "objects": {endpoint: len(objects) for endpoint, objects in self.objects.items()},
+        }
@@ -1,162 +1,57 @@
-import pynetbox
+import argparse
+import ipaddress
+import json
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Configuration
-NETBOX_URL = "http://localhost:38080"
-NETBOX_TOKEN = "Hx13DhdCMyuITkNKXFpT6MhaSFJLFJtRg4M7AmQ0"
-
-nb = pynetbox.api(NETBOX_URL, token=NETBOX_TOKEN)
-
-def create_if_not_exists(endpoint, **kwargs):
-    try:
-        # Check if exists
-        search_kwargs = {k: v for k, v in kwargs.items() if k in ['name', 'slug', 'model']}
-        if 'slug' not in search_kwargs and 'name' in kwargs:
-             search_kwargs['slug'] = kwargs['name'].lower().replace(' ', '-')
-        
-        existing = endpoint.get(**search_kwargs)
-        if existing:
-            print(f"Skipping {kwargs.get('name', 'item')}: Already exists")
-            return existing
-        
-        # Create
-        created = endpoint.create(kwargs)
-        print(f"Created {kwargs.get('name', 'item')}: {created}")
-        return created
-    except Exception as e:
-        print(f"Error creating {kwargs.get('name', 'item')}: {e}")
-        return None
-
-def main():
-    print("Starting NetBox population...")
+import pynetbox
 
-    # 1. Site
-    site = create_if_not_exists(nb.dcim.sites, name="Data Center A", slug="dc-a", status="active")
-
-    # 2. Manufacturer
-    cisco = create_if_not_exists(nb.dcim.manufacturers, name="Cisco", slug="cisco")
-    juniper = create_if_not_exists(nb.dcim.manufacturers, name="Juniper", slug="juniper")
-
-    # 3. Device Types
-    if cisco:
-        create_if_not_exists(nb.dcim.device_types, manufacturer=cisco.id, model="CSR1000v", slug="csr1000v", u_height=1)
-        create_if_not_exists(nb.dcim.device_types, manufacturer=cisco.id, model="Catalyst 9300", slug="catalyst-9300", u_height=1)
-        create_if_not_exists(nb.dcim.device_types, manufacturer=cisco.id, model="ASA 5506-X", slug="asa-5506-x", u_height=1)
-    if juniper:
-        create_if_not_exists(nb.dcim.device_types, manufacturer=juniper.id, model="vSRX", slug="vsrx", u_height=1)
-        create_if_not_exists(nb.dcim.device_types, manufacturer=juniper.id, model="EX4300", slug="ex4300", u_height=1)
-
-    # 4. Device Roles
-    role_core = create_if_not_exists(nb.dcim.device_roles, name="Core Router", slug="core-router", color="ff0000")
-    role_access = create_if_not_exists(nb.dcim.device_roles, name="Access Switch", slug="access-switch", color="00ff00")
-    role_firewall = create_if_not_exists(nb.dcim.device_roles, name="Firewall", slug="firewall", color="ff9900")
-    role_dist = create_if_not_exists(nb.dcim.device_roles, name="Distribution Switch", slug="distribution-switch", color="0066ff")
-
-    # 5. Devices
-    # Fetch device types and roles
-    dt_csr = nb.dcim.device_types.get(slug="csr1000v")
-    dt_catalyst = nb.dcim.device_types.get(slug="catalyst-9300")
-    dt_asa = nb.dcim.device_types.get(slug="asa-5506-x")
-    dt_vsrx = nb.dcim.device_types.get(slug="vsrx")
-    dt_ex4300 = nb.dcim.device_types.get(slug="ex4300")
-    
-    role_core = nb.dcim.device_roles.get(slug="core-router")
-    role_access = nb.dcim.device_roles.get(slug="access-switch")
-    role_firewall = nb.dcim.device_roles.get(slug="firewall")
-    role_dist = nb.dcim.device_roles.get(slug="distribution-switch")
-    site_dc_a = nb.dcim.sites.get(slug="dc-a")
-
-    # Core Routers
-    if dt_csr and role_core and site_dc_a:
-        create_if_not_exists(nb.dcim.devices, 
-                             name="core-rtr-01", 
-                             device_type=dt_csr.id, 
-                             role=role_core.id, 
-                             site=site_dc_a.id,
-                             status="active")
-        create_if_not_exists(nb.dcim.devices, 
-                             name="core-rtr-02", 
-                             device_type=dt_csr.id, 
-                             role=role_core.id, 
-                             site=site_dc_a.id,
-                             status="active")
-
-    # Distribution Switches
-    if dt_catalyst and role_dist and site_dc_a:
-        create_if_not_exists(nb.dcim.devices, 
-                             name="dist-sw-01", 
-                             device_type=dt_catalyst.id, 
-                             role=role_dist.id, 
-                             site=site_dc_a.id,
-                             status="active")
-        create_if_not_exists(nb.dcim.devices, 
-                             name="dist-sw-02", 
-                             device_type=dt_catalyst.id, 
-                             role=role_dist.id, 
-                             site=site_dc_a.id,
-                             status="active")
-
-    # Access Switches
-    if dt_ex4300 and role_access and site_dc_a:
-        create_if_not_exists(nb.dcim.devices, 
-                             name="access-sw-01", 
-                             device_type=dt_ex4300.id, 
-                             role=role_access.id, 
-                             site=site_dc_a.id,
-                             status="active")
-        create_if_not_exists(nb.dcim.devices, 
-                             name="access-sw-02", 
-                             device_type=dt_ex4300.id, 
-                             role=role_access.id, 
-                             site=site_dc_a.id,
-                             status="active")
-        create_if_not_exists(nb.dcim.devices, 
-                             name="access-sw-03", 
-                             device_type=dt_ex4300.id, 
-                             role=role_access.id, 
-                             site=site_dc_a.id,
-                             status="active")
-
-    # Firewalls
-    if dt_asa and role_firewall and site_dc_a:
-        create_if_not_exists(nb.dcim.devices, 
-                             name="fw-perimeter-01", 
-                             device_type=dt_asa.id, 
-                             role=role_firewall.id, 
-                             site=site_dc_a.id,
-                             status="active")
-        create_if_not_exists(nb.dcim.devices, 
-                             name="fw-internal-01", 
-                             device_type=dt_asa.id, 
-                             role=role_firewall.id, 
-                             site=site_dc_a.id,
-                             status="active")
-
-    # 6. IP Prefixes (IPAM)
-    print("\n--- Adding IPAM Data ---")
-    
-    # Create prefixes first
-    prefixes = [
-        {"prefix": "10.0.0.0/24", "site": site_dc_a.id if site_dc_a else None, "status": "active", "description": "Management Network"},
-        {"prefix": "192.168.1.0/24", "site": site_dc_a.id if site_dc_a else None, "status": "active", "description": "User Network"},
-        {"prefix": "172.16.0.0/24", "site": site_dc_a.id if site_dc_a else None, "status": "active", "description": "Server Network"},
-    ]
-    
-    for prefix_data in prefixes:
-        try:
-            existing = nb.ipam.prefixes.get(prefix=prefix_data["prefix"])
-            if existing:
-                print(f"Skipping prefix {prefix_data['prefix']}: Already exists")
-            else:
-                created = nb.ipam.prefixes.create(prefix_data)
-                print(f"Created prefix: {prefix_data['prefix']}")
-        except Exception as e:
-            print(f"Error creating prefix {prefix_data['prefix']}: {e}")
+# Configuration
+NETBOX_URL = os.getenv("NETBOX_URL", "http://localhost:38080")
+NETBOX_TOKEN = os.getenv("NETBOX_TOKEN", "Hx13DhdCMyuITkNKXFpT6MhaSFJLFJtRg4M7AmQ0")
 
-    # 7. IP Addresses
-    device = nb.dcim.devices.get(name="core-rtr-01")
-    
-    ip_addresses = [
+# Lab data set. References to other objects use their slug (site, manufacturer,
+# device_type, role) and are resolved to IDs while seeding.
+LAB_DATASET = {
+    "sites": [
+        {"name": "Data Center A", "slug": "dc-a", "status": "active"},
+    ],
+    "manufacturers": [
+        {"name": "Cisco", "slug": "cisco"},
+        {"name": "Juniper", "slug": "juniper"},
+    ],
+    "device_roles": [
+        {"name": "Core Router", "slug": "core-router", "color": "ff0000"},
+        {"name": "Access Switch", "slug": "access-switch", "color": "00ff00"},
+        {"name": "Firewall", "slug": "firewall", "color": "ff9900"},
+        {"name": "Distribution Switch", "slug": "distribution-switch", "color": "0066ff"},
+    ],
+    "device_types": [
+        {"manufacturer": "cisco", "model": "CSR1000v", "slug": "csr1000v", "u_height": 1},
+        {"manufacturer": "cisco", "model": "Catalyst 9300", "slug": "catalyst-9300", "u_height": 1},
+        {"manufacturer": "cisco", "model": "ASA 5506-X", "slug": "asa-5506-x", "u_height": 1},
+        {"manufacturer": "juniper", "model": "vSRX", "slug": "vsrx", "u_height": 1},
+        {"manufacturer": "juniper", "model": "EX4300", "slug": "ex4300", "u_height": 1},
+    ],
+    "devices": [
+        {"name": "core-rtr-01", "device_type": "csr1000v", "role": "core-router", "site": "dc-a", "status": "active"},
+        {"name": "core-rtr-02", "device_type": "csr1000v", "role": "core-router", "site": "dc-a", "status": "active"},
+        {"name": "dist-sw-01", "device_type": "catalyst-9300", "role": "distribution-switch", "site": "dc-a", "status": "active"},
+        {"name": "dist-sw-02", "device_type": "catalyst-9300", "role": "distribution-switch", "site": "dc-a", "status": "active"},
+        {"name": "access-sw-01", "device_type": "ex4300", "role": "access-switch", "site": "dc-a", "status": "active"},
+        {"name": "access-sw-02", "device_type": "ex4300", "role": "access-switch", "site": "dc-a", "status": "active"},
+        {"name": "access-sw-03", "device_type": "ex4300", "role": "access-switch", "site": "dc-a", "status": "active"},
+        {"name": "fw-perimeter-01", "device_type": "asa-5506-x", "role": "firewall", "site": "dc-a", "status": "active"},
+        {"name": "fw-internal-01", "device_type": "asa-5506-x", "role": "firewall", "site": "dc-a", "status": "active"},
+    ],
+    "prefixes": [
+        {"prefix": "10.0.0.0/24", "site": "dc-a", "status": "active", "description": "Management Network"},
+        {"prefix": "192.168.1.0/24", "site": "dc-a", "status": "active", "description": "User Network"},
+        {"prefix": "172.16.0.0/24", "site": "dc-a", "status": "active", "description": "Server Network"},
+    ],
+    "ip_addresses": [
         {"address": "10.0.0.1/24", "status": "active", "description": "Gateway Management"},
         {"address": "10.0.0.2/24", "status": "active", "description": "Switch-01 Management"},
         {"address": "10.0.0.3/24", "status": "active", "description": "Switch-02 Management"},
@@ -167,41 +62,218 @@ def main():
         {"address": "172.16.0.10/24", "status": "active", "description": "Web Server"},
         {"address": "172.16.0.11/24", "status": "active", "description": "Database Server"},
         {"address": "172.16.0.12/24", "status": "active", "description": "Application Server"},
-    ]
-    
-    for ip_data in ip_addresses:
-        try:
-            existing = nb.ipam.ip_addresses.get(address=ip_data["address"])
-            if existing:
-                print(f"Skipping IP {ip_data['address']}: Already exists")
-            else:
-                created = nb.ipam.ip_addresses.create(ip_data)
-                print(f"Created IP: {ip_data['address']} - {ip_data['description']}")
-        except Exception as e:
-            print(f"Error creating IP {ip_data['address']}: {e}")
-
-    # 8. VLANs
-    print("\n--- Adding VLANs ---")
-    vlans = [
+    ],
+    "vlans": [
         {"vid": 10, "name": "VLAN-Management", "status": "active", "description": "Management VLAN"},
         {"vid": 20, "name": "VLAN-Servers", "status": "active", "description": "Server VLAN"},
         {"vid": 30, "name": "VLAN-Users", "status": "active", "description": "User VLAN"},
         {"vid": 100, "name": "VLAN-Guest", "status": "active", "description": "Guest WiFi VLAN"},
         {"vid": 999, "name": "VLAN-Native", "status": "active", "description": "Native/Trunk VLAN"},
-    ]
-    
-    for vlan_data in vlans:
+    ],
+}
+
+# Seeding order: the endpoints of one stage only reference earlier stages, so they run in parallel.
+STAGES = [
+    ["sites", "manufacturers", "device_roles"],
+    ["device_types", "prefixes", "vlans"],
+    ["devices", "ip_addresses"],
+]
+
+# pynetbox endpoint, fields referencing other data set keys, and the natural key of an object.
+ENDPOINTS = {
+    "sites": ("dcim.sites", {}, lambda o: o["slug"]),
+    "manufacturers": ("dcim.manufacturers", {}, lambda o: o["slug"]),
+    "device_roles": ("dcim.device_roles", {}, lambda o: o["slug"]),
+    "device_types": ("dcim.device_types", {"manufacturer": "manufacturers"}, lambda o: o["slug"]),
+    "devices": ("dcim.devices", {"device_type": "device_types", "role": "device_roles", "site": "sites"},
+                lambda o: (o["name"], o["site"])),
+    "prefixes": ("ipam.prefixes", {"site": "sites"}, lambda o: (o["prefix"], o.get("vrf"))),
+    "ip_addresses": ("ipam.ip_addresses", {}, lambda o: (o["address"], o.get("vrf"))),
+    "vlans": ("ipam.vlans", {"site": "sites"}, lambda o: (o["vid"], o.get("site"))),
+}
+
+# Device mix per site in generated data: (role, device type, name prefix, share of the site's devices)
+GENERATED_ROLES = [
+    ("firewall", "asa-5506-x", "fw-perimeter", 0.05),
+    ("core-router", "csr1000v", "core-rtr", 0.05),
+    ("distribution-switch", "catalyst-9300", "dist-sw", 0.15),
+    ("access-switch", "ex4300", "access-sw", 0.75),
+]
+
+
+def _ref(value):
+    """Natural key of a nested object returned by NetBox (slug), or None."""
+    if not isinstance(value, dict):
+        return value
+    return value.get("slug") or value.get("id")
+
+
+def _existing_key(name, record):
+    """Natural key of an object already in NetBox, in the same form as ENDPOINTS uses."""
+    # Read the raw data: a missing attribute on a pynetbox Record triggers a GET of the full object
+    data = dict(record)
+    if name in ("sites", "manufacturers", "device_roles", "device_types"):
+        return data["slug"]
+    if name == "devices":
+        return (data["name"], _ref(data.get("site")))
+    if name == "prefixes":
+        return (data["prefix"], _ref(data.get("vrf")))
+    if name == "ip_addresses":
+        return (data["address"], _ref(data.get("vrf")))
+    if name == "vlans":
+        return (data["vid"], _ref(data.get("site")))
+
+
+def _endpoint(nb, path):
+    app, name = path.split(".")
+    return getattr(getattr(nb, app), name)
+
+
+class BulkSeeder:
+    """Seed a data set with one listing per endpoint and chunked list-form bulk POSTs."""
+
+    def __init__(self, nb, chunk_size=500, workers=4):
+        self.nb = nb
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.ids = {}
+
+    def preload(self, name):
+        """Map natural key -> id for every object already in NetBox (one paged listing)."""
+        started = time.monotonic()
+        self.ids[name] = {_existing_key(name, r): r.id for r in _endpoint(self.nb, ENDPOINTS[name][0]).all()}
+        print(f"Loaded {len(self.ids[name])} existing {name} ({time.monotonic() - started:.1f}s)")
+
+    def _create_chunk(self, name, chunk):
+        """{natural key: id} of the created objects, or None when the bulk POST failed."""
         try:
-            existing = nb.ipam.vlans.get(vid=vlan_data["vid"])
-            if existing:
-                print(f"Skipping VLAN {vlan_data['vid']}: Already exists")
-            else:
-                created = nb.ipam.vlans.create(vlan_data)
-                print(f"Created VLAN: {vlan_data['vid']} - {vlan_data['name']}")
+            created = _endpoint(self.nb, ENDPOINTS[name][0]).create([payload for _, payload in chunk])
         except Exception as e:
-            print(f"Error creating VLAN {vlan_data['vid']}: {e}")
+            print(f"Error creating {len(chunk)} {name}: {e}")
+            return None
+        return {k: record.id for (k, _), record in zip(chunk, created)}
+
+    def seed(self, name, objects):
+        """Create the missing objects of one endpoint; returns the number of failed chunks."""
+        path, refs, key = ENDPOINTS[name]
+        self.preload(name)
+        known = self.ids[name]
+        pending, skipped = [], 0
+        for obj in objects:
+            k = key(obj)
+            if k in known:
+                continue
+            payload = dict(obj)
+            for field, target in refs.items():
+                if payload.get(field) is None:
+                    continue
+                ref_id = self.ids.get(target, {}).get(payload[field])
+                if ref_id is None:
+                    break
+                payload[field] = ref_id
+            else:
+                pending.append((k, payload))
+                continue
+            skipped += 1
+        if skipped:
+            print(f"Skipping {skipped} {name}: referenced objects missing")
+
+        started = time.monotonic()
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda chunk: self._create_chunk(name, chunk), chunks))
+        for created in results:
+            known.update(created or {})
+        failed = [chunk for chunk, created in zip(chunks, results) if created is None]
+        print(f"Created {sum(len(created) for created in results if created)} {name} in {len(chunks)} requests "
+              f"({time.monotonic() - started:.1f}s), {len(objects) - len(pending) - skipped} already existed")
+        if failed:
+            print(f"Failed to create {sum(len(chunk) for chunk in failed)} {name} in {len(failed)} requests")
+        return len(failed)
+
+    def run(self, dataset):
+        """Seed stage by stage; stops before the dependent stages and returns False when a chunk failed."""
+        for stage in STAGES:
+            names = [name for name in stage if dataset.get(name)]
+            with ThreadPoolExecutor(max_workers=len(names) or 1) as pool:
+                failed = sum(future.result() for future in [pool.submit(self.seed, name, dataset[name])
+                                                            for name in names])
+            if failed:
+                print(f"\n{failed} bulk requests failed; stopping before the objects that depend on them.")
+                return False
+        return True
+
 
-    print("\nPopulation complete.")
+def generate_dataset(spec):
+    """Build a synthetic data set from a spec such as netbox/scripts/loadtest_spec.json.
+
+    Every site gets `devices_per_site` devices (mixed roles), `prefixes_per_site`
+    prefixes carved from `prefix_pool`, `ips_per_prefix` addresses in each prefix
+    and `vlans_per_site` VLANs. The lab manufacturers, roles and device types are reused.
+    """
+    dataset = {key: list(LAB_DATASET[key]) for key in ("manufacturers", "device_roles", "device_types")}
+    dataset.update(sites=[], devices=[], prefixes=[], ip_addresses=[], vlans=[])
+    pool = ipaddress.ip_network(spec.get("prefix_pool", "10.0.0.0/8"))
+    subnets = pool.subnets(new_prefix=spec.get("prefix_length", 24))
+    for s in range(spec.get("sites", 1)):
+        slug = f"{spec.get('site_prefix', 'site')}-{s + 1:04d}"
+        dataset["sites"].append({"name": slug.upper(), "slug": slug, "status": "active"})
+
+        per_site = spec.get("devices_per_site", 0)
+        count = 0
+        for role, device_type, prefix, share in GENERATED_ROLES:
+            n = per_site - count if role == GENERATED_ROLES[-1][0] else max(1, round(per_site * share))
+            n = min(n, per_site - count)
+            for i in range(n):
+                dataset["devices"].append({"name": f"{slug}-{prefix}-{i + 1:03d}", "device_type": device_type,
+                                           "role": role, "site": slug, "status": "active"})
+            count += n
+
+        for p in range(spec.get("prefixes_per_site", 0)):
+            net = next(subnets)
+            dataset["prefixes"].append({"prefix": str(net), "site": slug, "status": "active",
+                                        "description": f"{slug} segment {p + 1}"})
+            hosts = net.hosts()
+            for i in range(min(spec.get("ips_per_prefix", 0), net.num_addresses - 2)):
+                dataset["ip_addresses"].append({"address": f"{next(hosts)}/{net.prefixlen}", "status": "active",
+                                                "description": f"{slug} host {p + 1}.{i + 1}"})
+
+        for v in range(spec.get("vlans_per_site", 0)):
+            dataset["vlans"].append({"vid": v % 4094 + 1, "name": f"{slug}-VLAN-{v + 1:04d}", "site": slug,
+                                     "status": "active"})
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Populate NetBox with the lab data set or a generated one.")
+    parser.add_argument("--spec", help="JSON spec for a synthetic data set (see loadtest_spec.json)")
+    parser.add_argument("--dataset", help="seed a data set JSON file (e.g. one written with --dump)")
+    parser.add_argument("--dump", help="write the data set to this JSON file instead of seeding NetBox")
+    parser.add_argument("--chunk-size", type=int, default=500, help="objects per bulk POST")
+    parser.add_argument("--workers", type=int, default=4, help="parallel requests per endpoint")
+    args = parser.parse_args()
+
+    if args.spec:
+        with open(args.spec) as f:
+            dataset = generate_dataset(json.load(f))
+    elif args.dataset:
+        with open(args.dataset) as f:
+            dataset = json.load(f)
+    else:
+        dataset = LAB_DATASET
+
+    if args.dump:
+        with open(args.dump, "w") as f:
+            json.dump(dataset, f, indent=1)
+        print(f"Wrote {sum(len(v) for v in dataset.values())} objects to {args.dump}")
+        return
+
+    print("Starting NetBox population...")
+    started = time.monotonic()
+    nb = pynetbox.api(NETBOX_URL, token=NETBOX_TOKEN, threading=True, max_workers=args.workers)
+    if not BulkSeeder(nb, chunk_size=args.chunk_size, workers=args.workers).run(dataset):
+        sys.exit(1)
+    print(f"\nPopulation complete ({time.monotonic() - started:.1f}s).")
 
 if __name__ == "__main__":
     main()